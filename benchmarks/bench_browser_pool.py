@@ -0,0 +1,42 @@
+"""
+Measures scrapes per minute against the local job page fixture, once starting a fresh
+browser per scrape and once leasing browsers from a DriverPool.
+
+    python -m benchmarks.bench_browser_pool --scrapes 20 --workers 2
+"""
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from cover_letter_bot.scraper import scrape_job_description
+from cover_letter_bot.browser_pool import DriverPool
+from .fixture_server import serve_fixtures
+
+def run(url: str, scrapes: int, workers: int, pool: DriverPool = None) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda _: scrape_job_description(url, pool=pool), range(scrapes)))
+    return scrapes / (time.perf_counter() - started) * 60
+
+def main():
+    parser = argparse.ArgumentParser(description="Browser pool benchmark")
+    parser.add_argument("--scrapes", type=int, default=20, help="Number of scrapes per run")
+    parser.add_argument("--workers", type=int, default=2, help="Concurrent scrapes (and pool size)")
+    parser.add_argument("--max-pages", type=int, default=50, help="Pages served per pooled driver before it is recycled")
+    args = parser.parse_args()
+
+    server, base_url = serve_fixtures()
+    url = f"{base_url}/linkedin_job.html"
+    try:
+        without_pool = run(url, args.scrapes, args.workers)
+        with DriverPool(size=args.workers, max_pages=args.max_pages) as pool:
+            with_pool = run(url, args.scrapes, args.workers, pool)
+            stats = pool.stats
+    finally:
+        server.shutdown()
+
+    print(f"without pool: {without_pool:.1f} scrapes/min")
+    print(f"with pool:    {with_pool:.1f} scrapes/min ({with_pool / without_pool:.1f}x)")
+    print(f"pool stats:   {stats}")
+
+if __name__ == "__main__":
+    main()
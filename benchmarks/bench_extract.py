@@ -0,0 +1,93 @@
+"""
+Compares job page extraction with a full BeautifulSoup tree (html.parser, as the scraper used to do)
+against extract.extract_job, which parses only the description container and the JSON-LD. The saved
+fixture is padded to the size of a real LinkedIn page (similar-job cards and embedded JSON) and each
+approach reports the median time per page and its peak Python memory, measured with tracemalloc.
+
+    python -m benchmarks.bench_extract --size-mb 3 --repeat 10
+"""
+import os
+import sys
+import json
+import html
+import time
+import argparse
+import statistics
+import tracemalloc
+from bs4 import BeautifulSoup
+from cover_letter_bot.extract import extract_job, posting_metadata
+from .fixture_server import FIXTURES_DIR
+
+CARD = """
+    <li class="similar-jobs__list-item">
+      <div class="base-card base-search-card" data-entity-urn="urn:li:jobPosting:{index}">
+        <a class="base-card__full-link" href="https://www.linkedin.com/jobs/view/{index}/"><span class="sr-only">Backend Engineer {index}</span></a>
+        <div class="base-search-card__info"><h3 class="base-search-card__title">Backend Engineer {index}</h3>
+          <h4 class="base-search-card__subtitle"><a class="hidden-nested-link">Company {index}</a></h4>
+          <div class="base-search-card__metadata"><span class="job-search-card__location">Berlin, Germany</span>
+            <time class="job-search-card__listdate" datetime="2025-07-14">2 weeks ago</time></div></div>
+      </div>
+    </li>"""
+
+def padded_page(page: str, size: int) -> str:
+    """
+    The fixture with similar-job cards and a large embedded JSON blob appended to the body until it is `size` bytes.
+    """
+    blob = json.dumps({'included': [{'entityUrn': f"urn:li:fs_miniJob:{index}", 'title': f"Job {index}", 'tracking': "x" * 200} for index in range(size // 600)]})
+    cards, index = [], 0
+    while len(page) + len(blob) + sum(map(len, cards)) < size:
+        cards.append(CARD.format(index=index))
+        index += 1
+    padding = f'<ul class="similar-jobs__list">{"".join(cards)}\n</ul>\n<code style="display: none" id="bpr-guid-1"><!--{html.escape(blob)}--></code>\n'
+    return page.replace("</body>", padding + "</body>", 1)
+
+def extract_with_beautifulsoup(page: str) -> dict:
+    soup = BeautifulSoup(page, "html.parser")
+    postings = []
+    for script in soup.find_all("script", type="application/ld+json"):
+        data = json.loads(script.string or "")
+        postings += [item for item in (data if isinstance(data, list) else [data]) if item.get('@type') == 'JobPosting']
+    job_details = soup.find("div", class_="show-more-less-html__markup")
+    record = posting_metadata(postings[0]) if postings else {}
+    record['description'] = job_details.get_text(separator="\n", strip=True) if job_details else None
+    return record
+
+def measure(extract, page: str, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract(page)
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    record = extract(page)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'median': statistics.median(times), 'peak': peak, 'record': record}
+
+def main():
+    parser = argparse.ArgumentParser(description="Job page extraction benchmark")
+    parser.add_argument("--size-mb", type=float, nargs="+", default=[0, 1, 3], help="Page sizes to test (0 = the fixture as saved)")
+    parser.add_argument("--repeat", type=int, default=10, help="Extractions timed per approach and size")
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES_DIR, "linkedin_job.html"), encoding="utf-8") as f:
+        fixture = f.read()
+
+    for size_mb in args.size_mb:
+        page = padded_page(fixture, int(size_mb * 1024 * 1024)) if size_mb else fixture
+        results = {
+            'beautifulsoup': measure(extract_with_beautifulsoup, page, args.repeat),
+            'extract_job': measure(extract_job, page, args.repeat),
+        }
+        print(f"page of {len(page) / 1024:.0f} KB:")
+        for name, result in results.items():
+            print(f"  {name:14} {result['median'] * 1000:8.2f} ms  peak {result['peak'] / 1024 / 1024:7.2f} MB")
+        old, new = results['beautifulsoup'], results['extract_job']
+        print(f"  speedup {old['median'] / new['median']:.0f}x, peak memory {old['peak'] / new['peak']:.0f}x lower, "
+              f"{len(new['record']['sections'])} sections")
+        if any(old['record'][key] != new['record'][key] for key in old['record']):
+            print("FAILED: extract_job differs from the BeautifulSoup extraction")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
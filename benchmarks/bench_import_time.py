@@ -0,0 +1,70 @@
+"""
+Checks CLI startup cost: imports each entry point in a fresh interpreter with `-X importtime`, reports
+the cumulative import time of the module and the heaviest packages it pulled in, and fails if an entry
+point exceeds the budget or loads a heavy dependency it doesn't need at startup.
+
+    python -m benchmarks.bench_import_time --budget 0.15
+"""
+import sys
+import argparse
+import statistics
+import subprocess
+
+# Modules loaded at CLI startup (prompt-only also loads the generator) and the packages they must
+# not import before a command needs them
+ENTRY_POINTS = {
+    "cover_letter_bot.cli": ["openai", "rich", "inquirer", "selenium", "webdriver_manager", "bs4", "aiohttp", "dotenv"],
+    "cover_letter_bot.generator": ["openai", "rich", "inquirer", "selenium", "bs4", "aiohttp"],
+}
+
+def import_profile(module: str) -> dict:
+    """
+    Imports `module` in a new interpreter and returns its cumulative import time in seconds, the
+    cumulative time of every top-level package it imported, and the names of all loaded modules.
+    Imports done by interpreter startup (`site`) are left out.
+    """
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    packages, total, started = {}, 0.0, False
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+        seconds, name = int(cumulative) / 1e6, name.strip()
+        if not started:
+            started = name == "site"
+            continue
+        if name == module:
+            total = seconds
+        elif "." not in name:
+            packages[name] = max(packages.get(name, 0), seconds)
+    return {'total': total, 'packages': packages, 'modules': set(completed.stdout.split())}
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI import time check")
+    parser.add_argument("--budget", type=float, default=0.15, help="Maximum median seconds to import an entry point")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=5, help="Number of heaviest imports to show")
+    args = parser.parse_args()
+
+    failed = False
+    for module, forbidden in ENTRY_POINTS.items():
+        profiles = [import_profile(module) for _ in range(args.runs)]
+        median = statistics.median(profile['total'] for profile in profiles)
+        heaviest = sorted(profiles[-1]['packages'].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"{module}: {median * 1000:.0f} ms (median of {args.runs})")
+        print("  heaviest: " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in heaviest))
+        loaded = [name for name in forbidden if name in profiles[-1]['modules']]
+        if loaded:
+            print(f"  FAILED: imports {', '.join(loaded)} at startup")
+            failed = True
+        if median > args.budget:
+            print(f"  FAILED: import time exceeds the {args.budget}s budget")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Fills a temporary job store with synthetic listings (a share of them reposts with small edits) and measures
+insert throughput, how many reposts were caught as duplicates, and full-text query latency.
+
+    python -m benchmarks.bench_jobstore --listings 10000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from cover_letter_bot.jobstore import JobStore
+
+VOCABULARY = ("python java kubernetes docker sql cloud team lead data pipeline engineer remote office agile testing design "
+              "api react frontend backend security analytics platform customer product growth mentoring").split()
+
+def listing(rng: random.Random) -> str:
+    return " ".join(f"{rng.choice(VOCABULARY)}{rng.randint(0, 300)}" for _ in range(rng.randint(120, 300)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Job store benchmark")
+    parser.add_argument("--listings", type=int, default=10000)
+    parser.add_argument("--repost-share", type=float, default=0.05, help="Share of listings that repost an earlier one with small edits")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = time.time()
+    with tempfile.TemporaryDirectory() as directory, JobStore(os.path.join(directory, "jobs.sqlite")) as store:
+        descriptions, reposts = [], 0
+        started = time.perf_counter()
+        for i in range(args.listings):
+            if descriptions and rng.random() < args.repost_share:
+                words = rng.choice(descriptions).split()
+                words[rng.randrange(len(words))] = "edited"
+                description = " ".join(words) + " Apply today!"
+                reposts += 1
+            else:
+                description = listing(rng) + (" Kubernetes" if rng.random() < 0.1 else "")
+                descriptions.append(description)
+            store.add(f"https://www.linkedin.com/jobs/view/{i}/", description, title=f"Engineer {i}", company=f"Company {i % 200}",
+                      scraped_at=now - rng.uniform(0, 30 * 86400))
+        elapsed = time.perf_counter() - started
+        print(f"inserted {args.listings} listings in {elapsed:.1f}s ({args.listings / elapsed:.0f}/s)")
+        print(f"duplicates flagged: {store.stats['duplicates']} of {reposts} reposts")
+
+        latencies = []
+        for _ in range(args.queries):
+            started = time.perf_counter()
+            jobs = store.search("kubernetes", since=now - 7 * 86400, limit=1000)
+            latencies.append(time.perf_counter() - started)
+        print(f"'kubernetes' scraped this week: {len(jobs)} listings, median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"max {max(latencies) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Runs the pre-render LaTeX lint over letters with the mistakes models typically make (unescaped
+specials, code fences, chatty preambles, unclosed environments, a changed document class, missing
+structure), built from the bundled cover letter template. Reports the lint time per letter and how
+many were clean, repaired or need a regeneration. With pdflatex installed, it also compiles each
+letter as generated and as repaired, to count the failed compiles the lint avoids.
+
+    python -m benchmarks.bench_latex_lint --repeat 200
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from cover_letter_bot.latex_lint import repair
+from cover_letter_bot.render import render_latex
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "example_cover_letter.tex")
+
+def broken_letters(template: str) -> dict:
+    return {
+        'clean': template,
+        'ampersand': template.replace("computer science", "R&D and computer science"),
+        'percent': template.replace("confident", "confident (I cut build times by 40% last year)"),
+        'dollar': template.replace("confident", "confident, having saved $120k in cloud costs"),
+        'hash': template.replace("confident", "confident as the #1 ranked intern"),
+        'underscore': template.replace("confident", "confident, having built the open-source tool my_scheduler"),
+        'code fence': "```latex\n" + template + "\n```\n",
+        'chatty': "Here is your tailored cover letter:\n\n" + template + "\n\nGood luck with your application!",
+        'unclosed letter': template.replace("\\end{letter}\n", ""),
+        'truncated': template[:template.rindex("\\closing")],
+        'document class': template.replace("\\documentclass{letter}", "\\documentclass[11pt]{article}"),
+        'body only': template[template.index("\\begin{letter}"):template.index("\\end{document}")],
+        'math': template.replace("confident", "confident in $O(n) algorithms"),
+        'no closing': template.replace("\\closing{Sincerely,}", "Sincerely,"),
+        'brace': template.replace("\\opening{Dear Hiring Manager,}", "\\opening{Dear Hiring Manager,"),
+    }
+
+def compiles(tex: str, directory: str, name: str) -> bool:
+    path = os.path.join(directory, f"{name.replace(' ', '_')}.tex")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(tex)
+    return render_latex(path, out_dir=directory, use_format=False)['status'] == 'ok'
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render LaTeX lint benchmark")
+    parser.add_argument("--repeat", type=int, default=200, help="Lint runs per letter for the timing")
+    args = parser.parse_args()
+
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+        template = f.read()
+    letters = broken_letters(template)
+    with_pdflatex = shutil.which("pdflatex") is not None
+    if not with_pdflatex:
+        print("pdflatex not found, skipping the compile comparison.")
+
+    outcomes = {}
+    print(f"{'letter':16} {'status':13} {'ms':>6}  {'compiles as generated/repaired':30} fixes / errors")
+    with tempfile.TemporaryDirectory(prefix="bench-lint-") as directory:
+        for name, tex in letters.items():
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                result = repair(tex, template)
+            milliseconds = (time.perf_counter() - started) / args.repeat * 1000
+            outcomes[result['status']] = outcomes.get(result['status'], 0) + 1
+            compiled = ""
+            if with_pdflatex:
+                compiled = f"{compiles(tex, directory, name + '_raw')}/{compiles(result['tex'], directory, name)}"
+            codes = [fix['code'] for fix in result['fixes']] + [f"!{error['code']}" for error in result['errors']]
+            print(f"{name:16} {result['status']:13} {milliseconds:>6.2f}  {compiled:30} {', '.join(codes)}")
+    print(f"Outcomes: {outcomes}")
+
+if __name__ == "__main__":
+    main()
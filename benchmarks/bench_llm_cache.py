@@ -0,0 +1,41 @@
+"""
+Generates the same cover letters twice against the fake OpenAI server, once with a cold and once
+with a warm CompletionCache, and reports hits, misses, saved tokens and requests that reached the server.
+
+    python -m benchmarks.bench_llm_cache --letters 10 --latency 0.5
+"""
+import os
+import time
+import argparse
+import tempfile
+from cover_letter_bot.generator import build_prompt, generate_cover_letter
+from cover_letter_bot.llm_cache import CompletionCache
+from cover_letter_bot.utils import load_latex_template
+from .fake_openai import serve_fake_openai
+
+def main():
+    parser = argparse.ArgumentParser(description="Completion cache benchmark")
+    parser.add_argument("--letters", type=int, default=10, help="Number of distinct prompts")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated API latency in seconds")
+    args = parser.parse_args()
+
+    server, base_url = serve_fake_openai(latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    cv = load_latex_template("templates/example_cv.tex")
+    prompts = [build_prompt(f"Job listing number {i}: Python developer", cv) for i in range(args.letters)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = CompletionCache(os.path.join(directory, "completions.sqlite"))
+        try:
+            for label in ("cold", "warm"):
+                started = time.perf_counter()
+                for prompt in prompts:
+                    generate_cover_letter(prompt, "sk-fake", cache=cache)
+                print(f"{label}: {time.perf_counter() - started:.2f}s, server requests so far: {server.requests}")
+            print(f"cache stats: {cache.stats}")
+        finally:
+            cache.close()
+            server.shutdown()
+
+if __name__ == "__main__":
+    main()
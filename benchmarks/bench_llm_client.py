@@ -0,0 +1,46 @@
+"""
+Runs many concurrent completions through AsyncCoverLetterClient against the fake OpenAI server
+while it injects 429 and 503 responses, and checks that every completion still succeeds.
+
+    python -m benchmarks.bench_llm_client --letters 50 --concurrency 10 --throttle-every 7
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from cover_letter_bot.llm_client import AsyncCoverLetterClient
+from .fake_openai import serve_fake_openai
+
+async def run(letters: int, concurrency: int, requests_per_minute: float) -> dict:
+    async with AsyncCoverLetterClient("sk-fake", max_concurrency=concurrency, requests_per_minute=requests_per_minute, backoff=0.1) as client:
+        await asyncio.gather(*(client.generate(f"Write cover letter number {i}") for i in range(letters)))
+        return client.summary()
+
+def main():
+    parser = argparse.ArgumentParser(description="Async OpenAI client benchmark")
+    parser.add_argument("--letters", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated API latency in seconds")
+    parser.add_argument("--throttle-every", type=int, default=7, help="Answer every Nth request with 429")
+    parser.add_argument("--fail-every", type=int, default=11, help="Answer every Nth request with 503")
+    parser.add_argument("--requests-per-minute", type=float, default=6000)
+    args = parser.parse_args()
+
+    server, base_url = serve_fake_openai(latency=args.latency, throttle_every=args.throttle_every, fail_every=args.fail_every)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    try:
+        started = time.perf_counter()
+        summary = asyncio.run(run(args.letters, args.concurrency, args.requests_per_minute))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    print(f"{summary['completed']}/{args.letters} completions in {elapsed:.2f}s ({args.letters / elapsed * 60:.0f}/min)")
+    print(f"server requests: {server.requests}, throttled: {server.throttled}")
+    print(f"client metrics: {summary}")
+    if summary['completed'] != args.letters:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+End-to-end batch benchmark, fully offline: job pages come from the local fixture server, completions from
+the fake OpenAI server (with simulated latency), and letters are rendered from the bundled templates with
+pdflatex. For each concurrency level, a batch runs in a fresh process and working directory with all caches
+cold (every job is scraped and generated). It measures jobs/minute, p50/p95 per stage (from the run's trace)
+and peak RSS.
+
+Results are appended to benchmarks/results/pipeline.jsonl together with the git commit, so runs on
+different commits can be compared with --compare.
+
+    python -m benchmarks.bench_pipeline --jobs 20 --concurrency 1 4 8 --latency 0.5
+    python -m benchmarks.bench_pipeline --compare
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from .fixture_server import serve_fixtures
+from .fake_openai import serve_fake_openai
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results", "pipeline.jsonl")
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "") if commit else "unknown"
+    except FileNotFoundError:
+        return "unknown"
+
+def run_level(jobs: int, concurrency: int, latency: float) -> dict:
+    """
+    Runs one batch in this process, inside a temporary working directory. Meant to be called in a fresh
+    interpreter (see --level) so peak RSS belongs to this run alone.
+    """
+    from cover_letter_bot import batch, telemetry
+
+    fixtures, base_url = serve_fixtures()
+    server, api_url = serve_fake_openai(latency=latency)
+    os.environ["OPENAI_BASE_URL"] = api_url
+    with tempfile.TemporaryDirectory(prefix="bench-pipeline-") as directory:
+        os.chdir(directory)
+        shutil.copytree(os.path.join(ROOT, "templates"), "templates")
+        telemetry.configure("output/trace.jsonl")
+        manifest = [
+            dict(batch.DEFAULTS, job_url=f"{base_url}/linkedin_job.html?job={i}", output_latex=f"letter_{i:03d}",
+                 cover_letter_template="templates/example_cover_letter.tex")
+            for i in range(jobs)
+        ]
+        render_workers = min(concurrency, os.cpu_count() or 1)
+        started = time.perf_counter()
+        try:
+            results = asyncio.run(batch.run_batch(
+                manifest, "sk-fake", {'scrape': concurrency, 'generate': concurrency, 'render': render_workers},
+                use_cache=False, regenerate=True, skip_duplicates=False, incremental=False,
+            ))
+        finally:
+            elapsed = time.perf_counter() - started
+            telemetry.shutdown()
+            fixtures.shutdown()
+            server.shutdown()
+        spans = telemetry.load_spans("output/trace.jsonl")
+        stages = {name: {key: stats[key] for key in ('count', 'p50', 'p95', 'p99')}
+                  for name, stats in telemetry.report(spans).items() if name.startswith("stage.") or name in ("llm.request", "render")}
+
+    statuses = {}
+    for record in results:
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+    return {
+        'concurrency': concurrency,
+        'jobs': jobs,
+        'statuses': statuses,
+        'seconds': round(elapsed, 3),
+        'jobs_per_minute': round(statuses.get('ok', 0) / elapsed * 60, 1),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'stages': stages,
+    }
+
+def compare(path: str, last: int):
+    with open(path, "r", encoding="utf-8") as f:
+        runs = [json.loads(line) for line in f if line.strip()][-last:]
+    print(f"{'commit':16} {'date':17} {'conc':>4} {'jobs/min':>9} {'rss MB':>7} {'gen p50':>8} {'render p50':>10}  statuses")
+    for run in runs:
+        for level in run['levels']:
+            stages = level['stages']
+            print(f"{run['commit']:16} {run['date']:17} {level['concurrency']:>4} {level['jobs_per_minute']:>9.1f} {level['peak_rss_mb']:>7.1f} "
+                  f"{stages.get('stage.generate', {}).get('p50', 0):>8.3f} {stages.get('stage.render', {}).get('p50', 0):>10.3f}  {level['statuses']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end offline batch benchmark")
+    parser.add_argument("--jobs", type=int, default=20, help="Jobs per batch")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="Concurrency levels (per stage) to compare")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated OpenAI latency in seconds")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON lines file the results are appended to")
+    parser.add_argument("--compare", action="store_true", help="Print stored results instead of running")
+    parser.add_argument("--last", type=int, default=10, help="Number of stored runs to compare")
+    parser.add_argument("--level", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.results, args.last)
+        return
+    if args.level is not None:
+        # Child process: run one level and report it on stdout
+        result = run_level(args.jobs, args.level, args.latency)
+        print("RESULT " + json.dumps(result))
+        return
+
+    if not shutil.which("pdflatex"):
+        print("Warning: pdflatex not found, every job will fail at the render stage.")
+    levels = []
+    for concurrency in args.concurrency:
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_pipeline", "--level", str(concurrency), "--jobs", str(args.jobs),
+             "--latency", str(args.latency)],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        lines = [line for line in completed.stdout.splitlines() if line.startswith("RESULT ")]
+        if completed.returncode != 0 or not lines:
+            print(f"concurrency {concurrency} failed:\n{completed.stderr[-2000:]}")
+            continue
+        level = json.loads(lines[-1][len("RESULT "):])
+        levels.append(level)
+        print(f"concurrency {concurrency}: {level['jobs_per_minute']} jobs/min, {level['statuses']}, "
+              f"peak RSS {level['peak_rss_mb']} MB, stages {json.dumps(level['stages'])}")
+
+    os.makedirs(os.path.dirname(args.results), exist_ok=True)
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            'commit': git_commit(),
+            'date': time.strftime("%Y-%m-%d %H:%M"),
+            'latency': args.latency,
+            'levels': levels,
+        }) + "\n")
+    print(f"Results appended to {args.results}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Sends letters for several job listings from one CV to the fake OpenAI server, once with the single-prompt
+layout (build_prompt) and once with the shared-prefix layout (build_messages), and compares time to first
+token and the prompt tokens the server reports as cached. Also checks that the prefix is byte-identical.
+
+    python -m benchmarks.bench_prompt_prefix --letters 10 --prefill-latency 0.2
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+from cover_letter_bot import generator
+from cover_letter_bot.llm_client import AsyncCoverLetterClient
+from cover_letter_bot.utils import load_latex_template
+from .fake_openai import serve_fake_openai
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+def job_listing(i: int) -> str:
+    return (f"Job {i}: we are hiring a software engineer for team {i}. You will build data pipelines in Python, "
+            f"work with SQL and cloud services, and mentor colleagues. Location: office {i}.")
+
+async def run(prompts: list, directory: str) -> list:
+    first_tokens = []
+    async with AsyncCoverLetterClient("sk-fake", max_concurrency=1) as client:
+        # Sequential, so every request after the first can find the prefix cached
+        for i, prompt in enumerate(prompts):
+            timings = {}
+            await client.generate(prompt, stream_to=os.path.join(directory, f"letter_{i}.tex"), timings=timings)
+            first_tokens.append(timings['first_token'])
+        return first_tokens, client.summary()
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared prompt prefix benchmark")
+    parser.add_argument("--letters", type=int, default=10)
+    parser.add_argument("--prefill-latency", type=float, default=0.2, help="Simulated seconds per 1000 uncached prompt tokens")
+    args = parser.parse_args()
+
+    cv = load_latex_template(os.path.join(TEMPLATES_DIR, "example_cv.tex"))
+    template = load_latex_template(os.path.join(TEMPLATES_DIR, "example_cover_letter.tex"))
+    layouts = {
+        'single prompt': [generator.build_prompt(job_listing(i), cv, template) for i in range(args.letters)],
+        'shared prefix': [generator.build_messages(job_listing(i), cv, template) for i in range(args.letters)],
+    }
+
+    fingerprints = {generator.prefix_fingerprint(messages) for messages in layouts['shared prefix']}
+    print(f"prefix fingerprints: {len(fingerprints)} distinct across {args.letters} prompts")
+    print(f"segment tokens: {generator.segment_tokens(layouts['shared prefix'][0])}")
+
+    for layout, prompts in layouts.items():
+        server, base_url = serve_fake_openai(prefill_latency=args.prefill_latency, response_text="Dear hiring manager, ...")
+        os.environ["OPENAI_BASE_URL"] = base_url
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                started = time.perf_counter()
+                first_tokens, summary = asyncio.run(run(prompts, directory))
+                elapsed = time.perf_counter() - started
+        finally:
+            server.shutdown()
+        print(f"{layout:13}: median first token {statistics.median(first_tokens) * 1000:.0f} ms, total {elapsed:.2f}s, "
+              f"prompt tokens {summary['prompt_tokens']}, cached {summary['cached_prompt_tokens']}")
+
+    if len(fingerprints) != 1:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
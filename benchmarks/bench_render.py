@@ -0,0 +1,53 @@
+"""
+Measures PDFs per minute when rendering copies of the bundled example cover letter with RenderService,
+with a plain compile and with the precompiled preamble format.
+
+    python -m benchmarks.bench_render --letters 20 --workers 1 2 4
+"""
+import os
+import shutil
+import time
+import argparse
+import statistics
+import tempfile
+from cover_letter_bot.render import RenderService
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "example_cover_letter.tex")
+
+def run(tex_paths: list, out_dir: str, workers: int, use_format: bool, format_dir: str) -> tuple:
+    started = time.perf_counter()
+    with RenderService(workers=workers, use_format=use_format, format_dir=format_dir) as renderer:
+        results = renderer.render_many(tex_paths, out_dir)
+    return results, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="LaTeX render benchmark")
+    parser.add_argument("--letters", type=int, default=20, help="Number of letters rendered per run")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    parser.add_argument("--template", default=TEMPLATE_PATH, help="LaTeX file to render")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        tex_paths = []
+        for i in range(args.letters):
+            tex_path = os.path.join(directory, f"letter_{i:03d}.tex")
+            shutil.copy(args.template, tex_path)
+            tex_paths.append(tex_path)
+
+        format_dir = os.path.join(directory, "fmt")
+        for use_format in (False, True):
+            label = "format" if use_format else "plain"
+            for workers in args.workers:
+                results, elapsed = run(tex_paths, os.path.join(directory, f"out_{label}_{workers}"), workers, use_format, format_dir)
+                ok = [result for result in results if result['status'] == 'ok']
+                median = statistics.median(result['seconds'] for result in ok) if ok else 0
+                print(f"{label:6} {workers} worker(s): {len(ok)}/{len(results)} ok, "
+                      f"{len(results) / elapsed * 60:.1f} PDFs/min, median compile {median * 1000:.0f} ms")
+                if len(ok) < len(results):
+                    failed = next(result for result in results if result['status'] != 'ok')
+                    print(f"  first failure: {failed['errors']}")
+                if use_format and ok and not all(result['format'] for result in ok):
+                    print("  note: some letters fell back to a plain compile")
+
+if __name__ == "__main__":
+    main()
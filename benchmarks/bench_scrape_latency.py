@@ -0,0 +1,46 @@
+"""
+Checks that scrape latency tracks real page load: scrapes the local job page fixture
+(which is ready almost instantly) with a warm pooled driver and fails if the median
+per-job scrape takes longer than the budget.
+
+    python -m benchmarks.bench_scrape_latency --scrapes 10 --budget 1.0
+"""
+import sys
+import time
+import argparse
+import statistics
+from cover_letter_bot.scraper import scrape_job_description
+from cover_letter_bot.browser_pool import DriverPool
+from .fixture_server import serve_fixtures
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape latency check")
+    parser.add_argument("--scrapes", type=int, default=10, help="Number of scrapes to time")
+    parser.add_argument("--budget", type=float, default=1.0, help="Maximum median seconds per scrape")
+    args = parser.parse_args()
+
+    server, base_url = serve_fixtures()
+    url = f"{base_url}/linkedin_job.html"
+    latencies, steps = [], []
+    try:
+        with DriverPool(size=1) as pool:
+            pool.warm()
+            for _ in range(args.scrapes):
+                timings = {}
+                started = time.perf_counter()
+                scrape_job_description(url, pool=pool, timings=timings)
+                latencies.append(time.perf_counter() - started)
+                steps.append(timings)
+    finally:
+        server.shutdown()
+
+    median = statistics.median(latencies)
+    print(f"median scrape latency: {median * 1000:.0f} ms (max {max(latencies) * 1000:.0f} ms)")
+    for step in steps[0]:
+        print(f"  {step}: {statistics.median(t.get(step, 0) for t in steps) * 1000:.0f} ms")
+    if median > args.budget:
+        print(f"FAILED: median latency exceeds the {args.budget}s budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Generates several cover letter variants against the fake OpenAI server, once as separate requests and
+once as a single request with `n`, and reports wall time, requests and prompt tokens sent, then ranks
+the variants with a fake render.
+
+    python -m benchmarks.bench_variants --variants 3 --latency 0.5
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from cover_letter_bot.generator import build_prompt, generate_cover_letter, generate_variants
+from cover_letter_bot.ranking import render_and_rank
+from cover_letter_bot.utils import load_latex_template
+from .fake_openai import serve_fake_openai
+
+async def fake_render(tex_path: str, out_dir: str) -> dict:
+    pdf_path = os.path.splitext(tex_path)[0] + ".pdf"
+    with open(pdf_path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+    return {'status': 'ok', 'pdf_path': pdf_path, 'pages': 1}
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-variant generation benchmark")
+    parser.add_argument("--variants", type=int, default=3, help="Number of variants per letter")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated API latency in seconds")
+    parser.add_argument("--limit", type=int, default=250, help="Word limit used for ranking")
+    args = parser.parse_args()
+
+    server, base_url = serve_fake_openai(latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    job_desc = "Python developer building data pipelines with Django, PostgreSQL and asyncio."
+    template = load_latex_template("templates/example_cover_letter.tex")
+    prompt = build_prompt(job_desc, load_latex_template("templates/example_cv.tex"), template)
+    try:
+        started = time.perf_counter()
+        for _ in range(args.variants):
+            generate_cover_letter(prompt, "sk-fake")
+        print(f"separate: {time.perf_counter() - started:.2f}s, {server.requests} requests, prompt sent {args.variants}x")
+
+        before = server.requests
+        started = time.perf_counter()
+        letters = generate_variants(prompt, "sk-fake", n=args.variants)
+        print(f"one request (n={args.variants}): {time.perf_counter() - started:.2f}s, {server.requests - before} request, prompt sent 1x")
+
+        with tempfile.TemporaryDirectory() as directory:
+            result = asyncio.run(render_and_rank(letters, "letter", job_desc, fake_render, template, args.limit,
+                                                 out_dir=directory, variants_dir=os.path.join(directory, "variants")))
+        for variant in result['ranking']:
+            print(f"  v{variant['index']}: score {variant['score']}, {variant['words']} words, {variant['scores']}")
+        print(f"best: v{result['best']}")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
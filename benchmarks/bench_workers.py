@@ -0,0 +1,145 @@
+"""
+Runs several worker processes (python -m cover_letter_bot.worker run) against one queue in a temporary
+directory, with listings served from the fixtures and completions from the fake OpenAI server. One
+worker is killed with SIGKILL in the middle of a job; its lease has to expire and another worker has
+to finish the job. Checks that every job completed exactly once and that output/ holds one letter and
+PDF per job and no partial files, and reports jobs/minute.
+
+Without a TeX installation, a stand-in pdflatex that writes a one-page PDF is put on the PATH.
+
+    python -m benchmarks.bench_workers --jobs 20 --workers 3 --lease 3
+"""
+import os
+import re
+import sys
+import csv
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import subprocess
+from cover_letter_bot.jobqueue import JobQueue
+from .fixture_server import serve_fixtures
+from .fake_openai import serve_fake_openai
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAKE_PDFLATEX = """#!{python}
+import sys, time, os
+if "-ini" in sys.argv:
+    sys.exit(1)
+name = os.path.splitext(sys.argv[-1])[0]
+time.sleep({seconds})
+with open(name + ".pdf", "wb") as f:
+    f.write(b"%PDF-1.4\\n%%EOF\\n")
+with open(name + ".log", "w") as f:
+    f.write("Output written on " + name + ".pdf (1 page, 1000 bytes).\\n")
+"""
+
+def install_fake_pdflatex(directory: str, seconds: float) -> str:
+    bin_dir = os.path.join(directory, "bin")
+    os.makedirs(bin_dir)
+    path = os.path.join(bin_dir, "pdflatex")
+    with open(path, "w") as f:
+        f.write(FAKE_PDFLATEX.format(python=sys.executable, seconds=seconds))
+    os.chmod(path, 0o755)
+    return bin_dir
+
+def start_worker(directory: str, env: dict, name: str, lease: float) -> subprocess.Popen:
+    log = open(os.path.join(directory, f"{name}.log"), "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "cover_letter_bot.worker", "run", "--exit-when-empty", "--no-cache", "--lease", str(lease), "--worker-id", name],
+        cwd=directory, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process worker check")
+    parser.add_argument("--jobs", type=int, default=20, help="Number of jobs in the queue")
+    parser.add_argument("--workers", type=int, default=3, help="Number of worker processes")
+    parser.add_argument("--lease", type=float, default=3, help="Lease in seconds")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated API latency in seconds")
+    parser.add_argument("--render-seconds", type=float, default=0.2, help="Compile time of the stand-in pdflatex")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary directory and print its path")
+    args = parser.parse_args()
+
+    fixtures, fixtures_url = serve_fixtures()
+    openai_server, openai_url = serve_fake_openai(latency=args.latency)
+    directory = tempfile.mkdtemp(prefix="workers-")
+    env = dict(os.environ, OPENAI_BASE_URL=openai_url, OPENAI_API_KEY="sk-fake", PYTHONPATH=ROOT, PYTHONUNBUFFERED="1")
+    if not shutil.which("pdflatex"):
+        env['PATH'] = install_fake_pdflatex(directory, args.render_seconds) + os.pathsep + env['PATH']
+    failures = []
+    try:
+        manifest = os.path.join(directory, "jobs.csv")
+        with open(manifest, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(['job_url', 'limit', 'cv_template', 'cover_letter_template', 'output_latex'])
+            for index in range(args.jobs):
+                # A different limit per job keeps the prompts, and so the completions, distinct
+                writer.writerow([f"{fixtures_url}/linkedin_job.html?job={index}", 200 + index, os.path.join(ROOT, "templates", "example_cv.tex"),
+                                 os.path.join(ROOT, "templates", "example_cover_letter.tex"), f"letter_{index:03d}"])
+        subprocess.run([sys.executable, "-m", "cover_letter_bot.worker", "enqueue", manifest], cwd=directory, env=env, check=True)
+
+        queue = JobQueue(os.path.join(directory, "output", "queue.sqlite"), max_pending=None)
+        started = time.perf_counter()
+        workers = {f"worker-{index}": start_worker(directory, env, f"worker-{index}", args.lease) for index in range(args.workers)}
+
+        # Kill the first worker as soon as it is in the middle of a job
+        victim, killed_job = "worker-0", None
+        while killed_job is None and workers[victim].poll() is None:
+            running = [job for job in queue.jobs('running', limit=1000) if job['worker'] == victim and job['stage'] == 'generate']
+            if running:
+                workers[victim].send_signal(signal.SIGKILL)
+                killed_job = running[0]['id']
+                print(f"killed {victim} during job {killed_job}")
+            time.sleep(0.05)
+        for process in workers.values():
+            process.wait(timeout=300)
+        elapsed = time.perf_counter() - started
+
+        jobs = queue.jobs(limit=args.jobs + 1)
+        queue.close()
+        statuses = {}
+        for job in jobs:
+            statuses[job['status']] = statuses.get(job['status'], 0) + 1
+        print(f"{len(jobs)} jobs: {statuses} in {elapsed:.1f}s ({len(jobs) / elapsed * 60:.0f} jobs/min with {args.workers} workers)")
+
+        completions = {}
+        for name in workers:
+            with open(os.path.join(directory, f"{name}.log")) as f:
+                for job_id in re.findall(r"job (\w+) ok after", f.read()):
+                    completions[job_id] = completions.get(job_id, 0) + 1
+        output = os.path.join(directory, "output")
+        pdfs = [name for name in os.listdir(output) if name.endswith(".pdf")]
+        partial = [name for name in os.listdir(output) if name.endswith(".tmp")]
+
+        if statuses != {'ok': args.jobs}:
+            failures.append(f"not every job is ok: {statuses}")
+        if any(completions.get(job['id']) != 1 for job in jobs):
+            failures.append(f"jobs not completed exactly once: {[job['id'] for job in jobs if completions.get(job['id']) != 1]}")
+        if len(pdfs) != args.jobs or partial:
+            failures.append(f"{len(pdfs)} PDFs and {len(partial)} partial files in output/")
+        if killed_job is None:
+            failures.append("no worker was killed mid-job")
+        else:
+            reclaimed = next(job for job in jobs if job['id'] == killed_job)
+            print(f"job {killed_job}: {reclaimed['status']} by {reclaimed['worker']} on attempt {reclaimed['attempts']}")
+            if reclaimed['attempts'] < 2 or reclaimed['worker'] == victim:
+                failures.append(f"the killed worker's job wasn't reclaimed: {reclaimed['worker']}, attempt {reclaimed['attempts']}")
+    finally:
+        fixtures.shutdown()
+        openai_server.shutdown()
+        if args.keep:
+            print(f"kept {directory}")
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if failures:
+        for failure in failures:
+            print(f"FAILED: {failure}")
+        sys.exit(1)
+    print("every job completed exactly once")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+A minimal OpenAI-compatible chat completions server for offline runs and benchmarks.
+Point the client at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python -m benchmarks.fake_openai --port 8765 --latency 0.5 --throttle-every 5
+"""
+import os
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "example_cover_letter.tex")
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+FILLER = "I would also welcome the chance to tell you more about the projects I have worked on and what I learned from them.\n\n"
+
+def variant(content: str, index: int) -> str:
+    if index == 0 or "\\closing" not in content:
+        return content
+    return content.replace("\\closing", FILLER * 3 * index + "\\closing", 1)
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            count = server.requests
+
+        if server.throttle_every and count % server.throttle_every == 0:
+            server.throttled += 1
+            self.send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}}, {'Retry-After': str(server.retry_after)})
+            return
+        if server.fail_every and count % server.fail_every == 0:
+            self.send_json(503, {'error': {'message': 'The server is overloaded'}})
+            return
+
+        messages = body.get('messages', [])
+        prompt = "".join(message.get('content') or "" for message in messages)
+        cached_tokens = self.cached_prefix_tokens(messages)
+        prompt_tokens = estimate_tokens(prompt)
+        time.sleep(server.latency + server.prefill_latency * (prompt_tokens - cached_tokens) / 1000)
+        content = server.response_text
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': estimate_tokens(content),
+            'total_tokens': prompt_tokens + estimate_tokens(content),
+            'prompt_tokens_details': {'cached_tokens': cached_tokens},
+        }
+        if body.get('stream'):
+            self.stream_completion(count, body.get('model', 'fake'), content, usage)
+            return
+
+        # With `n`, every further choice is a variant with more filler paragraphs, so they differ in length
+        choices = [variant(content, index) for index in range(int(body.get('n') or 1))]
+        usage['completion_tokens'] = sum(estimate_tokens(choice) for choice in choices)
+        usage['total_tokens'] = prompt_tokens + usage['completion_tokens']
+        self.send_json(200, {
+            'id': f"chatcmpl-fake-{count}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{
+                'index': index,
+                'message': {'role': 'assistant', 'content': choice},
+                'finish_reason': 'stop',
+            } for index, choice in enumerate(choices)],
+            'usage': usage,
+        })
+
+    def cached_prefix_tokens(self, messages: list) -> int:
+        """
+        Imitates provider prompt caching: all messages but the last are a prefix, and a prefix seen
+        in an earlier request counts as cached tokens.
+        """
+        if len(messages) < 2:
+            return 0
+        prefix = json.dumps(messages[:-1], sort_keys=True)
+        with self.server.lock:
+            seen = prefix in self.server.prefixes
+            self.server.prefixes.add(prefix)
+        return estimate_tokens("".join(message.get('content') or "" for message in messages[:-1])) if seen else 0
+
+    def stream_completion(self, count: int, model: str, content: str, usage: dict):
+        """
+        Sends the completion as server-sent events, one word per chunk, `token_latency` seconds apart.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def send_chunk(delta: dict, finish_reason: str = None, chunk_usage: dict = None):
+            chunk = {
+                'id': f"chatcmpl-fake-{count}",
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}] if chunk_usage is None else [],
+                'usage': chunk_usage,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send_chunk({'role': 'assistant', 'content': ''})
+        for token in re.findall(r"\S+\s*|\s+", content):
+            time.sleep(self.server.token_latency)
+            send_chunk({'content': token})
+        send_chunk({}, finish_reason='stop')
+        send_chunk({}, chunk_usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+def serve_fake_openai(port: int = 0, latency: float = 0.0, response_text: str = None, throttle_every: int = 0, fail_every: int = 0, retry_after: float = 0.2,
+                      token_latency: float = 0.0, prefill_latency: float = 0.0):
+    """
+    Starts the fake server in a background thread. Returns the server and its base URL (ending in /v1).
+    `latency` delays the response (or the first streamed chunk), `token_latency` each further streamed chunk,
+    and `prefill_latency` adds seconds per 1000 prompt tokens that aren't a cached prefix.
+    Every `throttle_every`-th request is answered with 429 and a Retry-After header and every
+    `fail_every`-th with 503. `server.requests` counts all requests, `server.throttled` the 429s.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOpenAIHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.throttled = 0
+    server.latency = latency
+    server.throttle_every = throttle_every
+    server.fail_every = fail_every
+    server.retry_after = retry_after
+    server.token_latency = token_latency
+    server.prefill_latency = prefill_latency
+    server.prefixes = set()
+    if response_text is None:
+        with open(TEMPLATE_PATH, "r", encoding="utf-8") as f:
+            response_text = f.read()
+    server.response_text = response_text
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--prefill-latency", type=float, default=0.0, help="Seconds per 1000 uncached prompt tokens")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every Nth request with 429 Too Many Requests")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with 503 Service Unavailable")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="Retry-After seconds sent with 429 responses")
+    args = parser.parse_args()
+
+    server, base_url = serve_fake_openai(args.port, args.latency, throttle_every=args.throttle_every, fail_every=args.fail_every, retry_after=args.retry_after, token_latency=args.token_latency,
+                                         prefill_latency=args.prefill_latency)
+    print(f"Serving fake chat completions at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
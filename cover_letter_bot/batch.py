@@ -0,0 +1,442 @@
+import os
+import csv
+import json
+import time
+import asyncio
+import secrets
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from . import generator
+from .browser_pool import DriverPool
+from .fetcher import JobFetcher
+from .cache import JobDescriptionCache
+from .llm_cache import CompletionCache
+from .llm_client import AsyncCoverLetterClient
+from .utils import load_latex_template, estimate_tokens
+from .render import RenderService
+from .jobstore import JobStore
+from . import telemetry
+from . import latex_lint
+from . import ranking
+from .pipeline import BuildManifest, stage_key, file_digest, template_parts, assemble_letter, write_if_changed
+
+OUTPUT_DIR = "output"
+
+DEFAULTS = {
+    'cv_template': 'templates/example_cv.tex',
+    'cover_letter_template': '',
+    'limit': None,
+    'tone': 'formal',
+    'focus': None,
+    'cv_token_budget': None,
+    'variants': 1,
+}
+
+CONCURRENCY = {
+    'scrape': 4,
+    'generate': 8,
+    'render': 2,
+}
+
+def job_options(row: dict, index: int = 0) -> dict:
+    """
+    Turns one manifest row (or API request) into a job: DEFAULTS overridden by the row's non-empty values,
+    with `limit` and `cv_token_budget` as integers and `output_latex` without its extension.
+    """
+    if not row.get('job_url'):
+        raise ValueError("Job has no job_url.")
+    job = dict(DEFAULTS)
+    job.update({key: value for key, value in row.items() if value not in ('', None)})
+    job['limit'] = None if job['limit'] in ('', 'None', None) else int(job['limit'])
+    job['cv_token_budget'] = None if job['cv_token_budget'] in ('', 'None', None) else int(job['cv_token_budget'])
+    job['variants'] = max(1, int(job['variants']))
+    output_latex = job.get('output_latex') or f"cover_letter_{index + 1:04d}"
+    job['output_latex'] = output_latex[:-4] if output_latex.endswith(".tex") else output_latex
+    return job
+
+def load_manifest(path: str) -> list:
+    """
+    Loads a batch manifest from a CSV or JSONL file.
+    Each row needs a `job_url`; `tone`, `focus`, `limit`, `cv_template`, `cover_letter_template`,
+    `cv_token_budget`, `variants` and `output_latex` are optional per-job overrides of DEFAULTS.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    jobs = []
+    for index, row in enumerate(rows):
+        if not row.get('job_url'):
+            raise ValueError(f"Manifest row {index + 1} has no job_url.")
+        jobs.append(job_options(row, index))
+    return jobs
+
+class SkipJob(Exception):
+    """
+    Raised by a stage to finish a job early without counting it as failed.
+    """
+
+async def scrape_stage(job: dict, record: dict, fetcher: JobFetcher, store: JobStore = None, skip_duplicates: bool = True) -> str:
+    job_description, record['scrape_tier'] = await fetcher.fetch(job['job_url'], timings=record['scrape_steps'])
+    if store is not None:
+        metadata = fetcher.metadata.get(job['job_url'], {})
+        stored = await asyncio.to_thread(store.add, job['job_url'], job_description, **metadata)
+        record.update(job_id=stored['job_id'], duplicate_of=stored['duplicate_of'])
+        if stored['duplicate_of'] and skip_duplicates:
+            raise SkipJob(f"repost of {stored['duplicate_of']} (similarity {stored['similarity']})")
+    job_desc_path = os.path.join(OUTPUT_DIR, f"{job['output_latex']}_job_description.txt")
+    with open(job_desc_path, "w", encoding="utf-8") as f:
+        f.write(job_description)
+    return job_description
+
+def build_job_prompt(job: dict, record: dict, job_description: str, templates: dict, template: str, shared_prefix: bool = False):
+    with telemetry.span("prompt.build") as current:
+        cv, record['tokens'] = generator.prepare_cv(templates[job['cv_template']], job_description, job['cv_token_budget'], job['focus'])
+        if shared_prefix:
+            prompt = generator.build_messages(job_description, cv, template, limit=job['limit'], tone=job['tone'], focus=job['focus'])
+            record['prompt_prefix'] = generator.prefix_fingerprint(prompt)
+            record['tokens'].update(generator.segment_tokens(prompt))
+        else:
+            prompt = generator.build_prompt(job_description, cv, template, limit=job['limit'], tone=job['tone'], focus=job['focus'])
+        record['tokens']['prompt_tokens'] = estimate_tokens(prompt)
+        current.set(**record['tokens'])
+    return prompt
+
+async def generate_stage(job: dict, record: dict, job_description: str, client: AsyncCoverLetterClient, templates: dict, debug: bool = False, bypass_cache: bool = False,
+                         shared_prefix: bool = False, manifest: BuildManifest = None):
+    """
+    Generates the job's letter into its .tex file and returns the path. With more than one `variants`, all of
+    them come from a single request and are returned as `{'letters', 'job_description', 'template'}` for the
+    render stage to rank; variants are always generated and rendered, without the build manifest.
+    """
+    out_path = os.path.join(OUTPUT_DIR, f"{job['output_latex']}.tex")
+    if debug:
+        generator.save_cover_letter('This is a dummy cover letter. [DEBUG MODE]', out_path)
+        return out_path
+
+    template = templates[job['cover_letter_template']] if job['cover_letter_template'] else ""
+    if job['variants'] > 1:
+        prompt = build_job_prompt(job, record, job_description, templates, template, shared_prefix)
+        letters = await client.generate_variants(prompt, job['variants'], bypass_cache=bypass_cache)
+        # Each variant is linted like a single letter, with its own outcome in record['lint']; rejected ones are dropped
+        checks = [{'job_url': record['job_url']} for _ in letters]
+        linted = await asyncio.gather(*(lint_letter(letter, template, prompt, client, check) for letter, check in zip(letters, checks)),
+                                      return_exceptions=True)
+        record['lint'] = [check['lint'] for check in checks if 'lint' in check]
+        for check, letter in zip(checks, linted):
+            if isinstance(letter, BaseException) and check.get('lint', {}).get('status') != 'rejected':
+                raise letter
+        letters = [assemble_letter(letter, template) for letter in linted if isinstance(letter, str)]
+        if not letters:
+            raise RuntimeError(f"LaTeX lint rejected all {len(linted)} variants")
+        return {'letters': letters, 'job_description': job_description, 'template': template}
+
+    # The template's preamble only affects layout and is applied when assembling the letter, so it is not a generation input
+    key = stage_key(job_description, templates[job['cv_template']], template_parts(template)[1], job['limit'], job['tone'], job['focus'],
+                    job['cv_token_budget'], shared_prefix, client.model)
+    cover_letter = manifest.load_letter(key) if manifest is not None and not bypass_cache else None
+    if cover_letter is not None:
+        manifest.count('generate', 'skipped')
+        write_if_changed(out_path, assemble_letter(cover_letter, template))
+        return out_path
+
+    prompt = build_job_prompt(job, record, job_description, templates, template, shared_prefix)
+    cover_letter = await client.generate(prompt, bypass_cache=bypass_cache)
+    cover_letter = await lint_letter(cover_letter, template, prompt, client, record)
+    if manifest is None:
+        generator.save_cover_letter(cover_letter, out_path)
+        return out_path
+    manifest.count('generate', 'ran')
+    manifest.store_letter(key, cover_letter)
+    write_if_changed(out_path, assemble_letter(cover_letter, template))
+    return out_path
+
+async def lint_letter(letter: str, template: str, prompt, client: AsyncCoverLetterClient, record: dict) -> str:
+    """
+    Checks a generated letter against its template before it is rendered and fixes mechanical problems
+    (see latex_lint.repair). If it can't be fixed, the model is asked once to correct just the problems
+    found; a letter that is still broken fails the job here instead of in pdflatex.
+    """
+    with telemetry.span("lint") as current:
+        checked = latex_lint.repair(letter, template)
+        current.set(status=checked['status'], fixes=len(checked['fixes']))
+    record['lint'] = {'status': checked['status'], 'fixes': [fix['code'] for fix in checked['fixes']], 'errors': checked['errors']}
+    if checked['status'] == 'unrepairable':
+        print(f"{record['job_url']}: letter can't be compiled ({'; '.join(error['message'] for error in checked['errors'])}), asking for a fix")
+        with telemetry.span("lint.regenerate"):
+            regenerated = await client.generate(latex_lint.fix_messages(prompt, letter, checked['errors']))
+        checked = latex_lint.repair(regenerated, template)
+        if checked['status'] != 'unrepairable':
+            status = 'regenerated'
+        elif any(error['code'] in latex_lint.BREAKS_COMPILE for error in checked['errors']):
+            status = 'rejected'
+        else:
+            # Still off the template's structure, but it compiles: render it rather than fail the job
+            status = 'imperfect'
+        record['lint'].update(status=status, fixes=record['lint']['fixes'] + [fix['code'] for fix in checked['fixes']], errors=checked['errors'])
+    record['lint']['saved'] = latex_lint.saved_work(record['lint'])
+    if record['lint']['status'] == 'rejected':
+        raise RuntimeError("LaTeX lint: " + "; ".join(f"line {error['line']}: {error['message']}" for error in checked['errors'][:3]))
+    return checked['tex']
+
+def lint_summary(results: list) -> dict:
+    """
+    Counts lint outcomes over a batch, one per letter (each variant of a job counts), and the compiles and
+    API calls they saved.
+    """
+    summary = {'clean': 0, 'repaired': 0, 'regenerated': 0, 'imperfect': 0, 'rejected': 0, 'compiles_saved': 0, 'api_calls_saved': 0}
+    for record in results:
+        lints = record.get('lint', [])
+        for lint in lints if isinstance(lints, list) else [lints]:
+            summary[lint['status']] += 1
+            summary['compiles_saved'] += lint['saved']['compiles']
+            summary['api_calls_saved'] += lint['saved']['api_calls']
+    return summary
+
+async def render_variants(job: dict, record: dict, generated: dict, render) -> str:
+    """
+    Renders all variants of a job in parallel, keeps the best one as the job's letter (see ranking.render_and_rank)
+    and records the ranking.
+    """
+    with telemetry.span("variants.rank", variants=len(generated['letters'])) as current:
+        result = await ranking.render_and_rank(generated['letters'], job['output_latex'], generated['job_description'], render,
+                                               generated['template'], job['limit'], OUTPUT_DIR)
+        current.set(best=result['best'])
+    record['variants'] = {
+        'best': result['best'],
+        'ranking': [{key: variant[key] for key in ('index', 'score', 'scores', 'words', 'pages', 'render_status')} for variant in result['ranking']],
+    }
+    if result['pdf_path'] is None:
+        raise RuntimeError(f"none of the {len(generated['letters'])} variants rendered")
+    return result['pdf_path']
+
+async def render_stage(job: dict, record: dict, renderer: RenderService, manifest: BuildManifest = None, generated=None) -> str:
+    if isinstance(generated, dict):
+        return await render_variants(job, record, generated, renderer.render)
+    tex_path = os.path.join(OUTPUT_DIR, f"{job['output_latex']}.tex")
+    pdf_path = os.path.join(OUTPUT_DIR, f"{job['output_latex']}.pdf")
+    if manifest is not None:
+        key = stage_key(file_digest(tex_path))
+        if manifest.fresh(job['output_latex'], 'render', key):
+            manifest.count('render', 'skipped')
+            record['render'] = {'status': 'up to date'}
+            return pdf_path
+
+    result = await renderer.render(tex_path, OUTPUT_DIR)
+    record['render'] = {key: result[key] for key in ('status', 'returncode', 'pages', 'errors', 'seconds')}
+    if result['status'] != 'ok':
+        raise RuntimeError(f"pdflatex {result['status']}: " + "; ".join(error['message'] for error in result['errors'][:3]))
+    if manifest is not None:
+        manifest.count('render', 'ran')
+        manifest.record(job['output_latex'], 'render', key, [result['pdf_path']])
+    return result['pdf_path']
+
+def check_prompt_prefixes(submitted: list):
+    """
+    Reports whether jobs using the same CV and template sent a byte-identical prompt prefix, which is
+    what lets the provider serve it from its prompt cache.
+    """
+    groups = {}
+    for job, record in submitted:
+        if 'prompt_prefix' in record:
+            groups.setdefault((job['cv_template'], job['cover_letter_template']), set()).add(record['prompt_prefix'])
+    for (cv_template, cover_letter_template), fingerprints in groups.items():
+        if len(fingerprints) == 1:
+            print(f"Prompt prefix for {cv_template} / {cover_letter_template}: identical across jobs ({next(iter(fingerprints))})")
+        else:
+            print(f"Warning: {len(fingerprints)} different prompt prefixes for {cv_template} / {cover_letter_template}; "
+                  "per-job CV compaction (cv_token_budget) makes the prefix job-specific")
+
+async def run_batch(jobs: list, api_key: str, concurrency: dict = None, results_path: str = None, debug: bool = False, use_cache: bool = True, regenerate: bool = False, rate_limits: dict = None, use_format: bool = True,
+                    shared_prefix: bool = False, skip_duplicates: bool = True, incremental: bool = True) -> list:
+    """
+    Runs every job through scrape -> generate -> render as an asyncio pipeline.
+    Each stage has its own queue and pool of workers, so a slow scrape does not hold up
+    generation or rendering of other jobs. One result record per job is appended to
+    `results_path` (JSON lines) as soon as the job finishes. Scraped descriptions are cached on
+    disk unless `use_cache` is False, so re-running a batch skips listings that were already scraped.
+    Completions are cached as well; `regenerate` requests fresh ones for every job. All completions
+    share one async OpenAI client, admitted under `rate_limits` (requests_per_minute, tokens_per_minute).
+    With `shared_prefix`, prompts are sent as a shared system message plus a per-job message
+    (generator.build_messages) and the batch checks that the shared part never changed.
+    Every scraped listing is indexed in the job store; reposts of a listing that is already stored
+    (same or near-identical description under another job ID) are skipped unless `skip_duplicates` is False.
+    With `incremental`, stages whose inputs haven't changed since the last run are skipped (see BuildManifest):
+    letters are only generated for new prompt inputs and PDFs only rendered when their .tex changed.
+    """
+    concurrency = {**CONCURRENCY, **(concurrency or {})}
+    results_path = results_path or os.path.join(OUTPUT_DIR, "batch_results.jsonl")
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # CV and template files are shared by most jobs, so read each one only once
+    templates = {}
+    for job in jobs:
+        for key in ('cv_template', 'cover_letter_template'):
+            if job[key] and job[key] not in templates:
+                templates[job[key]] = load_latex_template(job[key])
+
+    # Selenium scrapes block and run in threads, so the executor has to be large enough
+    # for the scrape stage to reach its concurrency limit
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency['scrape'] + 4))
+    renderer = RenderService(workers=concurrency['render'], use_format=use_format)
+
+    # Listings are fetched over plain HTTP first; the browsers are only started for pages that
+    # need JavaScript, and then reused across all jobs of the batch
+    pool = DriverPool(size=concurrency['scrape'])
+    cache = JobDescriptionCache() if use_cache else None
+    # Debug runs never call the API, so they need neither a client nor an API key
+    client = None if debug else AsyncCoverLetterClient(api_key, max_concurrency=concurrency['generate'], cache=CompletionCache(), **(rate_limits or {}))
+    fetcher = JobFetcher(pool=pool, cache=cache, connections=concurrency['scrape'])
+    store = JobStore()
+    manifest = BuildManifest() if incremental and not debug else None
+
+    scrape_queue, generate_queue, render_queue = asyncio.Queue(), asyncio.Queue(), asyncio.Queue()
+    results = []
+    remaining = len(jobs)
+    done = asyncio.Event()
+
+    def finish(record: dict):
+        nonlocal remaining
+        record['total_seconds'] = round(time.perf_counter() - record.pop('_started'), 3)
+        results.append(record)
+        with open(results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        remaining -= 1
+        if remaining == 0:
+            done.set()
+
+    async def worker(stage: str, queue: asyncio.Queue, next_queue: asyncio.Queue, run):
+        while True:
+            job, record, payload = await queue.get()
+            started = time.perf_counter()
+            try:
+                with telemetry.span(f"stage.{stage}", trace_id=record['trace_id'], job=job['output_latex']):
+                    payload = await run(job, record, payload)
+            except SkipJob as e:
+                record['timings'][stage] = round(time.perf_counter() - started, 3)
+                record.update(status='skipped', stage=stage, reason=str(e))
+                finish(record)
+                continue
+            except Exception as e:
+                record['timings'][stage] = round(time.perf_counter() - started, 3)
+                record.update(status='failed', stage=stage, error=str(e))
+                finish(record)
+                continue
+            record['timings'][stage] = round(time.perf_counter() - started, 3)
+            if next_queue is None:
+                record.update(status='ok', output_pdf=payload)
+                finish(record)
+            else:
+                await next_queue.put((job, record, payload))
+
+    stages = [
+        ('scrape', scrape_queue, generate_queue, lambda job, record, _: scrape_stage(job, record, fetcher, store, skip_duplicates)),
+        ('generate', generate_queue, render_queue, lambda job, record, job_description: generate_stage(job, record, job_description, client, templates, debug, regenerate, shared_prefix, manifest)),
+        ('render', render_queue, None, lambda job, record, generated: render_stage(job, record, renderer, manifest, generated)),
+    ]
+    workers = [
+        asyncio.create_task(worker(stage, queue, next_queue, run))
+        for stage, queue, next_queue, run in stages
+        for _ in range(concurrency[stage])
+    ]
+
+    submitted = []
+    for job in jobs:
+        record = {
+            'job_url': job['job_url'],
+            'output_latex': os.path.join(OUTPUT_DIR, f"{job['output_latex']}.tex"),
+            'timings': {},
+            'scrape_steps': {},
+            'trace_id': secrets.token_hex(16),
+            '_started': time.perf_counter(),
+        }
+        submitted.append((job, record))
+        scrape_queue.put_nowait((job, record, None))
+
+    try:
+        if jobs:
+            await done.wait()
+    finally:
+        for task in workers:
+            task.cancel()
+        await fetcher.close()
+        await asyncio.to_thread(pool.close)
+        await asyncio.to_thread(renderer.close)
+        print(f"Scrape tiers: {fetcher.stats}")
+        print(f"Job store: {store.stats}")
+        store.close()
+        if cache is not None:
+            print(f"Job description cache: {cache.stats}")
+        if client is not None:
+            print(f"Completion cache: {client.cache.stats}")
+            print(f"OpenAI client: {client.summary()}")
+        if manifest is not None:
+            print(f"Stages run/skipped: {manifest.stats}")
+        if shared_prefix:
+            check_prompt_prefixes(submitted)
+        if not debug:
+            print(f"LaTeX lint: {lint_summary(results)}")
+        if client is not None:
+            await client.close()
+            client.cache.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Cover Letter Bot batch mode")
+    parser.add_argument("manifest", help="CSV or JSONL file with one job_url (plus optional overrides) per row")
+    parser.add_argument("--results", default=os.path.join(OUTPUT_DIR, "batch_results.jsonl"), help="Where to append the per-job result records")
+    parser.add_argument("--scrape-concurrency", type=int, default=CONCURRENCY['scrape'], help="Number of job pages scraped at once")
+    parser.add_argument("--generate-concurrency", type=int, default=CONCURRENCY['generate'], help="Number of concurrent OpenAI requests")
+    parser.add_argument("--render-concurrency", type=int, default=CONCURRENCY['render'], help="Number of concurrent pdflatex runs")
+    parser.add_argument("--cv-token-budget", type=int, default=None, help="Send only the CV content most relevant to each job, within this many tokens")
+    parser.add_argument("--variants", type=int, default=None, help="Generate this many letters per job in one request and keep the best (per-job `variants` column)")
+    parser.add_argument("--shared-prefix", action="store_true", help="Send instructions, CV and template as a shared system message so the provider can cache it")
+    parser.add_argument("--keep-duplicates", action="store_true", help="Generate letters for reposts of listings already in the job store")
+    parser.add_argument("--no-incremental", action="store_true", help="Run every stage even if its inputs didn't change since the last run")
+    parser.add_argument("--trace", default=telemetry.TRACE_PATH, help="Append timing spans as JSON lines to this file ('' to disable)")
+    parser.add_argument("--otel", action="store_true", help="Also emit the spans through OpenTelemetry (needs opentelemetry-api and an SDK)")
+    parser.add_argument("--no-cache", action="store_true", help="Scrape every listing even if it is in the job description cache")
+    parser.add_argument("--requests-per-minute", type=float, default=500, help="OpenAI request budget")
+    parser.add_argument("--tokens-per-minute", type=float, default=200000, help="OpenAI token budget (estimated prompt tokens plus max_tokens)")
+    parser.add_argument("--no-format", action="store_true", help="Compile every letter from scratch instead of reusing a precompiled preamble")
+    parser.add_argument("--regenerate", action="store_true", help="Bypass the completion cache and request fresh cover letters")
+    parser.add_argument("--debug", action="store_true", help="Run in debug mode (no API call, dummy output)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    jobs = load_manifest(args.manifest)
+    if args.cv_token_budget is not None:
+        for job in jobs:
+            job['cv_token_budget'] = job['cv_token_budget'] or args.cv_token_budget
+    if args.variants is not None:
+        for job in jobs:
+            job['variants'] = max(job['variants'], args.variants)
+    concurrency = {
+        'scrape': args.scrape_concurrency,
+        'generate': args.generate_concurrency,
+        'render': args.render_concurrency,
+    }
+    if args.trace:
+        telemetry.configure(args.trace, otel=args.otel)
+    started = time.perf_counter()
+    results = asyncio.run(run_batch(jobs, api_key, concurrency, args.results, debug=args.debug, use_cache=not args.no_cache, regenerate=args.regenerate,
+                                  rate_limits={'requests_per_minute': args.requests_per_minute, 'tokens_per_minute': args.tokens_per_minute},
+                                  use_format=not args.no_format, shared_prefix=args.shared_prefix,
+                                  skip_duplicates=not args.keep_duplicates, incremental=not args.no_incremental))
+    elapsed = time.perf_counter() - started
+
+    succeeded = sum(1 for record in results if record['status'] == 'ok')
+    skipped = sum(1 for record in results if record['status'] == 'skipped')
+    if args.trace:
+        telemetry.shutdown()
+        print(f"Spans written to {args.trace}; summarize with: python -m cover_letter_bot.telemetry report {args.trace}")
+    print(f"{succeeded}/{len(results)} cover letters generated in {elapsed:.1f}s ({skipped} duplicates skipped). Results written to {args.results}")
+
+if __name__ == "__main__":
+    main()
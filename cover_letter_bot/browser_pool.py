@@ -0,0 +1,122 @@
+import threading
+from contextlib import contextmanager
+from selenium.common.exceptions import WebDriverException
+from .telemetry import span
+
+class DriverPool:
+    """
+    A pool of long-lived headless Chrome drivers that scrapes lease from.
+
+    Drivers are started lazily up to `size`, checked for health before each lease and
+    recycled after `max_pages` page loads or as soon as the browser crashes, so repeated
+    and concurrent scrapes only pay for browser startup once per driver.
+    """
+
+    def __init__(self, size: int = 2, max_pages: int = 50, headless: bool = True):
+        self.size = size
+        self.max_pages = max_pages
+        self.headless = headless
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []  # [driver, pages_served] pairs ready to be leased
+        self._closed = False
+        self.stats = {'started': 0, 'leases': 0, 'recycled': 0, 'crashed': 0}
+
+    def _start_driver(self):
+        from .scraper import create_driver
+
+        with span("driver.start", headless=self.headless):
+            driver = create_driver(headless=self.headless)
+        with self._lock:
+            self.stats['started'] += 1
+        return driver
+
+    @staticmethod
+    def _is_healthy(driver) -> bool:
+        try:
+            driver.execute_script("return document.readyState")
+            return True
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Could not quit driver: {e}")
+
+    def warm(self, count: int = None):
+        """
+        Starts drivers ahead of time so the first scrapes don't pay for browser startup.
+        """
+        count = self.size if count is None else min(count, self.size)
+        with self._lock:
+            missing = count - len(self._idle)
+        for _ in range(missing):
+            driver = self._start_driver()
+            with self._lock:
+                self._idle.append([driver, 0])
+
+    @contextmanager
+    def lease(self):
+        """
+        Leases a driver for the duration of the `with` block.
+        Blocks while all `size` drivers are in use.
+        """
+        if self._closed:
+            raise RuntimeError("DriverPool is closed.")
+
+        self._slots.acquire()
+        entry = None
+        try:
+            while entry is None:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    entry = [self._start_driver(), 0]
+                elif not self._is_healthy(entry[0]):
+                    self._quit(entry[0])
+                    with self._lock:
+                        self.stats['crashed'] += 1
+                    entry = None
+
+            with self._lock:
+                self.stats['leases'] += 1
+            try:
+                yield entry[0]
+            except WebDriverException:
+                # The browser is in an unknown state, don't hand it out again
+                self._quit(entry[0])
+                with self._lock:
+                    self.stats['crashed'] += 1
+                entry = None
+                raise
+            finally:
+                if entry is not None:
+                    entry[1] += 1
+                    if entry[1] >= self.max_pages or self._closed:
+                        self._quit(entry[0])
+                        with self._lock:
+                            self.stats['recycled'] += 1
+                    else:
+                        with self._lock:
+                            self._idle.append(entry)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+        Quits all idle drivers. Drivers currently leased are quit when they are returned.
+        """
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver, _ in idle:
+            self._quit(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
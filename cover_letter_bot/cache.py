@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+CACHE_DIR = "output/.cache/jobs"
+
+# Click and campaign trackers (besides utm_*) that no site uses to identify a page
+TRACKING_PARAMS = {'fbclid', 'gclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid'}
+
+# Parameters LinkedIn adds for tracking and search context; on other sites names like `position` can pick the listing
+LINKEDIN_TRACKING_PARAMS = {
+    'eBP', 'refId', 'trackingId', 'trk', 'trkInfo', 'lipi', 'originalSubdomain', 'position', 'pageNum',
+    'origin', 'originToLandingJobPostings', 'geoId', 'f_C', 'currentJobId',
+}
+
+LINKEDIN_JOB_PATH = re.compile(r"/jobs/view/(?:[^/]*-)?(\d+)")
+
+def normalize_job_id(url: str) -> str:
+    """
+    Returns a stable ID for a job listing URL. LinkedIn URLs map to `linkedin:<job id>` no matter
+    which search page or tracking parameters they came with; other URLs are reduced to host, path
+    and their query parameters in sorted order, without utm_* and the click trackers in TRACKING_PARAMS.
+    """
+    parsed = urlparse(url.strip())
+    query = parse_qsl(parsed.query, keep_blank_values=True)
+    tracking = TRACKING_PARAMS
+
+    if parsed.netloc.endswith("linkedin.com"):
+        match = LINKEDIN_JOB_PATH.search(parsed.path)
+        if match:
+            return f"linkedin:{match.group(1)}"
+        for key, value in query:
+            if key == 'currentJobId' and value.isdigit():
+                return f"linkedin:{value}"
+        tracking = TRACKING_PARAMS | LINKEDIN_TRACKING_PARAMS
+
+    query = sorted((key, value) for key, value in query if key not in tracking and not key.startswith('utm_'))
+    path = parsed.path.rstrip('/') or '/'
+    return f"url:{parsed.netloc.lower()}{path}" + (f"?{urlencode(query)}" if query else "")
+
+class JobDescriptionCache:
+    """
+    On-disk cache of scraped job descriptions keyed by normalized job ID.
+
+    Each entry is a JSON file named after the hash of the job ID. Entries older than `ttl` seconds
+    are treated as misses; once there are more than `max_entries`, the least recently used ones
+    (by file modification time, which is bumped on every hit) are evicted.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, ttl: float = 7 * 24 * 3600, max_entries: int = 5000):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(normalize_job_id(url).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, url: str) -> str:
+        """
+        Returns the cached job description for `url`, or None on a miss.
+        """
+        path = self._path(url)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            fetched_at, text = float(entry['fetched_at']), entry['text']
+            if not isinstance(text, str):
+                raise TypeError(f"text is {type(text).__name__}")
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+            # A truncated entry or one from an older format; drop it so the next put replaces it cleanly
+            self._discard(path)
+            self._count('misses')
+            return None
+
+        if self.ttl is not None and time.time() - fetched_at > self.ttl:
+            self._count('expired')
+            self._count('misses')
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # evicted by another process in the meantime
+        self._count('hits')
+        return text
+
+    def _discard(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._entries is not None:
+                self._entries -= 1
+
+    def put(self, url: str, text: str, source: str = None):
+        """
+        Stores the job description for `url`, replacing any previous entry.
+        """
+        path = self._path(url)
+        entry = {
+            'job_id': normalize_job_id(url),
+            'url': url,
+            'source': source,
+            'fetched_at': time.time(),
+            'text': text,
+        }
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        is_new = not os.path.exists(path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._entries is None:
+                self._entries = len(self._entry_files())
+            elif is_new:
+                self._entries += 1
+            over_limit = self._entries > self.max_entries
+        if over_limit:
+            self.evict()
+
+    def _entry_files(self) -> list:
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+
+    def evict(self):
+        """
+        Removes the least recently used entries until at most `max_entries` remain.
+        """
+        with self._lock:
+            files = sorted(self._entry_files(), key=lambda entry: entry.stat().st_mtime)
+            for entry in files[:max(0, len(files) - self.max_entries)]:
+                try:
+                    os.remove(entry.path)
+                    self.stats['evictions'] += 1
+                except FileNotFoundError:
+                    pass
+            self._entries = min(len(files), self.max_entries)
+
+    def clear(self):
+        for entry in self._entry_files():
+            os.remove(entry.path)
+        with self._lock:
+            self._entries = 0
@@ -1,19 +1,25 @@
 import os
 import sys
-import asyncio
-import aiohttp
-from pathlib import Path
-from rich.console import Console
-from rich.panel import Panel
-import inquirer
-from cover_letter_bot import generator
+import json
 import glob
 import argparse
-from dotenv import load_dotenv
-from .scraper import scrape_job_description
-from .utils import render_pdf_from_latex, clear_aux_files
+from . import telemetry
 
-console = Console()
+# Only the standard library and telemetry are imported up front. rich, inquirer, openai, aiohttp,
+# BeautifulSoup, Selenium and even asyncio are imported by the commands that use them, so `--help`,
+# `prompt-only` and `render-only` start without loading any of them.
+
+_console = None
+
+def get_console():
+    """
+    The shared rich console, created on first use.
+    """
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    return _console
 
 OUTPUT_DIR = "output"
 
@@ -27,29 +33,36 @@ DEFAULTS = {
     'output_latex': 'cover_letter.tex'
 }
 
-async def scrape_job_description(url):
-    """Asynchronously scrape job description from URL"""
+async def scrape_job_description(url, use_cache=True):
+    """Asynchronously scrape job description from URL, falling back to Selenium if the static page has none"""
+    from .fetcher import JobFetcher
+    from .cache import JobDescriptionCache
+    from .jobstore import JobStore
 
+    console = get_console()
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    # Basic extraction - you might want to use a proper HTML parser
-                    # This is a simple example - you'd want more sophisticated parsing
-                    return f"Job description scraped from: {url}\n\n{html[:1000]}..."  # First 1000 chars
-                else:
-                    return f"Failed to scrape job description from {url}. Status: {response.status}"
+        async with JobFetcher(cache=JobDescriptionCache() if use_cache else None) as fetcher:
+            job_description, tier = await fetcher.fetch(url)
+            console.print(f"[green]Job description fetched via {tier}.[/green]")
+        with JobStore() as store:
+            stored = store.add(url, job_description, **fetcher.metadata.get(url, {}))
+        if stored['duplicate_of']:
+            console.print(f"[yellow]This listing repeats {stored['duplicate_of']} (similarity {stored['similarity']}).[/yellow]")
+        return job_description
     except Exception as e:
         return f"Error scraping job description: {str(e)}"
 
 def fancy_welcome(debug=False):
+    from rich.panel import Panel
+
     msg = '[bold cyan]Welcome to Cover Letter Bot![/bold cyan]'
     if debug:
         msg += ' [bold red]DEBUG MODE[/bold red]'
-    console.print(Panel(msg, expand=False))
+    get_console().print(Panel(msg, expand=False))
 
 def select_template(prompt, directory, default, allow_none=False, debug=False):
+    import inquirer
+
     tex_files = [os.path.basename(f) for f in glob.glob(f'{directory}/*.tex')]
     if allow_none:
         tex_files = ['None'] + tex_files
@@ -62,7 +75,10 @@ def select_template(prompt, directory, default, allow_none=False, debug=False):
         return ''
     return os.path.join(directory, selected)
 
-async def prompt_user(debug=False):
+async def prompt_user(debug=False, use_cache=True):
+    import asyncio
+
+    console = get_console()
     fancy_welcome(debug)
     
     # Job URL - start scraping immediately after this
@@ -72,7 +88,7 @@ async def prompt_user(debug=False):
     scraping_task = None
     if job_url:
         console.print("[yellow]Starting to scrape job description...[/yellow]")
-        scraping_task = asyncio.create_task(scrape_job_description(job_url))
+        scraping_task = asyncio.create_task(scrape_job_description(job_url, use_cache))
     
     # Continue with other prompts while scraping happens
     cv_template = select_template('Select your CV template', 'templates', DEFAULTS['cv_template'], debug=debug)
@@ -101,15 +117,64 @@ async def prompt_user(debug=False):
         'job_description': job_description,
     }
 
-async def async_main():
+def prompt_only(args) -> int:
+    """
+    Builds the prompt for a saved job description and prints it with its token counts, without
+    scraping or calling the API.
+    """
+    from . import generator
+
+    if not os.path.exists(args.job_desc):
+        print(f"No job description at {args.job_desc}; save one there or pass --job-desc.", file=sys.stderr)
+        return 1
+    with open(args.job_desc, 'r', encoding='utf-8') as f:
+        job_desc = f.read()
+    with telemetry.span("prompt.build") as current:
+        cv, cv_stats = generator.prepare_cv(generator.load_latex_template(args.cv), job_desc, args.cv_token_budget, args.focus)
+        template = generator.load_latex_template(args.template) if args.template else ""
+        if args.messages:
+            prompt = generator.build_messages(job_desc, cv, template, args.limit, args.tone, args.focus)
+        else:
+            prompt = generator.build_prompt(job_desc, cv, template, args.limit, args.tone, args.focus)
+        current.set(prompt_tokens=generator.estimate_tokens(prompt), **cv_stats)
+    text = json.dumps(prompt, indent=2, ensure_ascii=False) if args.messages else prompt
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Prompt written to {args.out}")
+    else:
+        print(text)
+    print(f"CV: {cv_stats['cv_tokens_before']} tokens, {cv_stats['cv_tokens_after']} sent; prompt: {generator.estimate_tokens(prompt)} tokens", file=sys.stderr)
+    if args.messages:
+        tokens = generator.segment_tokens(prompt)
+        print(f"Shared prefix {generator.prefix_fingerprint(prompt)}: {tokens['prefix_tokens']} tokens, per-job suffix: {tokens['suffix_tokens']} tokens", file=sys.stderr)
+    return 0
+
+def render_only(args) -> int:
+    """
+    Renders an existing .tex file to a PDF next to it.
+    """
+    from .utils import render_pdf_from_latex
+
+    out_dir = os.path.dirname(args.tex) or OUTPUT_DIR
+    tex_path = os.path.join(out_dir, os.path.basename(args.tex))
+    if not os.path.exists(tex_path):
+        print(f"No LaTeX file at {tex_path}.", file=sys.stderr)
+        return 1
+    result = render_pdf_from_latex(os.path.basename(args.tex), out_dir=out_dir)
+    return 0 if result['status'] == 'ok' else 1
+
+async def async_main(args):
+    from dotenv import load_dotenv
+    from cover_letter_bot import generator
+    from .utils import render_pdf_from_latex
+
     load_dotenv()
     api_key = os.getenv('OPENAI_API_KEY', 'sk-...')
-    parser = argparse.ArgumentParser(description='Cover Letter Bot CLI')
-    parser.add_argument('--debug', action='store_true', help='Run in debug mode (no API call, dummy output)')
-    args = parser.parse_args()
     debug = args.debug
+    console = get_console()
     
-    user_inputs = await prompt_user(debug)
+    user_inputs = await prompt_user(debug, use_cache=not args.no_cache)
     
     # Save job description to file
     job_desc_path = 'output/job_description.txt'
@@ -123,21 +188,78 @@ async def async_main():
         console.print(f"Cover letter saved to {user_inputs['output_latex']} [DEBUG MODE]")
         render_pdf_from_latex(user_inputs['output_latex'], out_dir=OUTPUT_DIR)
     else:
-        generator.generator_main(
-            job_desc_path=job_desc_path,
-            cv_path=user_inputs['cv_template'],
-            api_key=api_key,
-            template_path=user_inputs['cover_letter_template'] or None,
-            out_name=user_inputs['output_latex']
-        )
+        from .llm_cache import CompletionCache
+        from .llm_client import AsyncCoverLetterClient
+
+        timings = {}
+        cache = CompletionCache()
+        try:
+            async with AsyncCoverLetterClient(api_key, cache=cache) as client:
+                result = await generator.async_generator_main(
+                    job_desc_path=job_desc_path,
+                    cv_path=user_inputs['cv_template'],
+                    client=client,
+                    template_path=user_inputs['cover_letter_template'] or None,
+                    out_name=user_inputs['output_latex'],
+                    bypass_cache=args.regenerate,
+                    stream=args.stream,
+                    cv_token_budget=args.cv_token_budget,
+                    on_token=lambda token: console.out(token, end='', highlight=False),
+                    timings=timings,
+                    variants=args.variants,
+                    limit=user_inputs['limit']
+                )
+        finally:
+            cache.close()
+        if args.stream:
+            console.print(f"\n[cyan]First token after {timings.get('first_token', 0)}s, done after {timings.get('total', 0)}s[/cyan]")
         console.print(f"Cover letter saved to {os.path.join(OUTPUT_DIR, user_inputs['output_latex'])}")
 
-        render_pdf_from_latex(user_inputs['output_latex'], out_dir=OUTPUT_DIR)
-        
-        clear_aux_files()
+        if result is not None:
+            # Variants were rendered while ranking them
+            console.print(f"Kept variant {result['best']} ({result['pdf_path'] or 'no variant rendered'}); the others are in output/variants/")
+        else:
+            render_pdf_from_latex(user_inputs['output_latex'], out_dir=OUTPUT_DIR)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Cover Letter Bot CLI')
+    parser.add_argument('--debug', action='store_true', help='Run in debug mode (no API call, dummy output)')
+    parser.add_argument('--no-cache', action='store_true', help='Scrape the job listing even if it is in the job description cache')
+    parser.add_argument('--regenerate', action='store_true', help='Bypass the completion cache and request a fresh cover letter')
+    parser.add_argument('--cv-token-budget', type=int, default=None, help='Send only the CV content most relevant to the job, within this many tokens')
+    parser.add_argument('--trace', default=None, help='Append timing spans as JSON lines to this file')
+    parser.add_argument('--stream', action='store_true', help='Stream the cover letter to the console and the .tex file while it is generated')
+    parser.add_argument('--variants', type=int, default=1, help='Generate this many letters in one request, render them all and keep the best')
+    subcommands = parser.add_subparsers(dest='command', help='Run a single stage instead of the interactive workflow')
+
+    prompt_parser = subcommands.add_parser('prompt-only', help='Print the prompt for a saved job description, without calling the API')
+    prompt_parser.add_argument('--job-desc', default=os.path.join(OUTPUT_DIR, 'job_description.txt'), help='Job description text file (default: the last scraped one)')
+    prompt_parser.add_argument('--cv', default=DEFAULTS['cv_template'], help='LaTeX CV')
+    prompt_parser.add_argument('--template', default='', help='LaTeX cover letter template')
+    prompt_parser.add_argument('--limit', type=int, default=DEFAULTS['limit'], help='Word limit')
+    prompt_parser.add_argument('--tone', default=DEFAULTS['tone'], help='Tone of the letter')
+    prompt_parser.add_argument('--focus', default=None, help='CV section to focus on')
+    prompt_parser.add_argument('--cv-token-budget', type=int, default=argparse.SUPPRESS, help='Compact the CV to this many tokens')
+    prompt_parser.add_argument('--messages', action='store_true', help='Print the shared-prefix chat messages (as JSON) instead of the single prompt')
+    prompt_parser.add_argument('--out', default=None, help='Write the prompt to this file instead of stdout')
+
+    render_parser = subcommands.add_parser('render-only', help='Render an existing .tex file to a PDF')
+    render_parser.add_argument('tex', help='LaTeX file to render; the PDF is written next to it')
+    return parser
 
 def main():
-    asyncio.run(async_main())
+    args = build_parser().parse_args()
+    if args.trace:
+        telemetry.configure(args.trace)
+    try:
+        if args.command == 'prompt-only':
+            sys.exit(prompt_only(args))
+        if args.command == 'render-only':
+            sys.exit(render_only(args))
+        import asyncio
+        asyncio.run(async_main(args))
+    finally:
+        telemetry.shutdown()
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,130 @@
+import re
+import math
+from functools import lru_cache
+from collections import Counter
+from .utils import estimate_tokens
+
+SECTION = re.compile(r"\\(?:sub)?section\*?\{([^}]*)\}")
+ITEM = re.compile(r"\\item(?:\[[^\]]*\])?")
+COMMENT = re.compile(r"(?<!\\)%.*")
+ENVIRONMENT = re.compile(r"\\(?:begin|end)\{[^}]*\}(?:\[[^\]]*\])?(?:\{[^}]*\})*")
+COMMAND_WITH_ARGUMENT = re.compile(r"\\[a-zA-Z]+\*?(?:\[[^\]]*\])?\{([^{}]*)\}")
+COMMAND = re.compile(r"\\[a-zA-Z]+\*?(?:\[[^\]]*\])?")
+ESCAPED = re.compile(r"\\([&%$#_{}])")
+WORD = re.compile(r"\w+", re.UNICODE)
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+def latex_to_text(tex: str) -> str:
+    """
+    Strips LaTeX markup down to the readable text: commands are dropped but their arguments kept,
+    `\\\\` becomes a line break and escaped special characters are unescaped.
+    """
+    text = COMMENT.sub("", tex)
+    text = ENVIRONMENT.sub("", text)
+    text = text.replace("\\\\", "\n").replace("---", "—").replace("--", "–").replace("~", " ")
+    # Innermost arguments first, until nested commands are resolved
+    previous = None
+    while previous != text:
+        previous, text = text, COMMAND_WITH_ARGUMENT.sub(r"\1", text)
+    text = ESCAPED.sub(r"\1", text)
+    text = COMMAND.sub("", text).replace("{", "").replace("}", "")
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+@lru_cache(maxsize=32)
+def parse_cv(cv_tex: str) -> tuple:
+    """
+    Splits a LaTeX CV into `(title, header_text, items)` sections, all plain text. Text before the first
+    section is returned as a section titled "Header". Sections before the first `\\item` list (name, contact
+    details) keep their text as the header; after that, each bullet and each line of text outside a list
+    is one item. Cached per CV source.
+    """
+    body = cv_tex.split("\\begin{document}", 1)[-1].split("\\end{document}", 1)[0]
+    parts = SECTION.split(body)
+    chunks = [("Header", parts[0])] + list(zip(parts[1::2], parts[2::2]))
+
+    sections = []
+    seen_list = False
+    for title, chunk in chunks:
+        pieces = ITEM.split(chunk)
+        header = latex_to_text(pieces[0])
+        items = tuple(text for text in (latex_to_text(piece) for piece in pieces[1:]) if text)
+        seen_list = seen_list or len(pieces) > 1
+        if seen_list:
+            header, items = "", tuple(header.splitlines()) + items
+        if header or items:
+            sections.append((latex_to_text(title), header, items))
+    return tuple(sections)
+
+def tokenize(text: str) -> list:
+    return [word.lower() for word in WORD.findall(text)]
+
+def bm25_scores(documents: list, query: str) -> list:
+    """
+    Scores each document against the query with Okapi BM25.
+    """
+    tokenized = [tokenize(document) for document in documents]
+    if not tokenized:
+        return []
+    average_length = sum(len(tokens) for tokens in tokenized) / len(tokenized) or 1
+    document_frequency = Counter(term for tokens in tokenized for term in set(tokens))
+    query_terms = set(tokenize(query))
+
+    scores = []
+    for tokens in tokenized:
+        frequencies = Counter(tokens)
+        score = 0.0
+        for term in query_terms & frequencies.keys():
+            idf = math.log(1 + (len(tokenized) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            tf = frequencies[term]
+            score += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * len(tokens) / average_length))
+        scores.append(score)
+    return scores
+
+def compact_cv(cv_tex: str, job_desc: str, token_budget: int = 400, focus: str = None) -> tuple:
+    """
+    Returns a plain-text version of the CV containing only the content most relevant to the job listing.
+
+    Section headers (name and contact details), any section whose title mentions `focus` and any bullet that mentions
+    it are always kept; the remaining bullets that share terms with the job description are ranked with BM25 and
+    added best-first while they and the headers fit into `token_budget`. Kept content is printed in the CV's original order. Returns `(text, stats)` where stats
+    holds the estimated token counts of the raw CV and the compacted text.
+    """
+    sections = parse_cv(cv_tex)
+    bullets = [(index, position, item) for index, (_, _, items) in enumerate(sections) for position, item in enumerate(items)]
+    scores = bm25_scores([item for _, _, item in bullets], job_desc)
+
+    kept = set()
+    used = sum(estimate_tokens(header) for _, header, _ in sections)
+    needle = latex_to_text(focus).lower() if focus else None
+    for index, position, item in bullets:
+        # The prompt asks the model to focus on this, so it must survive compaction
+        if needle and (needle in sections[index][0].lower() or needle in item.lower()):
+            kept.add((index, position))
+            used += estimate_tokens(item)
+
+    for score, (index, position, item) in sorted(zip(scores, bullets), key=lambda pair: -pair[0]):
+        cost = estimate_tokens(item)
+        if score <= 0 or (index, position) in kept or used + cost > token_budget:
+            continue
+        kept.add((index, position))
+        used += cost
+
+    lines = []
+    for index, (title, header, items) in enumerate(sections):
+        selected = [f"- {item}" for position, item in enumerate(items) if (index, position) in kept]
+        if title != "Header" and (header or selected):
+            lines.append(f"\n{title}")
+        lines.extend([*([header] if header else []), *selected])
+    text = "\n".join(lines).strip()
+
+    stats = {
+        'cv_tokens_before': estimate_tokens(cv_tex),
+        'cv_tokens_after': estimate_tokens(text),
+        'bullets_kept': len(kept),
+        'bullets_total': len(bullets),
+    }
+    return text, stats
@@ -0,0 +1,233 @@
+import re
+import json
+import html
+from html.parser import HTMLParser
+
+MARKUP_CLASS = "show-more-less-html__markup"
+
+# Only the tags that can hold the description or its JSON-LD are located; the rest of the page is never parsed
+DIV_START = re.compile(r"<div\s[^>]*?\bclass\s*=\s*[\"']([^\"']*)[\"']", re.I)
+JSON_LD = re.compile(r"<script\b[^>]*\btype\s*=\s*[\"']application/ld\+json[\"'][^>]*>(.*?)</script\s*>", re.I | re.S)
+TOP_CARD = {
+    'title': re.compile(r"<h1\b[^>]*\bclass\s*=\s*[\"'][^\"']*\btopcard__title\b[^>]*>(.*?)</h1\s*>", re.I | re.S),
+    'company': re.compile(r"<a\b[^>]*\bclass\s*=\s*[\"'][^\"']*\btopcard__org-name-link\b[^>]*>(.*?)</a\s*>", re.I | re.S),
+    'location': re.compile(r"<span\b[^>]*\bclass\s*=\s*[\"'][^\"']*\btopcard__flavor--bullet\b[^>]*>(.*?)</span\s*>", re.I | re.S),
+}
+
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'b'}
+BLOCK_TAGS = {'p', 'div', 'li', 'ul', 'ol', 'section', 'br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table', 'tr', 'td'}
+SKIPPED_TAGS = {'script', 'style', 'template'}
+CHUNK = 1 << 16
+
+# Runs in the browser: returns only the description markup, the JSON-LD blocks and the top card fields
+# instead of the whole page source
+EXTRACT_SCRIPT = """
+const text = selector => { const element = document.querySelector(selector); return element ? element.textContent.trim() : null; };
+const markup = document.querySelector(arguments[0]);
+return {
+    markup: markup ? markup.outerHTML : null,
+    json_ld: Array.from(document.querySelectorAll('script[type="application/ld+json"]'), script => script.textContent),
+    title: text('.topcard__title'),
+    company: text('.topcard__org-name-link'),
+    location: text('.topcard__flavor--bullet'),
+};
+"""
+
+DIAGNOSTIC_SCRIPT = """
+return {
+    ids: Array.from(new Set(Array.from(document.querySelectorAll('[id]'), element => element.id))),
+    buttons: Array.from(document.querySelectorAll('button'), button => ({id: button.id || null, class: button.className || null}))
+        .filter(button => button.id || button.class),
+};
+"""
+
+class TextExtractor(HTMLParser):
+    """
+    Collects the text of one HTML element (or a whole fragment) without building a tree: one stripped
+    line per text node, like BeautifulSoup's `get_text("\\n", strip=True)`, each marked as a heading if
+    its block holds nothing but bold or heading text. With `root='div'`, parsing stops once the first
+    div closes.
+    """
+
+    def __init__(self, root: str = None):
+        super().__init__(convert_charrefs=True)
+        self.root = root
+        self.depth = 0
+        self.done = False
+        self.lines = []
+        self._emphasis = 0
+        self._skipped = 0
+        self._block = 0
+        self._plain_blocks = set()
+        self._pending = []
+
+    def flush(self):
+        # A text node can reach handle_data in pieces (at the end of each fed chunk), so it is only
+        # stripped and recorded once the next tag starts or the input ends
+        data = "".join(self._pending).strip()
+        self._pending = []
+        if not data:
+            return
+        if not self._emphasis:
+            self._plain_blocks.add(self._block)
+        self.lines.append((data, self._emphasis > 0, self._block))
+
+    def handle_starttag(self, tag, attrs):
+        self.flush()
+        if tag == self.root:
+            self.depth += 1
+        if tag in SKIPPED_TAGS:
+            self._skipped += 1
+        elif tag in HEADING_TAGS:
+            self._emphasis += 1
+        if tag in BLOCK_TAGS:
+            self._block += 1
+
+    def handle_endtag(self, tag):
+        self.flush()
+        if tag in SKIPPED_TAGS:
+            self._skipped = max(0, self._skipped - 1)
+        elif tag in HEADING_TAGS:
+            self._emphasis = max(0, self._emphasis - 1)
+        if tag in BLOCK_TAGS:
+            self._block += 1
+        if tag == self.root:
+            self.depth -= 1
+            if self.depth == 0:
+                self.done = True
+
+    def handle_data(self, data):
+        if self.done or self._skipped:
+            return
+        self._pending.append(data)
+
+    def close(self):
+        super().close()
+        self.flush()
+
+    def text(self) -> str:
+        return "\n".join(line for line, _, _ in self.lines)
+
+    def sections(self) -> list:
+        """
+        The lines grouped under their headings: `[{'heading', 'text'}]`; text before the first heading
+        has heading None.
+        """
+        sections, current = [], {'heading': None, 'lines': []}
+        for line, emphasized, block in self.lines:
+            if emphasized and block not in self._plain_blocks:
+                if current['heading'] is not None or current['lines']:
+                    sections.append(current)
+                current = {'heading': line, 'lines': []}
+            else:
+                current['lines'].append(line)
+        if current['heading'] is not None or current['lines']:
+            sections.append(current)
+        return [{'heading': section['heading'], 'text': "\n".join(section['lines'])} for section in sections]
+
+def parse_fragment(markup: str) -> TextExtractor:
+    parser = TextExtractor()
+    parser.feed(markup)
+    parser.close()
+    return parser
+
+def parse_element(page: str, start: int, root: str = 'div') -> TextExtractor:
+    """
+    Parses from the start tag at `start` in chunks until the element closes, so the rest of the page is never read.
+    """
+    parser = TextExtractor(root)
+    for offset in range(start, len(page), CHUNK):
+        parser.feed(page[offset:offset + CHUNK])
+        if parser.done:
+            break
+    parser.close()
+    return parser
+
+def find_markup(page: str) -> int:
+    """
+    Offset of the description's `<div class="show-more-less-html__markup ...">`, or -1.
+    """
+    for match in DIV_START.finditer(page):
+        if MARKUP_CLASS in match.group(1).split():
+            return match.start()
+    return -1
+
+def job_postings(blocks) -> list:
+    """
+    The JSON-LD JobPosting objects among the text of a page's `application/ld+json` scripts.
+    """
+    postings = []
+    for block in blocks:
+        try:
+            data = json.loads(block or "")
+        except json.JSONDecodeError:
+            continue
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict) and item.get('@type') == 'JobPosting':
+                postings.append(item)
+    return postings
+
+def posting_metadata(posting: dict) -> dict:
+    """
+    Title, company and location of a JSON-LD JobPosting (None where missing).
+    """
+    organization = posting.get('hiringOrganization')
+    location = posting.get('jobLocation')
+    location = location[0] if isinstance(location, list) and location else location
+    address = location.get('address') if isinstance(location, dict) else None
+    if isinstance(address, dict):
+        address = ", ".join(part for part in (address.get('addressLocality'), address.get('addressRegion'), address.get('addressCountry')) if isinstance(part, str) and part)
+    return {
+        'title': posting.get('title'),
+        'company': organization.get('name') if isinstance(organization, dict) else organization,
+        'location': address or None,
+    }
+
+def build_record(parser: TextExtractor, postings: list, top_card: dict) -> dict:
+    """
+    Assembles the job record from the parsed description container, the JSON-LD postings and the page's
+    top card, which fills in what the JSON-LD lacks. Without a container, the first JSON-LD description is used.
+    """
+    metadata = posting_metadata(postings[0]) if postings else {}
+    record = {key: metadata.get(key) or top_card.get(key) or None for key in ('title', 'company', 'location')}
+    source = 'markup' if parser is not None else None
+    if parser is None:
+        for posting in postings:
+            if posting.get('description'):
+                parser, source = parse_fragment(html.unescape(posting['description'])), 'json-ld'
+                break
+    record['description'] = parser.text() if parser is not None else None
+    record['sections'] = parser.sections() if parser is not None else []
+    record['source'] = source
+    return record
+
+def extract_job(page: str) -> dict:
+    """
+    Extracts a job listing from a static page without parsing the whole document: the description
+    container is located with a regular expression and only that element is parsed, the JSON-LD
+    blocks are decoded directly. Returns `{'title', 'company', 'location', 'description', 'sections',
+    'source'}`; description and source are None if the page doesn't contain a description.
+    """
+    top_card = {}
+    for key, pattern in TOP_CARD.items():
+        match = pattern.search(page)
+        top_card[key] = parse_fragment(match.group(1)).text() if match else None
+    postings = job_postings(match.group(1) for match in JSON_LD.finditer(page))
+    start = find_markup(page)
+    return build_record(parse_element(page, start) if start != -1 else None, postings, top_card)
+
+def extract_from_driver(driver, selector: str = f"div.{MARKUP_CLASS}") -> dict:
+    """
+    Extracts the job record in the browser with `execute_script`, so only the description markup and
+    JSON-LD cross the WebDriver connection instead of the whole page source.
+    """
+    parts = driver.execute_script(EXTRACT_SCRIPT, selector)
+    top_card = {key: parts.get(key) for key in ('title', 'company', 'location')}
+    parser = parse_fragment(parts['markup']) if parts.get('markup') else None
+    return build_record(parser, job_postings(parts.get('json_ld') or []), top_card)
+
+def page_diagnostics(driver) -> dict:
+    """
+    IDs and identifiable buttons on the current page, collected in the browser, for when the description isn't found.
+    """
+    return driver.execute_script(DIAGNOSTIC_SCRIPT)
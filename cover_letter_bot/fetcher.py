@@ -0,0 +1,137 @@
+import time
+import asyncio
+import aiohttp
+from urllib.parse import urlparse, parse_qs
+from .extract import extract_job
+from .telemetry import span
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9,de;q=0.8',
+}
+
+def static_url(url: str) -> str:
+    """
+    Rewrites LinkedIn search URLs (`/jobs/search/?currentJobId=...`) to the job's own page,
+    which carries the full description without any JavaScript.
+    """
+    parsed = urlparse(url)
+    job_id = parse_qs(parsed.query).get('currentJobId')
+    if 'linkedin.com' in parsed.netloc and job_id:
+        return f"https://www.linkedin.com/jobs/view/{job_id[0]}/"
+    return url
+
+def parse_job_page(page: str) -> tuple:
+    """
+    Extracts the job description from a static job page, either from the
+    `show-more-less-html__markup` block or from the embedded JSON-LD JobPosting,
+    along with the posting's title, company and location. Only the description
+    container and the JSON-LD are parsed, see extract.extract_job.
+    Returns `(description, metadata)`; description is None if the page doesn't contain one.
+    """
+    record = extract_job(page)
+    return record['description'], {key: record[key] for key in ('title', 'company', 'location')}
+
+def parse_job_description(page: str) -> str:
+    """
+    Returns just the job description of a static job page, see parse_job_page.
+    """
+    return parse_job_page(page)[0]
+
+class JobFetcher:
+    """
+    Tiered job description fetcher. Listings found in `cache` are served from disk; other pages
+    are fetched with a pooled aiohttp session and parsed statically, and only when that yields
+    no description does it escalate to Selenium, leasing a browser from `pool` if one is given.
+    `stats` counts which tier served each URL. Title, company and location of fetched pages
+    are kept in `metadata`, keyed by URL.
+    """
+
+    TIERS = ('cache', 'http', 'selenium')
+
+    def __init__(self, pool=None, cache=None, connections: int = 20, timeout: float = 20):
+        self.pool = pool
+        self.cache = cache
+        self.connections = connections
+        self.timeout = timeout
+        self._session = None
+        self.metadata = {}
+        self.stats = {tier: 0 for tier in self.TIERS}
+        self.stats['failed'] = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=HEADERS,
+            )
+        return self._session
+
+    async def fetch_static(self, url: str) -> str:
+        """
+        Fetches the page over plain HTTP and parses the description, or returns None.
+        """
+        with span("fetch.http", url=url) as current:
+            try:
+                async with self._get_session().get(static_url(url)) as response:
+                    current.set(status=response.status)
+                    if response.status != 200:
+                        print(f"Static fetch of {url} returned status {response.status}")
+                        return None
+                    page = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                current.set(failed=str(e))
+                print(f"Static fetch of {url} failed: {e}")
+                return None
+        # Parsing a large page is CPU-bound, keep it off the event loop
+        with span("fetch.parse", html_bytes=len(page)) as current:
+            job_description, self.metadata[url] = await asyncio.to_thread(parse_job_page, page)
+            current.set(found=job_description is not None)
+        return job_description
+
+    async def fetch(self, url: str, timings: dict = None) -> tuple:
+        """
+        Returns `(job_description, tier)` where tier is 'cache', 'http' or 'selenium'.
+        """
+        if self.cache is not None:
+            job_description = self.cache.get(url)
+            if job_description is not None:
+                self.stats['cache'] += 1
+                return job_description, 'cache'
+
+        started = time.perf_counter()
+        job_description = await self.fetch_static(url)
+        if timings is not None:
+            timings['http'] = round(time.perf_counter() - started, 3)
+        if job_description:
+            self.stats['http'] += 1
+            if self.cache is not None:
+                self.cache.put(url, job_description, source='http')
+            return job_description, 'http'
+
+        print(f"No description in static page, escalating to Selenium: {url}")
+        # Selenium is only loaded once a listing actually needs a browser
+        from .scraper import scrape_job_record
+        try:
+            with span("scrape.selenium", url=url):
+                record = await asyncio.to_thread(scrape_job_record, url, self.pool, timings)
+        except Exception:
+            self.stats['failed'] += 1
+            raise
+        job_description = record['description']
+        self.metadata[url] = {key: record[key] for key in ('title', 'company', 'location')}
+        self.stats['selenium'] += 1
+        if self.cache is not None:
+            self.cache.put(url, job_description, source='selenium')
+        return job_description, 'selenium'
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -1,25 +1,53 @@
 # cover_letter_bot/openai_api.py
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import json
+import time
+import asyncio
+import hashlib
 from pathlib import Path
-from .utils import load_latex_template
+from .utils import load_latex_template, estimate_tokens
+from .cv import compact_cv, latex_to_text
+from .llm_cache import CompletionCache, completion_key
+from .telemetry import span, traced, current_span
+from .latex_lint import repair
+from .ranking import render_and_rank
+from .render import RenderService
 
 OUTPUT_DIR = "output"
+WORD_LIMIT = 1000
 
 def load_text_file(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
-def build_prompt(job_desc: str, cv: Path, template: Path = None, limit: int = 1000, tone: str = "formal", focus: str = None) -> str:
+def prepare_cv(cv: str, job_desc: str, token_budget: int = None, focus: str = None) -> tuple:
+    """
+    Returns the CV text to put into the prompt and token stats. With a `token_budget`, the LaTeX CV is
+    reduced to the plain-text content most relevant to the job (see cv.compact_cv); otherwise it is used as is.
+    """
+    # Checked against the full CV, since compacting rewrites its text
+    check_focus(cv, focus)
+    if token_budget is None:
+        tokens = estimate_tokens(cv)
+        return cv, {'cv_tokens_before': tokens, 'cv_tokens_after': tokens}
+    return compact_cv(cv, job_desc, token_budget, focus)
 
-    # error handling
-    if focus and focus not in cv:
+TONE_OPTIONS = ["formal", "enthusiastic", "confident", "humble", "narrative", "data-driven", "creative", "concise"]
+
+def check_focus(cv: str, focus: str):
+    # A compacted CV is plain text, where the focus appears the way latex_to_text renders it
+    if focus and focus not in cv and latex_to_text(focus) not in cv:
         raise ValueError(f"Invalid focus: {focus}. Must be a section of the CV.")
-    
-    tone_options = ["formal", "enthusiastic", "confident", "humble", "narrative", "data-driven", "creative", "concise"]
-    if tone not in tone_options:
-        raise ValueError(f"Invalid tone: {tone}. Must be one of: {', '.join(tone_options)}")
+
+def check_options(cv: str, tone: str, focus: str):
+    check_focus(cv, focus)
+    if tone not in TONE_OPTIONS:
+        raise ValueError(f"Invalid tone: {tone}. Must be one of: {', '.join(TONE_OPTIONS)}")
+
+def build_prompt(job_desc: str, cv: Path, template: Path = None, limit: int = WORD_LIMIT, tone: str = "formal", focus: str = None) -> str:
+
+    # error handling
+    check_options(cv, tone, focus)
 
     template = "Template cover letter (style, format, tone preference):\n" + template if template else ""
 
@@ -59,18 +87,205 @@ def build_prompt(job_desc: str, cv: Path, template: Path = None, limit: int = 10
         Make sure to escape special characters like &, %, $, #, etc.
     """
 
-def generate_cover_letter(prompt: str, api_key: str, model: str = "gpt-4.1") -> str:
+SHARED_INSTRUCTIONS = """
+Given the CV of the candidate and a job listing, write a tailored, convincing cover letter in the same language as the job listing that:
+
+Matches the tone and structure of the provided template, adapting language, formality, and layout accordingly.
+
+Clearly emphasizes the most relevant skills, accomplishments, and experiences from the CV that align with the specific responsibilities and qualifications listed in the job posting.
+
+Highlights the candidate’s motivation and enthusiasm for the role, the company, and the broader industry—drawing on elements such as past experiences, values alignment, or specific company initiatives.
+
+Follows the tone, focus and length requirements given with the job listing. However, the cover letter should be no longer than the template, if provided.
+
+Return only the final version of the cover letter, ready to be submitted. Do not include commentary or analysis.
+Use the same template as provided and the same file format. Do not output a cover letter inside a code block.
+Make sure to escape special characters like &, %, $, #, etc.
+""".strip()
+
+def build_messages(job_desc: str, cv: str, template: str = None, limit: int = WORD_LIMIT, tone: str = "formal", focus: str = None) -> list:
+    """
+    Builds the same request as build_prompt as chat messages laid out for provider prompt caching: a system
+    message with everything that is the same for every job of a candidate (instructions, CV, template) followed
+    by a user message with the job listing and the per-job options. Keep the system message byte-identical
+    across calls (see prefix_fingerprint) so the provider can reuse it.
+    """
+    check_options(cv, tone, focus)
+
+    system = f"{SHARED_INSTRUCTIONS}\n\nCV of the candidate:\n\n{cv}"
+    if template:
+        system += f"\n\nTemplate cover letter (style, format, tone preference):\n{template}"
+
+    limit = "There is no limit on the length of the cover letter." if limit is None else f"The cover letter should be no longer than {limit} words."
+    focus = "There is no specific focus on the cover letter." if focus is None else f"The cover letter should focus on {focus}."
+    user = f"Job listing:\n\n{job_desc}\n\nThe tone should be {tone}. {focus} {limit}"
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+def prefix_fingerprint(messages: list) -> str:
+    """
+    Hash of every message but the last one, the part of a build_messages request shared between jobs.
+    """
+    return hashlib.sha256(json.dumps(messages[:-1], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def segment_tokens(messages: list) -> dict:
+    """
+    Estimated tokens of the shared prefix and of the per-job suffix of a build_messages request.
+    """
+    return {'prefix_tokens': estimate_tokens(messages[:-1]), 'suffix_tokens': estimate_tokens(messages[-1:])}
+
+class StreamingWriter:
+    """
+    Writes streamed completion tokens to `<out_path>.part` as they arrive and atomically renames the
+    file to `out_path` once the completion is done, so a partial letter is never picked up for rendering.
+    Records seconds to the first token and to the end of the stream in `timings` ('first_token', 'total').
+    """
+
+    def __init__(self, out_path: str, on_token=None, timings: dict = None):
+        self.out_path = out_path
+        self.part_path = f"{out_path}.part"
+        self.on_token = on_token
+        self.timings = timings if timings is not None else {}
+        self.started = time.perf_counter()
+        self.chunks = []
+        if os.path.dirname(out_path):
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        self._file = open(self.part_path, "w", encoding="utf-8")
+
+    def write(self, token: str):
+        if not self.chunks:
+            self.timings['first_token'] = round(time.perf_counter() - self.started, 3)
+        self.chunks.append(token)
+        self._file.write(token)
+        self._file.flush()
+        if self.on_token is not None:
+            self.on_token(token)
+
+    def commit(self) -> str:
+        """
+        Finishes the file and moves it into place. Returns the stripped cover letter text.
+        """
+        text = "".join(self.chunks)
+        cover_letter = text.strip()
+        if cover_letter != text:
+            self._file.seek(0)
+            self._file.write(cover_letter)
+            self._file.truncate()
+        self._file.close()
+        os.replace(self.part_path, self.out_path)
+        self.timings['total'] = round(time.perf_counter() - self.started, 3)
+        return cover_letter
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+@traced("llm.generate")
+def generate_cover_letter(prompt, api_key: str, model: str = "gpt-4.1", temperature: float = 0.7, max_tokens: int = 2048, cache: CompletionCache = None, bypass_cache: bool = False,
+                          stream_to: str = None, on_token=None, timings: dict = None) -> str:
+    """
+    Requests the cover letter from the OpenAI chat completions API.
+    `prompt` is either a prompt string (build_prompt) or a list of chat messages (build_messages).
+    If a CompletionCache is given, an identical earlier request (same prompt, model, temperature and
+    max_tokens) is answered from the cache; `bypass_cache` forces a fresh completion and refreshes the entry.
+    If `stream_to` is a path, the completion is streamed into that file (see StreamingWriter) and every
+    token is passed to `on_token`.
+    The client honours OPENAI_BASE_URL, so a local OpenAI-compatible server can stand in for the API.
+    """
+    key = completion_key(prompt, model, temperature, max_tokens)
+    current_span().set(model=model, stream=bool(stream_to))
+    if cache is not None and not bypass_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            current_span().set(cached=True)
+            if stream_to:
+                writer = StreamingWriter(stream_to, on_token, timings)
+                writer.write(cached)
+                writer.commit()
+            return cached
+
+    # Imported here so building prompts (and answering from the cache) never loads the openai package
+    from openai import OpenAI
+
     client = OpenAI(api_key=api_key)
+    messages = prompt if isinstance(prompt, list) else [
+        {"role": "user", "content": prompt}
+    ]
+
+    if stream_to:
+        writer = StreamingWriter(stream_to, on_token, timings)
+        usage = None
+        try:
+            stream = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    writer.write(chunk.choices[0].delta.content)
+                if chunk.usage:
+                    usage = chunk.usage
+            cover_letter = writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+    else:
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        cover_letter = response.choices[0].message.content.strip()
+        usage = response.usage
+
+    current_span().set(cached=False, prompt_tokens=usage.prompt_tokens if usage else 0, completion_tokens=usage.completion_tokens if usage else 0)
+    if cache is not None:
+        cache.put(key, model, cover_letter, usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
+    return cover_letter
+
+@traced("llm.generate")
+def generate_variants(prompt, api_key: str, n: int = 3, model: str = "gpt-4.1", temperature: float = 0.7, max_tokens: int = 2048,
+                      cache: CompletionCache = None, bypass_cache: bool = False) -> list:
+    """
+    Requests `n` alternative cover letters in a single chat completions call (the `n` parameter), so the
+    prompt is sent and billed once. Returns the letters in the order of the response's choices. Cached
+    like generate_cover_letter, with all variants in one entry.
+    """
+    key = completion_key(prompt, model, temperature, max_tokens, n)
+    current_span().set(model=model, variants=n)
+    if cache is not None and not bypass_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            current_span().set(cached=True)
+            return json.loads(cached)
+
+    from openai import OpenAI
 
+    client = OpenAI(api_key=api_key)
+    messages = prompt if isinstance(prompt, list) else [
+        {"role": "user", "content": prompt}
+    ]
     response = client.chat.completions.create(
         model=model,
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=2048,
-        temperature=0.7,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        n=n,
     )
-    return response.choices[0].message.content.strip()
+    letters = [choice.message.content.strip() for choice in sorted(response.choices, key=lambda choice: choice.index)]
+    usage = response.usage
+    current_span().set(cached=False, prompt_tokens=usage.prompt_tokens if usage else 0, completion_tokens=usage.completion_tokens if usage else 0)
+    if cache is not None:
+        cache.put(key, model, json.dumps(letters), usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
+    return letters
 
 def save_cover_letter(text: str, out_path: str = "cover_letter"):
     """
@@ -96,19 +311,89 @@ def save_cover_letter(text: str, out_path: str = "cover_letter"):
         with open(out_path, "w", encoding="utf-8") as f:
             f.write(text)
 
-def generator_main(job_desc_path: str, cv_path: str, api_key: str, template_path: str = None, out_name: str = "cover_letter"):
+def lint_letter_file(out_path: str, template: str = None):
+    """
+    Fixes mechanical LaTeX problems in a generated letter (see latex_lint.repair) before it is rendered
+    and reports the ones that need a new letter.
+    """
+    with open(out_path, "r", encoding="utf-8") as f:
+        letter = f.read()
+    with span("lint") as current:
+        checked = repair(letter, template)
+        current.set(status=checked['status'], fixes=len(checked['fixes']))
+    if checked['fixes']:
+        print(f"Repaired LaTeX: {', '.join(sorted({fix['code'] for fix in checked['fixes']}))}")
+        save_cover_letter(checked['tex'], out_path)
+    for error in checked['errors']:
+        print(f"LaTeX problem the letter needs regenerating for, line {error['line']}: {error['message']}")
+    return checked
 
+async def keep_best_variant(letters: list, out_name: str, job_desc: str, template: str = None, limit: int = None) -> dict:
+    """
+    Repairs the variants, renders them in parallel, keeps the best as `output/<out_name>.tex`/`.pdf` and
+    archives the others under output/variants/ (see ranking.render_and_rank). Returns the ranking result.
+    """
+    letters = [repair(letter, template)['tex'] for letter in letters]
+    with RenderService(workers=len(letters)) as renderer:
+        result = await render_and_rank(letters, out_name, job_desc, renderer.render, template, limit, OUTPUT_DIR)
+    for variant in result['ranking']:
+        print(f"Variant {variant['index']}: score {variant['score']} ({variant['words']} words, {variant['pages']} page(s), {variant['scores']})"
+              + (" <- kept" if variant['index'] == result['best'] else ""))
+    return result
+
+def prepare_generation(job_desc_path: str, cv_path: str, template_path: str = None, out_name: str = "cover_letter", cv_token_budget: int = None,
+                       limit: int = WORD_LIMIT) -> dict:
+    """
+    The steps generator_main and async_generator_main share before the completion: reads the saved job
+    description and the templates and builds the prompt. Returns `{'job_desc', 'template', 'prompt',
+    'limit', 'out_name', 'out_path'}`.
+    """
     with open(job_desc_path, 'r') as f:
         job_desc = f.read()
 
     # format out_name to not contain file extension in case user provides file extension
-    if out_name.endswith(".tex"): 
+    if out_name.endswith(".tex"):
         out_name = out_name[:-4]
 
-    out_path = os.path.join(OUTPUT_DIR, f"{out_name}.tex")
-    cv = load_latex_template(cv_path)
-    template = load_latex_template(template_path) if template_path else ""
-    prompt = build_prompt(job_desc, cv, template)
-    cover_letter = generate_cover_letter(prompt, api_key)
-    save_cover_letter(cover_letter, out_path)
-    
\ No newline at end of file
+    with span("prompt.build") as current:
+        cv, cv_stats = prepare_cv(load_latex_template(cv_path), job_desc, cv_token_budget)
+        template = load_latex_template(template_path) if template_path else ""
+        prompt = build_prompt(job_desc, cv, template, limit=limit)
+        current.set(prompt_tokens=estimate_tokens(prompt), **cv_stats)
+    print(f"CV: {cv_stats['cv_tokens_before']} tokens, {cv_stats['cv_tokens_after']} sent")
+    return {'job_desc': job_desc, 'template': template, 'prompt': prompt, 'limit': limit, 'out_name': out_name,
+            'out_path': os.path.join(OUTPUT_DIR, f"{out_name}.tex")}
+
+def generator_main(job_desc_path: str, cv_path: str, api_key: str, template_path: str = None, out_name: str = "cover_letter", cache: CompletionCache = None, bypass_cache: bool = False,
+                   stream: bool = False, on_token=None, timings: dict = None, cv_token_budget: int = None, variants: int = 1,
+                   limit: int = WORD_LIMIT):
+    """
+    Generates the cover letter for a saved job description into `output/<out_name>.tex`, asking for at most
+    `limit` words (None for no limit). With `variants` > 1, that many letters come from one request and the
+    best is kept (see keep_best_variant), already rendered; the ranking result is returned.
+    """
+    job = prepare_generation(job_desc_path, cv_path, template_path, out_name, cv_token_budget, limit)
+    if variants > 1:
+        letters = generate_variants(job['prompt'], api_key, variants, cache=cache, bypass_cache=bypass_cache)
+        return asyncio.run(keep_best_variant(letters, job['out_name'], job['job_desc'], job['template'], limit=job['limit']))
+    if stream:
+        generate_cover_letter(job['prompt'], api_key, cache=cache, bypass_cache=bypass_cache, stream_to=job['out_path'], on_token=on_token, timings=timings)
+    else:
+        save_cover_letter(generate_cover_letter(job['prompt'], api_key, cache=cache, bypass_cache=bypass_cache), job['out_path'])
+    lint_letter_file(job['out_path'], job['template'])
+
+async def async_generator_main(job_desc_path: str, cv_path: str, client, template_path: str = None, out_name: str = "cover_letter", bypass_cache: bool = False,
+                               stream: bool = False, on_token=None, timings: dict = None, cv_token_budget: int = None, variants: int = 1,
+                               limit: int = WORD_LIMIT):
+    """
+    Same as generator_main, but generates through an AsyncCoverLetterClient without blocking the event loop.
+    """
+    job = prepare_generation(job_desc_path, cv_path, template_path, out_name, cv_token_budget, limit)
+    if variants > 1:
+        letters = await client.generate_variants(job['prompt'], variants, bypass_cache=bypass_cache)
+        return await keep_best_variant(letters, job['out_name'], job['job_desc'], job['template'], limit=job['limit'])
+    if stream:
+        await client.generate(job['prompt'], bypass_cache=bypass_cache, stream_to=job['out_path'], on_token=on_token, timings=timings)
+    else:
+        save_cover_letter(await client.generate(job['prompt'], bypass_cache=bypass_cache), job['out_path'])
+    lint_letter_file(job['out_path'], job['template'])
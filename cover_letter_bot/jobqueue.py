@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import secrets
+import sqlite3
+import threading
+
+QUEUE_PATH = "output/queue.sqlite"
+
+class QueueFull(Exception):
+    """
+    Raised by JobQueue.submit when `max_pending` jobs are already queued or running.
+    """
+
+# Columns added after the first release of the queue, added to older queue files on open
+LEASE_COLUMNS = {'worker': "TEXT", 'lease_expires': "REAL"}
+
+class JobQueue:
+    """
+    SQLite-backed queue of cover letter jobs for the server.
+
+    A job is `queued` until a worker claims it, `running` while it goes through the stages and then
+    `ok`, `failed` or `skipped`, with its result record. The queue lives on disk, so jobs submitted
+    before a restart are still there afterwards; `requeue_running` puts jobs that were interrupted
+    mid-run back in line. At most `max_pending` jobs can be queued or running at once (None for no limit).
+
+    Several processes can share one queue file. A job claimed with a `lease` belongs to its worker until
+    the lease expires; the worker renews it with `heartbeat`, and once it lapses (the worker crashed or
+    hung) the job is claimed again by the next worker. Only the current lease holder can finish a job.
+    WAL mode needs all processes on one machine; for a queue on a network filesystem, open it with
+    `journal_mode="DELETE"`.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH, max_pending: int = 100, journal_mode: str = "WAL"):
+        self.path = path
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                id TEXT PRIMARY KEY,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker TEXT,
+                lease_expires REAL
+            )
+        """)
+        columns = {row['name'] for row in self._db.execute("PRAGMA table_info(queue)")}
+        for column, kind in LEASE_COLUMNS.items():
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE queue ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS queue_status ON queue (status, created_at)")
+        self._db.commit()
+
+    def _row(self, row: sqlite3.Row) -> dict:
+        if row is None:
+            return None
+        job = dict(row)
+        job['options'] = json.loads(job['options'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM queue WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def submit(self, options: dict) -> dict:
+        """
+        Adds a job and returns it with its ID. Raises QueueFull if the queue is at `max_pending`.
+        """
+        return self.get(self.submit_many([options])[0])
+
+    def submit_many(self, jobs: list) -> list:
+        """
+        Adds several jobs in one transaction, in order, and returns their IDs. Raises QueueFull, adding
+        none of them, if they don't all fit under `max_pending`.
+        """
+        job_ids = [secrets.token_hex(8) for _ in jobs]
+        with self._lock:
+            pending = self._db.execute("SELECT COUNT(*) FROM queue WHERE status IN ('queued', 'running')").fetchone()[0]
+            if self.max_pending is not None and pending + len(jobs) > self.max_pending:
+                raise QueueFull(f"{pending} jobs pending (limit {self.max_pending})")
+            now = time.time()
+            # Offsets keep the submission order for claim, which takes the oldest job first
+            self._db.executemany(
+                "INSERT INTO queue (id, options, status, created_at) VALUES (?, ?, 'queued', ?)",
+                [(job_id, json.dumps(options), now + index * 1e-6) for index, (job_id, options) in enumerate(zip(job_ids, jobs))],
+            )
+            self._db.commit()
+        return job_ids
+
+    def claim(self, worker: str = None, lease: float = None, max_attempts: int = None) -> dict:
+        """
+        Marks the oldest queued job as running and returns it, or None if nothing is queued.
+        With a `lease` in seconds, the job is held by `worker` until the lease expires, and running jobs
+        whose lease has already expired are claimed again like queued ones. With `max_attempts`, a job
+        whose lease expired on its last allowed attempt is marked failed instead of being claimed again.
+        """
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two processes can't claim the same job
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                expired = "status = 'running' AND lease_expires < ?"
+                params = [now]
+                if max_attempts is not None:
+                    # Same "<stage>: <error>" form as the failures workers record themselves
+                    self._db.execute(
+                        f"UPDATE queue SET status = 'failed', error = COALESCE(stage, 'claim') || ?, finished_at = ?, lease_expires = NULL WHERE {expired} AND attempts >= ?",
+                        (f": lease expired on all {max_attempts} attempts", now, now, max_attempts),
+                    )
+                    expired += " AND attempts < ?"
+                    params.append(max_attempts)
+                row = self._db.execute(
+                    f"SELECT id FROM queue WHERE status = 'queued' OR ({expired}) ORDER BY created_at LIMIT 1",
+                    params,
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE queue SET status = 'running', stage = NULL, attempts = attempts + 1, started_at = ?, worker = ?, lease_expires = ? WHERE id = ?",
+                        (now, worker, now + lease if lease else None, row['id']),
+                    )
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return self.get(row['id']) if row is not None else None
+
+    def heartbeat(self, job_id: str, worker: str, lease: float) -> bool:
+        """
+        Extends `worker`'s lease on a running job by `lease` seconds. Returns False if the worker no longer
+        holds the job (its lease expired and another worker claimed it, or it was finished).
+        """
+        with self._lock:
+            renewed = self._db.execute(
+                "UPDATE queue SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease, job_id, worker),
+            ).rowcount
+            self._db.commit()
+        return renewed > 0
+
+    def release(self, job_id: str, worker: str) -> bool:
+        """
+        Puts a job `worker` holds back in the queue, e.g. when the worker shuts down mid-job.
+        """
+        with self._lock:
+            released = self._db.execute(
+                "UPDATE queue SET status = 'queued', stage = NULL, worker = NULL, lease_expires = NULL WHERE id = ? AND worker = ? AND status = 'running'",
+                (job_id, worker),
+            ).rowcount
+            self._db.commit()
+        return released > 0
+
+    def set_stage(self, job_id: str, stage: str):
+        with self._lock:
+            self._db.execute("UPDATE queue SET stage = ? WHERE id = ?", (stage, job_id))
+            self._db.commit()
+
+    def finish(self, job_id: str, status: str, result: dict, error: str = None, worker: str = None) -> bool:
+        """
+        Records the job's outcome. With `worker`, only while that worker still holds the job; returns
+        whether the outcome was recorded.
+        """
+        query = "UPDATE queue SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires = NULL WHERE id = ?"
+        params = [status, json.dumps(result, default=str), error, time.time(), job_id]
+        if worker is not None:
+            query += " AND worker = ? AND status = 'running'"
+            params.append(worker)
+        with self._lock:
+            finished = self._db.execute(query, params).rowcount
+            self._db.commit()
+        return finished > 0
+
+    def requeue_running(self) -> int:
+        """
+        Puts jobs left `running` by a previous process back in the queue. Returns how many there were.
+        Leased jobs are left to expire, since their workers may still be running.
+        """
+        with self._lock:
+            count = self._db.execute("UPDATE queue SET status = 'queued', stage = NULL WHERE status = 'running' AND lease_expires IS NULL").rowcount
+            self._db.commit()
+        return count
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            return self._row(self._db.execute("SELECT * FROM queue WHERE id = ?", (job_id,)).fetchone())
+
+    def position(self, job_id: str) -> int:
+        """
+        Number of queued jobs ahead of `job_id`.
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM queue WHERE status = 'queued' AND created_at < (SELECT created_at FROM queue WHERE id = ?)",
+                (job_id,),
+            ).fetchone()[0]
+
+    def jobs(self, status: str = None, limit: int = 50) -> list:
+        """
+        The most recently submitted jobs, optionally only those with `status`.
+        """
+        query, params = "SELECT * FROM queue", []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [self._row(row) for row in self._db.execute(query, params).fetchall()]
+
+    def counts(self) -> dict:
+        with self._lock:
+            return {row['status']: row['count'] for row in self._db.execute("SELECT status, COUNT(*) AS count FROM queue GROUP BY status")}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,244 @@
+import os
+import re
+import time
+import struct
+import hashlib
+import sqlite3
+import argparse
+import threading
+from .cache import normalize_job_id
+
+STORE_PATH = "output/jobs.sqlite"
+
+# MinHash signature of NUM_PERM values, split into BANDS bands for locality-sensitive hashing.
+# Two postings with Jaccard similarity s share at least one band with probability 1 - (1 - s^(NUM_PERM/BANDS))^BANDS,
+# about 0.99 at s = 0.8 and 0.05 at s = 0.3.
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 5
+# Each 64-byte BLAKE2b digest gives 16 independent 32-bit hash values per shingle
+SEEDS = [f"minhash-{i}".encode() for i in range(NUM_PERM // 16)]
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+def content_hash(text: str) -> str:
+    """
+    Hash of the description with case and whitespace normalized.
+    """
+    return hashlib.sha256(" ".join(WORD.findall(text.lower())).encode("utf-8")).hexdigest()
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    words = WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def minhash(text: str) -> tuple:
+    """
+    MinHash signature of the word shingles of `text`: for each of NUM_PERM hash functions, the
+    smallest hash value over all shingles.
+    """
+    hashes = []
+    for shingle in shingles(text):
+        data = shingle.encode("utf-8")
+        digest = b"".join(hashlib.blake2b(data, digest_size=64, person=seed).digest() for seed in SEEDS)
+        hashes.append(struct.unpack(f">{NUM_PERM}I", digest))
+    return tuple(map(min, zip(*hashes)))
+
+def similarity(signature: tuple, other: tuple) -> float:
+    """
+    Estimated Jaccard similarity of the shingle sets behind two MinHash signatures.
+    """
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+def band_keys(signature: tuple) -> list:
+    rows = len(signature) // BANDS
+    return [hashlib.blake2b(struct.pack(f">{rows}I", *signature[band * rows:(band + 1) * rows]), digest_size=8).hexdigest()
+            for band in range(BANDS)]
+
+class JobStore:
+    """
+    SQLite index of scraped job listings: job ID, URL, company, title, location, scrape time,
+    description and content hash, with a full-text index (FTS5) over title, company and description.
+
+    Each added listing is checked against the stored ones: an identical description (by content hash)
+    or a near-identical one (MinHash similarity of at least `threshold`) is recorded as a duplicate
+    of the earliest listing, so reposts under a new job ID can be skipped.
+    """
+
+    def __init__(self, path: str = STORE_PATH, threshold: float = 0.8):
+        self.path = path
+        self.threshold = threshold
+        self.stats = {'added': 0, 'duplicates': 0}
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                job_id TEXT NOT NULL UNIQUE,
+                url TEXT NOT NULL,
+                company TEXT,
+                title TEXT,
+                location TEXT,
+                scraped_at REAL NOT NULL,
+                content_hash TEXT NOT NULL,
+                description TEXT NOT NULL,
+                minhash BLOB NOT NULL,
+                duplicate_of TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_scraped_at ON jobs (scraped_at);
+            CREATE INDEX IF NOT EXISTS jobs_content_hash ON jobs (content_hash);
+            CREATE TABLE IF NOT EXISTS job_bands (
+                band_key TEXT NOT NULL,
+                job_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS job_bands_key ON job_bands (band_key);
+            CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+                title, company, description, content='jobs', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS jobs_fts_insert AFTER INSERT ON jobs BEGIN
+                INSERT INTO jobs_fts (rowid, title, company, description) VALUES (new.id, new.title, new.company, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS jobs_fts_delete AFTER DELETE ON jobs BEGIN
+                INSERT INTO jobs_fts (jobs_fts, rowid, title, company, description) VALUES ('delete', old.id, old.title, old.company, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS jobs_fts_update AFTER UPDATE ON jobs BEGIN
+                INSERT INTO jobs_fts (jobs_fts, rowid, title, company, description) VALUES ('delete', old.id, old.title, old.company, old.description);
+                INSERT INTO jobs_fts (rowid, title, company, description) VALUES (new.id, new.title, new.company, new.description);
+            END;
+        """)
+        self._db.commit()
+
+    def _find_duplicate(self, job_id: str, digest: str, signature: tuple, keys: list) -> tuple:
+        # Reposts of this listing itself don't make it a duplicate when it is stored again
+        row = self._db.execute(
+            "SELECT job_id, duplicate_of FROM jobs WHERE content_hash = ? AND job_id != ? AND COALESCE(duplicate_of, '') != ? ORDER BY scraped_at LIMIT 1",
+            (digest, job_id, job_id)
+        ).fetchone()
+        if row is not None:
+            return row['duplicate_of'] or row['job_id'], 1.0
+
+        candidates = self._db.execute(
+            f"SELECT DISTINCT job_id FROM job_bands WHERE band_key IN ({','.join('?' * len(keys))}) AND job_id != ?", (*keys, job_id)
+        ).fetchall()
+        best, best_similarity = None, 0.0
+        for candidate in candidates:
+            row = self._db.execute("SELECT job_id, duplicate_of, minhash FROM jobs WHERE job_id = ?", (candidate[0],)).fetchone()
+            if row['duplicate_of'] == job_id:
+                continue
+            score = similarity(signature, struct.unpack(f">{NUM_PERM}I", row['minhash']))
+            if score >= self.threshold and score > best_similarity:
+                best, best_similarity = row['duplicate_of'] or row['job_id'], score
+        return best, best_similarity
+
+    def add(self, url: str, description: str, title: str = None, company: str = None, location: str = None, scraped_at: float = None) -> dict:
+        """
+        Stores (or updates) the listing at `url`. Returns `{'job_id', 'duplicate_of', 'similarity'}`, where
+        `duplicate_of` is the job ID of the original posting if this one repeats it, else None.
+        """
+        job_id = normalize_job_id(url)
+        digest = content_hash(description)
+        signature = minhash(description)
+        keys = band_keys(signature)
+        with self._lock:
+            duplicate_of, score = self._find_duplicate(job_id, digest, signature, keys)
+            self._db.execute("""
+                INSERT INTO jobs (job_id, url, company, title, location, scraped_at, content_hash, description, minhash, duplicate_of)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job_id) DO UPDATE SET
+                    url = excluded.url, company = COALESCE(excluded.company, company), title = COALESCE(excluded.title, title),
+                    location = COALESCE(excluded.location, location), scraped_at = excluded.scraped_at,
+                    content_hash = excluded.content_hash, description = excluded.description,
+                    minhash = excluded.minhash, duplicate_of = excluded.duplicate_of
+            """, (job_id, url, company, title, location, scraped_at or time.time(), digest, description,
+                  struct.pack(f">{NUM_PERM}I", *signature), duplicate_of))
+            self._db.execute("DELETE FROM job_bands WHERE job_id = ?", (job_id,))
+            self._db.executemany("INSERT INTO job_bands VALUES (?, ?)", [(key, job_id) for key in keys])
+            self._db.commit()
+            self.stats['added'] += 1
+            if duplicate_of:
+                self.stats['duplicates'] += 1
+        return {'job_id': job_id, 'duplicate_of': duplicate_of, 'similarity': round(score, 3) if duplicate_of else None}
+
+    def get(self, url: str) -> dict:
+        """
+        Returns the stored listing for a URL or job ID as a dict, or None.
+        """
+        job_id = url if url.startswith(("linkedin:", "url:")) else normalize_job_id(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT job_id, url, company, title, location, scraped_at, content_hash, description, duplicate_of FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def search(self, query: str = None, since: float = None, company: str = None, include_duplicates: bool = True, limit: int = 100) -> list:
+        """
+        Full-text search over title, company and description (FTS5 query syntax, e.g. `kubernetes AND python`),
+        best matches first. `since` keeps listings scraped at or after that Unix time. Without a query, returns
+        the most recently scraped listings.
+        """
+        conditions, params = [], []
+        if query:
+            conditions.append("jobs_fts MATCH ?")
+            params.append(query)
+        if since is not None:
+            conditions.append("jobs.scraped_at >= ?")
+            params.append(since)
+        if company:
+            conditions.append("jobs.company = ?")
+            params.append(company)
+        if not include_duplicates:
+            conditions.append("jobs.duplicate_of IS NULL")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        source = "jobs_fts JOIN jobs ON jobs.id = jobs_fts.rowid" if query else "jobs"
+        order = "jobs_fts.rank" if query else "jobs.scraped_at DESC"
+        sql = f"""
+            SELECT jobs.job_id, jobs.url, jobs.company, jobs.title, jobs.location, jobs.scraped_at, jobs.duplicate_of
+            FROM {source} {where} ORDER BY {order} LIMIT ?
+        """
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params).fetchall()]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the local job store")
+    parser.add_argument("query", nargs="?", help="FTS5 query, e.g. 'kubernetes' or 'python AND remote'")
+    parser.add_argument("--days", type=float, default=None, help="Only listings scraped within this many days")
+    parser.add_argument("--company", default=None)
+    parser.add_argument("--no-duplicates", action="store_true", help="Leave out reposts of other listings")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--store", default=STORE_PATH)
+    args = parser.parse_args()
+
+    with JobStore(args.store) as store:
+        since = time.time() - args.days * 86400 if args.days is not None else None
+        started = time.perf_counter()
+        jobs = store.search(args.query, since=since, company=args.company, include_duplicates=not args.no_duplicates, limit=args.limit)
+        elapsed = time.perf_counter() - started
+        for job in jobs:
+            scraped = time.strftime("%Y-%m-%d", time.localtime(job['scraped_at']))
+            duplicate = f" (repost of {job['duplicate_of']})" if job['duplicate_of'] else ""
+            print(f"{scraped}  {job['job_id']:24} {job['title'] or '-'} @ {job['company'] or '-'}{duplicate}\n    {job['url']}")
+        print(f"{len(jobs)} of {store.count()} listings in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
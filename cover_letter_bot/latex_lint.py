@@ -0,0 +1,288 @@
+import re
+from .render import split_preamble
+
+# One token per command, comment, brace, special character, paragraph break or run of plain text
+TOKEN = re.compile(r"\\(?:[A-Za-z@]+\*?|.)|%[^\n]*|[{}&#_]|\$\$?|\n[ \t]*\n|\n|[^\\%{}$&#_\n]+", re.S)
+ENV_NAME = re.compile(r"\s*\{([^{}]*)\}")
+DOCUMENT_CLASS = re.compile(r"\\documentclass\s*(\[[^\]]*\])?\s*\{([^}]*)\}")
+CODE_FENCE = re.compile(r"^[ \t]*```[\w-]*[ \t]*\n?", re.M)
+
+# Environments in which `&` separates columns
+ALIGNMENT_ENVS = {'tabular', 'tabular*', 'tabularx', 'longtable', 'array', 'align', 'align*', 'alignat', 'alignat*',
+                  'eqnarray', 'eqnarray*', 'matrix', 'pmatrix', 'bmatrix', 'cases', 'split'}
+VERBATIM_ENVS = {'verbatim', 'verbatim*', 'lstlisting', 'minted', 'comment'}
+# Environments whose content is math, where `_` is a subscript
+MATH_ENVS = {'equation', 'equation*', 'math', 'displaymath', 'align', 'align*', 'alignat', 'alignat*', 'eqnarray', 'eqnarray*',
+             'gather', 'gather*', 'multline', 'multline*'}
+# Commands whose first argument is taken literally (a URL, label or file name), so its special characters must stay unescaped
+VERBATIM_ARGUMENT_COMMANDS = {'\\url', '\\href', '\\label', '\\ref', '\\pageref', '\\eqref', '\\cite', '\\includegraphics',
+                              '\\input', '\\include'}
+ARGUMENT_START = re.compile(r"\s*(?:\[[^\]]*\])?\s*\{")
+# Parts of a template's letter structure the generated letter has to keep
+STRUCTURE = ['\\begin{letter}', '\\opening', '\\closing']
+
+# Issues whose fix rewrites the whole letter, so the body is only checked once they are fixed
+BLOCKING = {'code-fence', 'text-before-documentclass', 'missing-preamble'}
+# Issues pdflatex would stop on (or that lose text); the others only change the output cosmetically
+BREAKS_COMPILE = {'code-fence', 'text-before-documentclass', 'missing-preamble', 'unescaped-ampersand', 'unescaped-hash',
+                  'unescaped-underscore', 'unescaped-dollar', 'unescaped-percent', 'unclosed-environment', 'unbalanced-math', 'unbalanced-braces',
+                  'mismatched-environment'}
+
+def tokenize(tex: str) -> list:
+    """
+    Splits LaTeX source into `(kind, text, start, line)` tokens, where kind is 'command', 'comment',
+    'open', 'close', 'special' (`&`, `#`, `_`, `$`, `$$`), 'par' (a blank line), 'newline' or 'text'.
+    """
+    tokens, line = [], 1
+    for match in TOKEN.finditer(tex):
+        text = match.group()
+        if text.startswith("\\"):
+            kind = 'command'
+        elif text.startswith("%"):
+            kind = 'comment'
+        elif text == "{":
+            kind = 'open'
+        elif text == "}":
+            kind = 'close'
+        elif text in ("&", "#", "_", "$", "$$"):
+            kind = 'special'
+        elif text.startswith("\n"):
+            kind = 'par' if text.count("\n") > 1 else 'newline'
+        else:
+            kind = 'text'
+        tokens.append((kind, text, match.start(), line))
+        line += text.count("\n")
+    return tokens
+
+def issue(code: str, line: int, message: str, edit: tuple = None) -> dict:
+    """
+    A lint finding. Mechanical ones carry an `edit` (start, end, replacement) that fixes them.
+    """
+    return {'code': code, 'line': line, 'message': message, 'repairable': edit is not None, 'edit': edit}
+
+def structure_issues(tex: str, template: str) -> list:
+    """
+    Compares the letter against the template: same document class and the template's letter structure.
+    Without a template, only a complete document is required.
+    """
+    issues = []
+    fence = CODE_FENCE.search(tex)
+    while fence:
+        issues.append(issue('code-fence', tex.count("\n", 0, fence.start()) + 1, "Markdown code fence", (fence.start(), fence.end(), "")))
+        fence = CODE_FENCE.search(tex, fence.end())
+    if issues:
+        return issues
+
+    template_preamble, template_body = split_preamble(template or "")
+    preamble, body = split_preamble(tex)
+    document_class = DOCUMENT_CLASS.search(tex)
+    if document_class and document_class.start() > 0 and tex[:document_class.start()].strip():
+        issues.append(issue('text-before-documentclass', 1, "Text before \\documentclass", (0, document_class.start(), "")))
+        return issues
+
+    if preamble is None:
+        if template_preamble:
+            closing = "" if "\\end{document}" in tex else "\n\\end{document}\n"
+            issues.append(issue('missing-preamble', 1, "No preamble or \\begin{document}; the template's is used",
+                                (0, len(tex), template_preamble + "\\begin{document}\n" + tex.strip() + "\n" + closing)))
+        else:
+            issues.append(issue('missing-preamble', 1, "No \\begin{document}"))
+        return issues
+    if template_preamble:
+        expected, found = DOCUMENT_CLASS.search(template_preamble), DOCUMENT_CLASS.search(preamble)
+        if expected and (found is None or found.group(1, 2) != expected.group(1, 2)):
+            issues.append(issue('documentclass', 1, f"Document class differs from the template ({expected.group()})",
+                                (0, len(preamble), template_preamble)))
+
+    end = tex.rfind("\\end{document}")
+    if end != -1 and tex[end + len("\\end{document}"):].strip():
+        issues.append(issue('text-after-document', tex.count("\n", 0, end) + 1, "Text after \\end{document}",
+                            (end + len("\\end{document}"), len(tex), "\n")))
+
+    for part in STRUCTURE:
+        if part in template_body and part not in body:
+            issues.append(issue('missing-structure', 1, f"The template has {part}, the letter doesn't"))
+    return issues
+
+def argument_end(tex: str, position: int) -> int:
+    """
+    The offset just past the braced argument that starts at `position` (after an optional `[...]`), or
+    None if there is none or it is never closed.
+    """
+    match = ARGUMENT_START.match(tex, position)
+    if match is None:
+        return None
+    depth, index = 1, match.end()
+    while index < len(tex):
+        if tex[index] == "\\":
+            index += 2
+            continue
+        if tex[index] == "{":
+            depth += 1
+        elif tex[index] == "}":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        index += 1
+    return None
+
+def body_issues(tex: str) -> list:
+    """
+    Walks the tokens of the document body: unescaped special characters, unbalanced braces and math,
+    and environments that are closed in the wrong order or not at all.
+    """
+    tokens = tokenize(tex)
+    issues, envs, braces, dollars = [], [], [], []
+    in_body = False
+    # Display or inline math opened with \[, \( or $$
+    in_math = False
+
+    def paragraph_end():
+        # Math left open at the end of a paragraph can't be fixed mechanically
+        if len(dollars) % 2:
+            issues.append(issue('unbalanced-math', dollars[-1][1], "Unbalanced $ in paragraph"))
+        dollars.clear()
+
+    index = 0
+    while index < len(tokens):
+        kind, text, start, line = tokens[index]
+        index += 1
+        if kind == 'command' and text in ("\\begin", "\\end"):
+            name = ENV_NAME.match(tex, start + len(text))
+            if name is None:
+                continue
+            env = name.group(1)
+            if text == "\\begin":
+                envs.append((env, line))
+                if env == "document":
+                    in_body = True
+                if env in VERBATIM_ENVS:
+                    closing = tex.find(f"\\end{{{env}}}", name.end())
+                    skip_to = closing if closing != -1 else len(tex)
+                    while index < len(tokens) and tokens[index][2] < skip_to:
+                        index += 1
+                continue
+            open_names = [open_env for open_env, _ in envs]
+            if env not in open_names:
+                issues.append(issue('mismatched-environment', line, f"\\end{{{env}}} without \\begin{{{env}}}"))
+                continue
+            position = len(open_names) - 1 - open_names[::-1].index(env)
+            unclosed = envs[position + 1:]
+            if unclosed:
+                # Close the environments the model left open right before the one that ends here
+                closing = "".join(f"\\end{{{open_env}}}\n" for open_env, _ in reversed(unclosed))
+                issues.append(issue('unclosed-environment', unclosed[-1][1], f"\\begin{{{unclosed[-1][0]}}} is never closed", (start, start, closing)))
+            del envs[position:]
+            if env == "document":
+                paragraph_end()
+                in_body = False
+            continue
+        if kind == 'command' and text in VERBATIM_ARGUMENT_COMMANDS:
+            skip_to = argument_end(tex, start + len(text))
+            while skip_to is not None and index < len(tokens) and tokens[index][2] < skip_to:
+                index += 1
+            continue
+        if kind == 'open':
+            braces.append(line)
+        elif kind == 'close':
+            if braces:
+                braces.pop()
+            else:
+                issues.append(issue('unbalanced-braces', line, "Closing brace without an opening one"))
+        if not in_body:
+            continue
+        if kind == 'par':
+            paragraph_end()
+        elif kind == 'comment' and start > 0 and tex[start - 1].isdigit():
+            issues.append(issue('unescaped-percent', line, "Unescaped % after a number comments out the rest of the line", (start, start + 1, "\\%")))
+        elif text == "&" and not any(env in ALIGNMENT_ENVS for env, _ in envs):
+            issues.append(issue('unescaped-ampersand', line, "Unescaped & outside a table", (start, start + 1, "\\&")))
+        elif text == "#":
+            issues.append(issue('unescaped-hash', line, "Unescaped #", (start, start + 1, "\\#")))
+        elif text in ("\\[", "\\(", "\\]", "\\)"):
+            in_math = text in ("\\[", "\\(")
+        elif text == "$$":
+            in_math = not in_math
+        elif text == "_" and not (in_math or len(dollars) % 2 or any(env in MATH_ENVS for env, _ in envs)):
+            issues.append(issue('unescaped-underscore', line, "Unescaped _ outside math", (start, start + 1, "\\_")))
+        elif text == "$" and not len(dollars) % 2 and tex[start + 1:start + 2].isdigit():
+            # Outside math, a $ before a digit is an amount like $2M, even when the paragraph has an even number of them
+            issues.append(issue('unescaped-dollar', line, "Unescaped $ before an amount", (start, start + 1, "\\$")))
+        elif text == "$":
+            dollars.append((start, line))
+
+    paragraph_end()
+    if envs:
+        closing = "".join(f"\n\\end{{{env}}}" for env, _ in reversed(envs)) + "\n"
+        issues.append(issue('unclosed-environment', envs[-1][1], f"\\begin{{{envs[-1][0]}}} is never closed", (len(tex.rstrip()), len(tex), closing)))
+    if braces:
+        issues.append(issue('unbalanced-braces', braces[-1], "Opening brace is never closed"))
+    return issues
+
+def lint(tex: str, template: str = None) -> list:
+    """
+    Checks a generated letter before it is compiled. Returns the issues found, each with its code, line,
+    message and whether `repair` can fix it mechanically.
+    """
+    issues = structure_issues(tex, template)
+    if any(found['code'] in BLOCKING for found in issues):
+        return issues
+    return issues + body_issues(tex)
+
+def apply_edits(tex: str, edits: list) -> str:
+    applied_from = len(tex) + 1
+    for start, end, replacement in sorted(edits, key=lambda edit: edit[0], reverse=True):
+        if end > applied_from:
+            continue  # overlaps an edit applied already; the next pass picks it up
+        tex = tex[:start] + replacement + tex[end:]
+        applied_from = start
+    return tex
+
+def repair(tex: str, template: str = None, passes: int = 4) -> dict:
+    """
+    Applies every mechanical fix (escaping, code fences, stray text, the template's preamble, closing
+    environments) until the letter lints clean or only issues that need a regeneration are left.
+    Returns `{'status', 'tex', 'fixes', 'errors'}` with status 'clean', 'repaired' or 'unrepairable'.
+    """
+    fixes = []
+    for _ in range(passes):
+        issues = lint(tex, template)
+        edits = [found['edit'] for found in issues if found['repairable']]
+        if not edits:
+            break
+        fixes += [{key: found[key] for key in ('code', 'line', 'message')} for found in issues if found['repairable']]
+        tex = apply_edits(tex, edits)
+    errors = [{key: found[key] for key in ('code', 'line', 'message')} for found in lint(tex, template)]
+    status = 'unrepairable' if errors else 'repaired' if fixes else 'clean'
+    return {'status': status, 'tex': tex, 'fixes': fixes, 'errors': errors}
+
+def fix_request(errors: list) -> str:
+    """
+    Follow-up instruction asking the model to fix only the listed problems.
+    """
+    problems = "\n".join(f"- line {error['line']}: {error['message']}" for error in errors)
+    return ("The cover letter above can't be compiled as it is:\n" + problems +
+            "\nReturn the complete corrected LaTeX document. Change only what is needed to fix these problems, "
+            "keep the template's structure and do not wrap it in a code block.")
+
+def fix_messages(prompt, letter: str, errors: list) -> list:
+    """
+    Chat messages for a targeted regeneration: the original request, the broken letter and the fix request.
+    """
+    messages = list(prompt) if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
+    return messages + [
+        {"role": "assistant", "content": letter},
+        {"role": "user", "content": fix_request(errors)},
+    ]
+
+def saved_work(result: dict) -> dict:
+    """
+    Compiles and API calls a lint result (`status` and the codes of its `fixes`) saved compared to compiling
+    first: a letter repaired from an issue that breaks the compile would have cost a failed compile and a
+    regeneration; a letter regenerated or rejected before rendering still saves the failed compile.
+    """
+    if result['status'] in ('regenerated', 'rejected'):
+        return {'compiles': 1, 'api_calls': 0}
+    if result['status'] == 'repaired' and any(code in BREAKS_COMPILE for code in result['fixes']):
+        return {'compiles': 1, 'api_calls': 1}
+    return {'compiles': 0, 'api_calls': 0}
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+CACHE_PATH = "output/.cache/completions.sqlite"
+
+def completion_key(prompt, model: str, temperature: float, max_tokens: int, n: int = 1) -> str:
+    """
+    Hashes everything that determines a completion: the rendered prompt (or message list) and the model parameters.
+    `n` (the number of choices requested) only enters the key when it isn't 1, so single completions keep their keys.
+    """
+    parameters = {'prompt': prompt, 'model': model, 'temperature': temperature, 'max_tokens': max_tokens}
+    if n != 1:
+        parameters['n'] = n
+    payload = json.dumps(parameters, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CompletionCache:
+    """
+    SQLite-backed cache of chat completions keyed by `completion_key`.
+
+    When more than `max_entries` completions are stored, the least recently used ones are evicted.
+    `stats` counts hits and misses and the prompt and completion tokens that hits saved.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'saved_prompt_tokens': 0, 'saved_completion_tokens': 0}
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)")
+        self._db.commit()
+
+    def get(self, key: str) -> str:
+        """
+        Returns the cached completion for `key`, or None on a miss.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, prompt_tokens, completion_tokens FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self._db.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.stats['hits'] += 1
+            self.stats['saved_prompt_tokens'] += row[1]
+            self.stats['saved_completion_tokens'] += row[2]
+            return row[0]
+
+    def put(self, key: str, model: str, response: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, response, prompt_tokens, completion_tokens, now, now),
+            )
+            surplus = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0] - self.max_entries
+            if surplus > 0:
+                self._db.execute(
+                    "DELETE FROM completions WHERE key IN (SELECT key FROM completions ORDER BY last_used LIMIT ?)",
+                    (surplus,),
+                )
+                self.stats['evictions'] += surplus
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM completions")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
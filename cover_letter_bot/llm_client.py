@@ -0,0 +1,254 @@
+import json
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from openai import AsyncOpenAI, APIStatusError, APIConnectionError
+from .llm_cache import CompletionCache, completion_key
+from .utils import estimate_tokens
+from .generator import StreamingWriter
+from .telemetry import span, traced, current_span, percentile
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+class RateLimiter:
+    """
+    Token bucket that refills `per_minute` units evenly over a minute.
+    `acquire` waits until enough units are available.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.available = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                await asyncio.sleep((amount - self.available) / self.rate)
+
+def retry_after(error: APIStatusError) -> float:
+    """
+    Returns the delay in seconds the server asked for in its Retry-After headers, if any.
+    """
+    headers = error.response.headers if error.response is not None else {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP-date form, fall back to our own backoff
+    return None
+
+class AsyncCoverLetterClient:
+    """
+    Async generation backend sharing one pooled AsyncOpenAI client.
+
+    At most `max_concurrency` completions are in flight, and requests are admitted under the
+    `requests_per_minute` and `tokens_per_minute` budgets (prompt tokens are estimated, plus
+    max_tokens for the completion). 429 and 5xx responses are retried with jittered exponential
+    backoff, honouring Retry-After. `metrics` tracks latencies, retries and queue depth.
+    """
+
+    def __init__(self, api_key: str, model: str = "gpt-4.1", max_concurrency: int = 8, requests_per_minute: float = 500,
+                 tokens_per_minute: float = 200000, max_retries: int = 6, backoff: float = 1.0, max_backoff: float = 60.0,
+                 cache: CompletionCache = None):
+        # Retries are handled here so they count against the rate limits
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.cache = cache
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._requests = RateLimiter(requests_per_minute)
+        self._tokens = RateLimiter(tokens_per_minute)
+        self.metrics = {
+            'requests': 0,
+            'completed': 0,
+            'failed': 0,
+            'retries': 0,
+            'throttled': 0,
+            'queue_depth': 0,
+            'max_queue_depth': 0,
+            'in_flight': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'cached_prompt_tokens': 0,
+            'latencies': [],
+        }
+
+    def summary(self) -> dict:
+        """
+        Returns the metrics with latencies aggregated to count and p50/p95/p99 in seconds.
+        """
+        latencies = self.metrics['latencies']
+        summary = {key: value for key, value in self.metrics.items() if key != 'latencies'}
+        summary['latency'] = {
+            'count': len(latencies),
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+        }
+        return summary
+
+    @asynccontextmanager
+    async def _slot(self):
+        """
+        Holds one of the `max_concurrency` request slots for a completion, keeping queue depth, in-flight
+        requests, failures and latency in the metrics, also when the request is cancelled while it waits.
+        """
+        self.metrics['queue_depth'] += 1
+        self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], self.metrics['queue_depth'])
+        queued = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.metrics['queue_depth'] -= 1
+        try:
+            current_span().set(queued=round(time.perf_counter() - queued, 3))
+            self.metrics['in_flight'] += 1
+            started = time.perf_counter()
+            try:
+                yield
+            except Exception:
+                self.metrics['failed'] += 1
+                raise
+            finally:
+                self.metrics['in_flight'] -= 1
+            self.metrics['latencies'].append(time.perf_counter() - started)
+        finally:
+            self._slots.release()
+
+    async def _create(self, messages: list, temperature: float, max_tokens: int, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            await self._requests.acquire()
+            await self._tokens.acquire(estimate_tokens(messages) + max_tokens * kwargs.get('n', 1))
+            self.metrics['requests'] += 1
+            try:
+                with span("llm.request", attempt=attempt, stream=bool(kwargs.get('stream'))):
+                    return await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        **kwargs,
+                    )
+            except APIStatusError as e:
+                if e.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    raise
+                if e.status_code == 429:
+                    self.metrics['throttled'] += 1
+                delay = retry_after(e)
+            except APIConnectionError:
+                if attempt == self.max_retries:
+                    raise
+                delay = None
+            if delay is None:
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+            self.metrics['retries'] += 1
+            await asyncio.sleep(delay)
+
+    @traced("llm.generate")
+    async def generate(self, prompt, temperature: float = 0.7, max_tokens: int = 2048, bypass_cache: bool = False,
+                       stream_to: str = None, on_token=None, timings: dict = None) -> str:
+        """
+        Async counterpart of generator.generate_cover_letter, including its streaming mode.
+        `prompt` is a prompt string or a list of chat messages.
+        """
+        key = completion_key(prompt, self.model, temperature, max_tokens)
+        current_span().set(model=self.model, stream=bool(stream_to))
+        if self.cache is not None and not bypass_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                current_span().set(cached=True)
+                if stream_to:
+                    writer = StreamingWriter(stream_to, on_token, timings)
+                    writer.write(cached)
+                    writer.commit()
+                return cached
+
+        messages = prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
+        async with self._slot():
+            if stream_to:
+                cover_letter, usage = await self._stream(messages, temperature, max_tokens, StreamingWriter(stream_to, on_token, timings))
+            else:
+                response = await self._create(messages, temperature, max_tokens)
+                cover_letter, usage = response.choices[0].message.content.strip(), response.usage
+
+        prompt_tokens, completion_tokens = self._account(usage)
+        if self.cache is not None:
+            self.cache.put(key, self.model, cover_letter, prompt_tokens, completion_tokens)
+        return cover_letter
+
+    @traced("llm.generate")
+    async def generate_variants(self, prompt, n: int = 3, temperature: float = 0.7, max_tokens: int = 2048, bypass_cache: bool = False) -> list:
+        """
+        Async counterpart of generator.generate_variants: `n` alternative letters from a single request.
+        """
+        key = completion_key(prompt, self.model, temperature, max_tokens, n)
+        current_span().set(model=self.model, variants=n)
+        if self.cache is not None and not bypass_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                current_span().set(cached=True)
+                return json.loads(cached)
+
+        messages = prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
+        async with self._slot():
+            response = await self._create(messages, temperature, max_tokens, n=n)
+
+        letters = [choice.message.content.strip() for choice in sorted(response.choices, key=lambda choice: choice.index)]
+        prompt_tokens, completion_tokens = self._account(response.usage)
+        if self.cache is not None:
+            self.cache.put(key, self.model, json.dumps(letters), prompt_tokens, completion_tokens)
+        return letters
+
+    def _account(self, usage) -> tuple:
+        """
+        Adds a finished request's token usage to the metrics and the current span. Returns (prompt, completion) tokens.
+        """
+        self.metrics['completed'] += 1
+        prompt_tokens = usage.prompt_tokens if usage else 0
+        completion_tokens = usage.completion_tokens if usage else 0
+        self.metrics['prompt_tokens'] += prompt_tokens
+        self.metrics['completion_tokens'] += completion_tokens
+        # Prompt tokens the provider served from its prompt cache
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_prompt_tokens = (getattr(details, 'cached_tokens', None) or 0) if details else 0
+        self.metrics['cached_prompt_tokens'] += cached_prompt_tokens
+        current_span().set(cached=False, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_prompt_tokens=cached_prompt_tokens)
+        return prompt_tokens, completion_tokens
+
+    async def _stream(self, messages: list, temperature: float, max_tokens: int, writer: StreamingWriter) -> tuple:
+        usage = None
+        try:
+            stream = await self._create(messages, temperature, max_tokens, stream=True, stream_options={"include_usage": True})
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    writer.write(chunk.choices[0].delta.content)
+                if chunk.usage:
+                    usage = chunk.usage
+            return writer.commit(), usage
+        except BaseException:
+            writer.abort()
+            raise
+
+    async def close(self):
+        await self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -1,50 +1,8 @@
 import argparse
 import os
 from pathlib import Path
-import subprocess
-from dotenv import load_dotenv
-from scraper import scrape_job_description
 from generator import build_prompt, generate_cover_letter, save_cover_letter, load_latex_template
-
-def render_pdf_from_latex(latex_path: str, output_dir: str = "output"):
-    """
-    Renders a PDF from a LaTeX file using pdflatex.
-    """
-
-    os.makedirs(output_dir, exist_ok=True)
-    try:
-        result = subprocess.run(
-            [
-                "pdflatex",
-                "-interaction=nonstopmode",  # Don't stop for errors
-                "-output-directory", output_dir,
-                latex_path
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace"
-        )
-        print(result.stdout)
-        
-    except subprocess.CalledProcessError as e:
-        print("PDFLaTeX failed with the following output:")
-        print(e.stdout)
-        print(e.stderr)
-        print(f"Check the log file in {output_dir} for more details.")
-        # Optionally, re-raise or handle as needed
-
-    # Clean up auxiliary files except .log
-    aux_extensions = [".aux", ".out", ".toc", ".synctex.gz", ".nav", ".snm", ".fls", ".fdb_latexmk"]
-    base_name = os.path.splitext(os.path.basename(latex_path))[0]
-    for ext in aux_extensions:
-        aux_file = os.path.join(output_dir, base_name + ext)
-        if os.path.exists(aux_file):
-            try:
-                subprocess.run(["rm", aux_file], check=True)
-            except Exception as cleanup_e:
-                print(f"Could not remove {aux_file}: {cleanup_e}")
+from render import render_latex
 
 def main():
     parser = argparse.ArgumentParser(description="Cover Letter Bot CLI")
@@ -68,6 +26,7 @@ def main():
 
     # Step 1: Scrape job description
     print("Scraping job description...")
+    from scraper import scrape_job_description
     job_description = scrape_job_description(args.job_url)
     print("Job description extracted.")
 
@@ -90,6 +49,7 @@ def main():
         **prompt_kwargs
     )
 
+    from dotenv import load_dotenv
     load_dotenv()
     api_key = os.getenv("OPENAI_API_KEY")
 
@@ -105,8 +65,11 @@ def main():
 
     # Step 3: Render PDF from LaTeX
     print("Rendering PDF from LaTeX...")
-    render_pdf_from_latex(paths["out_latex"], output_dir=os.path.dirname(paths["out_pdf"]) or "output")
-    print(f"PDF saved to {paths['out_pdf']}")
+    result = render_latex(paths["out_latex"], out_dir=os.path.dirname(paths["out_pdf"]) or "output")
+    if result['status'] == 'ok':
+        print(f"PDF saved to {result['pdf_path']}")
+    else:
+        print(f"PDFLaTeX {result['status']}: {result['errors']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
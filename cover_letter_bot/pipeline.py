@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import threading
+from .render import split_preamble
+
+PIPELINE_DIR = "output/.pipeline"
+
+def stage_key(*inputs) -> str:
+    """
+    Hash of everything a stage's output depends on.
+    """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def file_digest(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def temp_path(path: str) -> str:
+    """
+    A temporary file name next to `path` that no other process or thread writing the same file uses.
+    """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def write_if_changed(path: str, text: str) -> bool:
+    """
+    Writes `text` to `path` unless the file already holds exactly that text. Returns whether it wrote.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = temp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return True
+
+def template_parts(template: str) -> tuple:
+    """
+    Splits a cover letter template into its layout (the preamble: page geometry, fonts, packages) and its
+    content (the body the model imitates). Returns `("", template)` if it has no preamble.
+    """
+    preamble, body = split_preamble(template or "")
+    return preamble or "", body
+
+def assemble_letter(letter: str, template: str) -> str:
+    """
+    Puts a generated letter into the template's current layout: if the template has a preamble, it replaces
+    the letter's own (or is prepended if the model left it out), so layout changes never need a new completion.
+    """
+    preamble, _ = template_parts(template)
+    if not preamble:
+        return letter
+    _, body = split_preamble(letter)
+    return preamble + body.lstrip()
+
+class BuildManifest:
+    """
+    Make-style bookkeeping for the batch pipeline, kept in `directory`.
+
+    Generated letters are stored content-addressed under `letters/<key>.tex`, where the key hashes every input
+    of the prompt and the model parameters, so a letter is reused no matter which output name asks for it.
+    For the render stage, `<name>.json` records the key the PDF was last built from and the hashes of its
+    outputs; it is stale when its key changed or an output is missing or was edited. Assembling needs no
+    record: the letter's .tex is rewritten only when its content changes (see write_if_changed).
+    """
+
+    def __init__(self, directory: str = PIPELINE_DIR):
+        self.directory = directory
+        self.stats = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "letters"), exist_ok=True)
+
+    def count(self, stage: str, outcome: str):
+        with self._lock:
+            self.stats.setdefault(stage, {'ran': 0, 'skipped': 0})[outcome] += 1
+
+    def letter_path(self, key: str) -> str:
+        return os.path.join(self.directory, "letters", f"{key}.tex")
+
+    def load_letter(self, key: str) -> str:
+        """
+        Returns the letter generated for `key`, or None if it has to be generated.
+        """
+        try:
+            with open(self.letter_path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def store_letter(self, key: str, letter: str):
+        write_if_changed(self.letter_path(key), letter)
+
+    def _entry_path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name.replace(os.sep, '_')}.json")
+
+    def _load(self, name: str) -> dict:
+        try:
+            with open(self._entry_path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def fresh(self, name: str, stage: str, key: str) -> bool:
+        """
+        True if `stage` of `name` was built from `key` and all its outputs are still as it left them.
+        """
+        entry = self._load(name).get(stage)
+        if not entry or entry['key'] != key:
+            return False
+        return all(file_digest(path) == digest for path, digest in entry['outputs'].items())
+
+    def record(self, name: str, stage: str, key: str, outputs: list):
+        with self._lock:
+            entries = self._load(name)
+            entries[stage] = {'key': key, 'outputs': {path: file_digest(path) for path in outputs}}
+            path = self._entry_path(name)
+            tmp_path = temp_path(path)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, path)
@@ -0,0 +1,128 @@
+import os
+import json
+import shutil
+import asyncio
+from collections import Counter
+from .cv import latex_to_text, tokenize
+from .render import split_preamble
+from .latex_lint import lint
+
+VARIANTS_DIR = "output/variants"
+
+# How much each criterion counts towards a variant's score
+WEIGHTS = {'limit': 0.3, 'keywords': 0.3, 'pages': 0.2, 'structure': 0.2}
+KEYWORDS = 30
+
+STOPWORDS = {
+    'about', 'above', 'after', 'also', 'among', 'and', 'are', 'because', 'been', 'being', 'both', 'can', 'could', 'does', 'each',
+    'for', 'from', 'have', 'having', 'here', 'into', 'more', 'most', 'must', 'other', 'our', 'ours', 'over', 'such', 'than',
+    'that', 'the', 'their', 'them', 'then', 'there', 'these', 'they', 'this', 'those', 'through', 'under', 'very', 'want',
+    'was', 'were', 'what', 'when', 'where', 'which', 'while', 'who', 'will', 'with', 'within', 'work', 'would', 'you', 'your',
+    'job', 'role', 'team', 'company', 'looking', 'join', 'including', 'based', 'well', 'like', 'able', 'strong',
+}
+
+def letter_text(tex: str) -> str:
+    """
+    The readable text of a letter, without its preamble.
+    """
+    _, body = split_preamble(tex)
+    return latex_to_text(body)
+
+def job_keywords(job_desc: str, count: int = KEYWORDS) -> list:
+    """
+    The words the job description uses most, leaving out stopwords and short words.
+    """
+    frequencies = Counter(word for word in tokenize(job_desc) if len(word) > 3 and word not in STOPWORDS and not word.isdigit())
+    return [word for word, _ in frequencies.most_common(count)]
+
+def limit_score(words: int, limit: int = None) -> float:
+    """
+    1 within the word limit, falling linearly to 0 at twice the limit.
+    """
+    if not limit or words <= limit:
+        return 1.0
+    return max(0.0, 1 - (words - limit) / limit)
+
+def keyword_score(text: str, keywords: list) -> float:
+    if not keywords:
+        return 1.0
+    words = set(tokenize(text))
+    return sum(1 for keyword in keywords if keyword in words) / len(keywords)
+
+def page_score(pages: int) -> float:
+    """
+    A cover letter should fit on one page.
+    """
+    if not pages:
+        return 0.0
+    return 1.0 if pages == 1 else 0.5 if pages == 2 else 0.0
+
+def structure_score(tex: str, template: str = None) -> float:
+    """
+    1 for a letter that lints clean against the template, less for every issue found.
+    """
+    return 1 / (1 + len(lint(tex, template)))
+
+def score_variant(tex: str, render: dict, keywords: list, template: str = None, limit: int = None) -> dict:
+    text = letter_text(tex)
+    words = len(text.split())
+    scores = {
+        'limit': limit_score(words, limit),
+        'keywords': keyword_score(text, keywords),
+        'pages': page_score(render.get('pages')) if render['status'] == 'ok' else 0.0,
+        'structure': structure_score(tex, template),
+    }
+    return {
+        'words': words,
+        'pages': render.get('pages'),
+        'render_status': render['status'],
+        'scores': {name: round(value, 3) for name, value in scores.items()},
+        'score': round(sum(WEIGHTS[name] * value for name, value in scores.items()), 4),
+    }
+
+def rank_variants(letters: list, renders: list, job_desc: str, template: str = None, limit: int = None) -> list:
+    """
+    Scores each variant by word-limit compliance, coverage of the job description's keywords, page count
+    of its PDF and fidelity to the template's structure, best first. Variants that failed to render rank last.
+    """
+    keywords = job_keywords(job_desc)
+    ranking = [dict(score_variant(tex, render, keywords, template, limit), index=index)
+               for index, (tex, render) in enumerate(zip(letters, renders))]
+    return sorted(ranking, key=lambda variant: (variant['render_status'] == 'ok', variant['score']), reverse=True)
+
+async def render_and_rank(letters: list, out_name: str, job_desc: str, render, template: str = None, limit: int = None,
+                          out_dir: str = "output", variants_dir: str = VARIANTS_DIR) -> dict:
+    """
+    Writes each variant to `<variants_dir>/<out_name>/v<i>.tex`, renders them all at once with `render`
+    (an async function of the .tex path and output directory returning a render.render_latex result),
+    ranks them and copies the best one to `<out_dir>/<out_name>.tex` and `.pdf`. The others stay in the
+    variants directory next to `ranking.json`; the files of an earlier run are removed first.
+    Returns `{'best', 'tex_path', 'pdf_path', 'ranking'}`; `pdf_path` is None if no variant rendered.
+    """
+    directory = os.path.join(variants_dir, out_name)
+    # Variants, PDFs and logs of an earlier run (possibly with more variants) must not mix with this ranking
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index, letter in enumerate(letters):
+        path = os.path.join(directory, f"v{index}.tex")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(letter)
+        paths.append(path)
+
+    renders = await asyncio.gather(*(render(path, directory) for path in paths))
+    ranking = rank_variants(letters, renders, job_desc, template, limit)
+    for variant in ranking:
+        variant['tex_path'] = paths[variant['index']]
+        variant['pdf_path'] = renders[variant['index']].get('pdf_path')
+    with open(os.path.join(directory, "ranking.json"), "w", encoding="utf-8") as f:
+        json.dump(ranking, f, indent=2)
+
+    best = ranking[0]
+    tex_path = os.path.join(out_dir, f"{out_name}.tex")
+    shutil.copyfile(best['tex_path'], tex_path)
+    pdf_path = None
+    if best['render_status'] == 'ok':
+        pdf_path = os.path.join(out_dir, f"{out_name}.pdf")
+        shutil.copyfile(best['pdf_path'], pdf_path)
+    return {'best': best['index'], 'tex_path': tex_path, 'pdf_path': pdf_path, 'ranking': ranking}
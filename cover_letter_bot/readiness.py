@@ -0,0 +1,54 @@
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from .telemetry import span
+
+# Upper bounds in seconds for each scrape step. Waits return as soon as the DOM condition
+# holds, so on a fast page the steps take milliseconds rather than these values.
+STEP_TIMEOUTS = {
+    'page_ready': 10,
+    'sign_in_modal': 2,
+    'show_more': 2,
+}
+
+POLL_FREQUENCY = 0.05
+
+def wait_for(driver, step: str, condition, timings: dict = None, timeout: float = None):
+    """
+    Waits until `condition(driver)` returns a truthy value or the step's timeout expires.
+    Returns the condition's value, or None on timeout. The time spent is recorded in `timings[step]`
+    and as a `scrape.<step>` span.
+    """
+    timeout = STEP_TIMEOUTS[step] if timeout is None else timeout
+    started = time.perf_counter()
+    try:
+        with span(f"scrape.{step}", timeout=timeout) as current:
+            try:
+                return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(condition)
+            except TimeoutException:
+                current.set(timed_out=True)
+                print(f"Timed out after {timeout}s waiting for {step}.")
+                return None
+    finally:
+        if timings is not None:
+            timings[step] = round(timings.get(step, 0) + time.perf_counter() - started, 3)
+
+class timed:
+    """
+    Context manager that adds the duration of its block to `timings[step]` and records it as a `scrape.<step>` span.
+    """
+
+    def __init__(self, step: str, timings: dict = None):
+        self.step = step
+        self.timings = timings
+
+    def __enter__(self):
+        self._span = span(f"scrape.{self.step}")
+        self._span.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._span.__exit__(*exc)
+        if self.timings is not None:
+            self.timings[self.step] = round(self.timings.get(self.step, 0) + time.perf_counter() - self.started, 3)
@@ -0,0 +1,325 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+import asyncio
+import tempfile
+import threading
+import subprocess
+import contextvars
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from .telemetry import span, traced, current_span
+
+FORMAT_DIR = "output/.cache/fmt"
+
+OUTPUT_WRITTEN = re.compile(r"Output written on .*? \((\d+) pages?")
+ERROR_LINE = re.compile(r"^l\.(\d+)")
+
+def parse_latex_log(log: str) -> dict:
+    """
+    Pulls the page count and the `! ...` error messages (with their source line numbers) out of a pdflatex log.
+    """
+    match = OUTPUT_WRITTEN.search(log)
+    errors = []
+    lines = log.splitlines()
+    for index, line in enumerate(lines):
+        if not line.startswith("! "):
+            continue
+        error = {'message': line[2:].strip(), 'line': None}
+        for following in lines[index + 1:index + 10]:
+            line_match = ERROR_LINE.match(following)
+            if line_match:
+                error['line'] = int(line_match.group(1))
+                break
+        errors.append(error)
+    return {'pages': int(match.group(1)) if match else 0, 'errors': errors}
+
+BEGIN_DOCUMENT = re.compile(r"^[^%\n]*?\\begin\{document\}", re.MULTILINE)
+
+_format_locks = {}
+_format_locks_guard = threading.Lock()
+
+def split_preamble(tex: str) -> tuple:
+    """
+    Splits a LaTeX source into the preamble and the body starting at `\\begin{document}`.
+    Returns `(None, tex)` if there is no `\\begin{document}` outside a comment.
+    """
+    match = BEGIN_DOCUMENT.search(tex)
+    if not match:
+        return None, tex
+    start = match.end() - len("\\begin{document}")
+    return tex[:start], tex[start:]
+
+# Files next to a document that its preamble may load; a format built from them goes stale when they change
+LOCAL_INPUT_EXTENSIONS = ('.cls', '.sty', '.clo', '.cfg', '.def', '.fd')
+INPUT_COMMAND = re.compile(r"\\(?:input|include)\s*\{([^}]+)\}")
+
+@lru_cache(maxsize=None)
+def pdflatex_version() -> str:
+    """
+    The pdflatex version line plus the modification time of the installed base format, which fmtutil
+    rebuilds whenever the TeX installation or its packages are updated.
+    """
+    try:
+        version = subprocess.run(["pdflatex", "--version"], capture_output=True, text=True).stdout.splitlines()[0]
+    except (FileNotFoundError, IndexError):
+        return ""
+    try:
+        base = subprocess.run(["kpsewhich", "-engine=pdftex", "pdflatex.fmt"], capture_output=True, text=True).stdout.strip()
+        return f"{version} {os.path.getmtime(base) if base else ''}"
+    except (FileNotFoundError, OSError):
+        return version
+
+def local_inputs(preamble: str, source_dir: str) -> list:
+    """
+    `(name, sha256)` of the class, package and config files in `source_dir` and of the files the preamble
+    `\\input`s from there, in name order.
+    """
+    names = set()
+    try:
+        names.update(name for name in os.listdir(source_dir) if name.endswith(LOCAL_INPUT_EXTENSIONS))
+    except FileNotFoundError:
+        pass
+    for name in INPUT_COMMAND.findall(preamble):
+        name = name.strip()
+        names.add(name if os.path.splitext(name)[1] else f"{name}.tex")
+    digests = []
+    for name in sorted(names):
+        try:
+            with open(os.path.join(source_dir, name), "rb") as f:
+                digests.append((name, hashlib.sha256(f.read()).hexdigest()))
+        except OSError:
+            continue  # found on the TeX search path instead
+    return digests
+
+def format_name(preamble: str, source_dir: str = None) -> str:
+    """
+    Name of the precompiled format for a preamble. The pdflatex version (and base format) is part of the hash
+    because a format only loads in the engine build that dumped it, and so are the local files it loads.
+    """
+    inputs = "".join(f"{name}:{digest}\n" for name, digest in local_inputs(preamble, source_dir)) if source_dir else ""
+    return "preamble-" + hashlib.sha256((pdflatex_version() + "\n" + inputs + preamble).encode("utf-8")).hexdigest()[:16]
+
+def mark_unusable(fmt_path: str):
+    """
+    Records that the format at `fmt_path` can't be dumped or used. The marker belongs to the format's key, so a
+    changed preamble, local input or TeX installation gets a new name and is tried again.
+    """
+    with open(f"{fmt_path}.unusable", "w") as f:
+        f.write(pdflatex_version())
+
+def build_format(preamble: str, source_dir: str, format_dir: str = FORMAT_DIR, timeout: float = 60) -> str:
+    """
+    Returns the path of a format file with `preamble` already loaded, dumping it with `pdflatex -ini` first if it
+    isn't cached in `format_dir`. Returns None if the preamble can't be dumped (some packages don't allow it).
+    """
+    name = format_name(preamble, source_dir)
+    fmt_path = os.path.join(format_dir, f"{name}.fmt")
+    with _format_locks_guard:
+        lock = _format_locks.setdefault(name, threading.Lock())
+
+    with lock:
+        if os.path.exists(fmt_path):
+            return fmt_path
+        if os.path.exists(f"{fmt_path}.unusable"):
+            return None
+        os.makedirs(format_dir, exist_ok=True)
+        with span("render.format_build", format=name), tempfile.TemporaryDirectory(prefix=f"{name}-") as build_dir:
+            with open(os.path.join(build_dir, "preamble.tex"), "w", encoding="utf-8") as f:
+                f.write(preamble)
+            env = dict(os.environ, TEXINPUTS=source_dir + os.pathsep + os.environ.get("TEXINPUTS", ""))
+            try:
+                subprocess.run(
+                    ["pdflatex", "-ini", "-interaction=nonstopmode", f"-jobname={name}", "&pdflatex", "preamble.tex", "\\dump"],
+                    cwd=build_dir,
+                    env=env,
+                    capture_output=True,
+                    timeout=timeout,
+                )
+            except FileNotFoundError:
+                return None  # no TeX installed, nothing to remember
+            except subprocess.TimeoutExpired:
+                mark_unusable(fmt_path)
+                return None
+            built = os.path.join(build_dir, f"{name}.fmt")
+            if not os.path.exists(built):
+                # Some packages can't be dumped; don't retry this preamble for every letter
+                mark_unusable(fmt_path)
+                return None
+            # Move into place atomically so other processes never load a half-written format
+            shutil.move(built, f"{fmt_path}.{os.getpid()}.tmp")
+            os.replace(f"{fmt_path}.{os.getpid()}.tmp", fmt_path)
+        return fmt_path
+
+def discard_format(fmt_path: str):
+    """
+    Removes a format that loaded but didn't compile a document that compiles without it, and marks the
+    preamble so the format isn't rebuilt for every letter.
+    """
+    if os.path.exists(fmt_path):
+        os.remove(fmt_path)
+    mark_unusable(fmt_path)
+
+def run_pdflatex(job_dir: str, base_name: str, env: dict, timeout: float, fmt_path: str = None) -> tuple:
+    """
+    Runs pdflatex on `<base_name>.tex` in `job_dir`, optionally with a precompiled format.
+    Returns `(returncode, error)`; if pdflatex didn't run to completion, returncode is None and
+    error carries the resulting `status` and a message.
+    """
+    if timeout <= 0:
+        return None, {'status': 'timeout', 'message': "no time left for pdflatex within the render timeout", 'line': None}
+    command = ["pdflatex", "-interaction=nonstopmode"]
+    if fmt_path:
+        # A format is looked up like any other input file, so link it next to the document
+        link = os.path.join(job_dir, os.path.basename(fmt_path))
+        if not os.path.exists(link):
+            os.symlink(os.path.abspath(fmt_path), link)
+        command.append(f"-fmt={os.path.splitext(os.path.basename(fmt_path))[0]}")
+    try:
+        completed = subprocess.run(
+            command + [f"{base_name}.tex"],
+            cwd=job_dir,
+            env=env,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=timeout,
+        )
+        return completed.returncode, None
+    except subprocess.TimeoutExpired:
+        return None, {'status': 'timeout', 'message': f"pdflatex did not finish within {timeout:.1f}s", 'line': None}
+    except FileNotFoundError:
+        return None, {'status': 'failed', 'message': "pdflatex not found, is a TeX distribution installed?", 'line': None}
+
+@traced("render")
+def render_latex(tex_path: str, out_dir: str = "output", timeout: float = 60, use_format: bool = True, format_dir: str = FORMAT_DIR) -> dict:
+    """
+    Compiles `tex_path` with pdflatex in a private temporary directory and moves only the PDF
+    (and the .log, for debugging) into `out_dir`, so concurrent renders never share aux files.
+
+    With `use_format`, the preamble is compiled once into a format file cached in `format_dir` (keyed by
+    the preamble hash) and only the document body is compiled per letter. If the format can't be built
+    or the compile with it fails, the letter is compiled normally instead. `timeout` covers all of these
+    steps together; each one only gets the time the earlier ones left.
+
+    Returns a result dict with `status` ('ok', 'failed' or 'timeout'), `returncode`, `pdf_path`,
+    `log_path`, `pages`, `errors`, `format` (the format name, or None) and `seconds`.
+    """
+    base_name = os.path.splitext(os.path.basename(tex_path))[0]
+    source_dir = os.path.dirname(os.path.abspath(tex_path))
+    os.makedirs(out_dir, exist_ok=True)
+    result = {
+        'tex_path': tex_path,
+        'status': 'failed',
+        'returncode': None,
+        'pdf_path': None,
+        'log_path': None,
+        'pages': 0,
+        'errors': [],
+        'format': None,
+    }
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+
+    def remaining() -> float:
+        return deadline - time.monotonic()
+
+    with open(tex_path, "r", encoding="utf-8") as f:
+        tex = f.read()
+    preamble, body = split_preamble(tex) if use_format else (None, tex)
+    fmt_path = build_format(preamble, source_dir, format_dir, remaining()) if preamble else None
+
+    with tempfile.TemporaryDirectory(prefix=f"render-{base_name}-") as job_dir:
+        job_tex = os.path.join(job_dir, f"{base_name}.tex")
+        # Keep files next to the source (images, \input) resolvable; the trailing separator appends the default search path
+        env = dict(os.environ, TEXINPUTS=source_dir + os.pathsep + os.environ.get("TEXINPUTS", ""))
+        pdf_file = os.path.join(job_dir, f"{base_name}.pdf")
+        log_file = os.path.join(job_dir, f"{base_name}.log")
+        line_offset = 0
+        format_failed = None
+
+        if fmt_path:
+            with open(job_tex, "w", encoding="utf-8") as f:
+                f.write(body)
+            returncode, error = run_pdflatex(job_dir, base_name, env, remaining(), fmt_path)
+            if returncode == 0 and os.path.exists(pdf_file):
+                result['format'] = os.path.basename(fmt_path)
+                # Error line numbers refer to the body only
+                line_offset = preamble.count("\n")
+            else:
+                for leftover in (pdf_file, log_file):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                format_failed, fmt_path = fmt_path, None
+
+        if not fmt_path:
+            with open(job_tex, "w", encoding="utf-8") as f:
+                f.write(tex)
+            returncode, error = run_pdflatex(job_dir, base_name, env, remaining())
+            if format_failed and returncode == 0:
+                # The letter is fine, so the format is stale or can't be used with this preamble
+                discard_format(format_failed)
+
+        result['returncode'] = returncode
+        if error:
+            result['status'] = error.pop('status')
+            result['errors'].append(error)
+
+        if os.path.exists(log_file):
+            with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+                parsed = parse_latex_log(f.read())
+            result['pages'] = parsed['pages']
+            for parsed_error in parsed['errors']:
+                if parsed_error['line'] is not None:
+                    parsed_error['line'] += line_offset
+                result['errors'].append(parsed_error)
+            result['log_path'] = os.path.join(out_dir, f"{base_name}.log")
+            shutil.move(log_file, result['log_path'])
+
+        if os.path.exists(pdf_file):
+            result['pdf_path'] = os.path.join(out_dir, f"{base_name}.pdf")
+            shutil.move(pdf_file, result['pdf_path'])
+            if result['returncode'] == 0:
+                result['status'] = 'ok'
+
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    current_span().set(tex=os.path.basename(tex_path), status=result['status'], pages=result['pages'], format=result['format'], errors=len(result['errors']))
+    return result
+
+class RenderService:
+    """
+    Runs up to `workers` pdflatex jobs in parallel, each in its own temporary directory
+    and limited to `timeout` seconds, reusing precompiled preamble formats unless `use_format` is False.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 60, use_format: bool = True, format_dir: str = FORMAT_DIR):
+        self.timeout = timeout
+        self.use_format = use_format
+        self.format_dir = format_dir
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+
+    def submit(self, tex_path: str, out_dir: str = "output"):
+        """
+        Queues a render and returns a concurrent.futures.Future of its result dict.
+        """
+        # Run in a copy of the caller's context so the render span nests under the caller's span
+        return self._executor.submit(contextvars.copy_context().run, render_latex, tex_path, out_dir, self.timeout, self.use_format, self.format_dir)
+
+    async def render(self, tex_path: str, out_dir: str = "output") -> dict:
+        return await asyncio.wrap_future(self.submit(tex_path, out_dir))
+
+    def render_many(self, tex_paths: list, out_dir: str = "output") -> list:
+        futures = [self.submit(tex_path, out_dir) for tex_path in tex_paths]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
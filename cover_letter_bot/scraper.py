@@ -1,59 +1,75 @@
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException
+from selenium.common.exceptions import ElementNotInteractableException, ElementClickInterceptedException
 import time
 import os
+from functools import lru_cache
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
+from .readiness import wait_for, timed
+from .telemetry import span
+from .cache import JobDescriptionCache
+from .extract import extract_from_driver, page_diagnostics
 
-def close_sign_in_modal(driver):
+MARKUP_SELECTOR = "div.show-more-less-html__markup"
+MODAL_SELECTOR = ".contextual-sign-in-modal"
+MODAL_DISMISS_SELECTOR = "button.contextual-sign-in-modal__modal-dismiss"
+SHOW_MORE_SELECTOR = ".show-more-less-html__button--more"
+
+def wait_for_job_details(driver, timings: dict = None):
     """
-    Closes the LinkedIn sign-in modal pop-up if it appears. If not found, clicks near the edge of the page to try to dismiss it.
+    Waits until the job description markup is present in the DOM.
     """
-    try:
-        # Wait up to 10 seconds for the button to be clickable
-        button = WebDriverWait(driver, 5).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, "button.contextual-sign-in-modal__modal-dismiss"))
-        )
-        button.click()
-        time.sleep(1)
-        print("Sign in modal closed.")
-    except Exception as e:
-        print("Sign in modal not found or not clickable, clicking outside to dismiss.")
-        # Try clicking near the edge of the page (e.g., top-left corner)
-        try:
-            ActionChains(driver).move_by_offset(10, 10).click().perform()
-            time.sleep(1)
-            print("Clicked outside modal to attempt dismissal.")
-        except Exception as click_e:
-            print("Failed to click outside modal:", click_e)
-        # Optionally, print all button HTMLs for debugging
-        # buttons = driver.find_elements(By.TAG_NAME, "button")
-        # for btn in buttons:
-        #     print(btn.get_attribute("outerHTML"))
+    return wait_for(driver, 'page_ready', EC.presence_of_element_located((By.CSS_SELECTOR, MARKUP_SELECTOR)), timings)
 
-def click_show_more_button(driver):
+def close_sign_in_modal(driver, timings: dict = None):
     """
-    Clicks the 'Show more' button to expand the full job description if present.
+    Closes the LinkedIn sign-in modal pop-up if it is on the page and waits until it is gone.
+    If the dismiss button can't be clicked, clicks near the edge of the page to try to dismiss it.
     """
+    if not any(modal.is_displayed() for modal in driver.find_elements(By.CSS_SELECTOR, MODAL_SELECTOR)):
+        return
+
+    button = wait_for(driver, 'sign_in_modal', EC.element_to_be_clickable((By.CSS_SELECTOR, MODAL_DISMISS_SELECTOR)), timings)
     try:
-        # Wait a moment for the button to appear
-        time.sleep(1)
-        button = driver.find_element(
-            "css selector",
-            ".show-more-less-html__button--more"
-        )
-        if button.is_displayed() and button.is_enabled():
+        if button is not None:
             button.click()
-            time.sleep(1)  # Wait for content to expand
-    except (NoSuchElementException, ElementNotInteractableException):
+        else:
+            print("Sign in modal not clickable, clicking outside to dismiss.")
+            # Click near the top-left corner of the page, relative to the body so pooled drivers don't drift
+            body = driver.find_element(By.TAG_NAME, "body")
+            ActionChains(driver).move_to_element_with_offset(body, 10 - body.size['width'] // 2, 10 - body.size['height'] // 2).click().perform()
+    except Exception as e:
+        print("Failed to dismiss sign in modal:", e)
+        return
+
+    if wait_for(driver, 'sign_in_modal', EC.invisibility_of_element_located((By.CSS_SELECTOR, MODAL_SELECTOR)), timings):
+        print("Sign in modal closed.")
+
+def click_show_more_button(driver, timings: dict = None):
+    """
+    Clicks the 'Show more' button to expand the full job description if present and waits for the expansion.
+    """
+    buttons = driver.find_elements(By.CSS_SELECTOR, SHOW_MORE_SELECTOR)
+    if not buttons or not buttons[0].is_displayed():
         print("Show more button not found")
-        pass  # Button not present or already clicked
+        return  # Button not present or already clicked
+
+    try:
+        buttons[0].click()
+    except (ElementNotInteractableException, ElementClickInterceptedException):
+        print("Show more button not clickable")
+        return
+
+    def expanded(driver):
+        # LinkedIn swaps the button to its "less" state and drops the clamp class once the text is expanded
+        return not driver.find_elements(By.CSS_SELECTOR, SHOW_MORE_SELECTOR) or \
+            not driver.find_elements(By.CSS_SELECTOR, f"{MARKUP_SELECTOR}[class*='--clamp']")
+
+    wait_for(driver, 'show_more', expanded, timings)
 
 def save_job_description(text: str, output_path: str = "output/job_description.txt"):
     """
@@ -63,54 +79,91 @@ def save_job_description(text: str, output_path: str = "output/job_description.t
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(text)
 
-def scrape_job_description(url: str) -> str:
+@lru_cache(maxsize=None)
+def chromedriver_path() -> str:
     """
-    Scrapes and formats the job description from a LinkedIn job listing using Selenium to fetch the page.
-    Returns a neatly formatted string with sections: About, Tasks, Benefits, Requirements, Contact.
-    Note: Requires ChromeDriver (or another webdriver) to be installed and in PATH.
+    Installs (or looks up) the matching ChromeDriver once per process.
+    """
+    return ChromeDriverManager().install()
+
+def create_driver(headless: bool = False):
+    """
+    Starts a Chrome webdriver with the options used for scraping.
     """
-    # Set up headless Chrome
     chrome_options = Options()
-    #chrome_options.add_argument('--headless')
+    if headless:
+        chrome_options.add_argument('--headless=new')
     chrome_options.add_argument('--disable-gpu')
     chrome_options.add_argument('--no-sandbox')
-    driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=chrome_options)
+    return webdriver.Chrome(service=ChromeService(chromedriver_path()), options=chrome_options)
 
-    try:
+def load_job_page(driver, url: str, timings: dict = None) -> dict:
+    """
+    Opens the job listing in the given driver, dismisses the sign-in modal, expands the description
+    and extracts the job record in the browser (see extract.extract_from_driver), so the page source
+    is never transferred or parsed. Each step waits only until its DOM condition holds;
+    the time spent per step is recorded in `timings`.
+    """
+    with timed('navigate', timings):
         driver.get(url)
-        time.sleep(5)  # Wait for page to load (may need to adjust for slow connections)
-        close_sign_in_modal(driver)
-        click_show_more_button(driver)
-        html = driver.page_source
-    finally:
-        driver.quit()
-
-    soup = BeautifulSoup(html, "html.parser")
-
-    job_details = soup.find("div", class_="show-more-less-html__markup")
-    print(job_details.prettify())
-    if not job_details:
-        # Print all IDs present in the HTML
-        all_ids = set(tag.get('id') for tag in soup.find_all(attrs={"id": True}))
-        print("IDs found in the HTML:")
-        for id_val in all_ids:
-            print(f"- {id_val}")
-        # Print all button class names and IDs
-        print("Button class names and IDs found in the HTML:")
-        for button in soup.find_all('button'):
-            btn_id = button.get('id')
-            btn_class = button.get('class')
-            if btn_id or btn_class:
-                print(f"- id: {btn_id}, class: {btn_class}")
+    wait_for_job_details(driver, timings)
+    close_sign_in_modal(driver, timings)
+    click_show_more_button(driver, timings)
+    with timed('extract', timings), span("scrape.extract") as current:
+        record = extract_from_driver(driver, MARKUP_SELECTOR)
+        current.set(found=record['source'] == 'markup', description_chars=len(record['description'] or ""))
+        if record['source'] != 'markup':
+            diagnostics = page_diagnostics(driver)
+            print("IDs found in the HTML:")
+            for id_val in diagnostics['ids']:
+                print(f"- {id_val}")
+            print("Button class names and IDs found in the HTML:")
+            for button in diagnostics['buttons']:
+                print(f"- id: {button['id']}, class: {button['class']}")
+    return record
+
+def scrape_job_record(url: str, pool=None, timings: dict = None) -> dict:
+    """
+    Scrapes a LinkedIn job listing with Selenium and returns its record: title, company, location,
+    description and the description's sections (see extract.extract_job).
+    If a DriverPool is given, a driver is leased from it instead of starting a new browser.
+    Raises ValueError if the page has no description container.
+    """
+    if pool is not None:
+        lease_started = time.perf_counter()
+        with pool.lease() as driver:
+            if timings is not None:
+                timings['driver_lease'] = round(time.perf_counter() - lease_started, 3)
+            record = load_job_page(driver, url, timings)
+    else:
+        with timed('driver_start', timings):
+            driver = create_driver()
+        try:
+            record = load_job_page(driver, url, timings)
+        finally:
+            driver.quit()
+    if record['source'] != 'markup':
         raise ValueError("Could not find job details section.")
+    return record
 
-    # General extraction: get all readable text, preserving line breaks
-    def extract_all_text(job_details):
-        # Use get_text with separator to preserve line breaks
-        return job_details.get_text(separator="\n", strip=True)
+def scrape_job_description(url: str, pool=None, timings: dict = None, cache=None) -> str:
+    """
+    Scrapes and formats the job description from a LinkedIn job listing using Selenium to fetch the page.
+    Returns a neatly formatted string with sections: About, Tasks, Benefits, Requirements, Contact.
+    If a DriverPool is given, a driver is leased from it instead of starting a new browser.
+    Per-step durations in seconds are recorded in `timings` if a dict is passed.
+    If a JobDescriptionCache is given, a cached description is returned without opening the page.
+    Note: Requires ChromeDriver (or another webdriver) to be installed and in PATH.
+    """
+    if cache is not None:
+        cached = cache.get(url)
+        if cached is not None:
+            return cached
 
-    formatted = extract_all_text(job_details)
+    formatted = scrape_job_record(url, pool, timings)['description']
     save_job_description(formatted)
+    if cache is not None:
+        cache.put(url, formatted, source='selenium')
     return formatted
 
 if __name__ == "__main__":
@@ -118,6 +171,6 @@ if __name__ == "__main__":
     #url = input("Enter LinkedIn job URL: ")
     url = r"https://www.linkedin.com/jobs/search/?currentJobId=4267899131&f_C=87192680&geoId=92000000&origin=COMPANY_PAGE_JOBS_CLUSTER_EXPANSION&originToLandingJobPostings=4267899131&trk=d_flagship3_company"
     url = r"https://www.linkedin.com/jobs/view/4239751114/?eBP=CwEAAAGYNij_e89mKeMwunFTW86lx5UKb_FkIcSyNNR3vNbUKqdrHYT5F4WyG4XrqxRkAHNwBv8Kj15-m7ZY0dWwDpONgj0BXPknAQH0ORrCJXEmOgZ5opEDVAUFBDqm9wYuWPpHLtGKVh368xx2DTbzkTiFxqstoxAhmxXSywt59lvqoDObq69WwqUMz0t-7rspMGpWcdIFvdIaqJa2C6yVFZXI_X8PjX-FLbrppO4dNgpLkoCx6hOEmKG4REYaeqpwmTPqw6-fNXG1Ok2khYtZPZlD4bTqswLVRcelseJyWyKrQzb8SeWDFXowrH8FwIKnPcRykqx_9alGk2WvBEKX1v6tCNnYJfFxfQcBJXbSndPRpE7OmgZ1koUZrlsITwLg0Ice3qTzCVlGzE3JGjTBll12uXMFJWZH4pBw5ZDjO2wGz84xg63I1l2yVJnS9lFkloYbeZetbHVbrAI7ryxnCIC9Wmsw7SeAxQWrZ3_d2D1VEp6NARxdbzbMZa-au1AiF9lpTIo&refId=Q%2FwEXNcr9rRHFmtGXdpCUw%3D%3D&trackingId=iQxqqiyMaxV5VSa1MwjKpA%3D%3D&trk=flagship3_jobs_discovery_jymbii"
-    job_description = scrape_job_description(url)
+    job_description = scrape_job_description(url, cache=JobDescriptionCache())
     print("\n--- Formatted Job Description ---\n")
     print(job_description)
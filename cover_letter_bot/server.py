@@ -0,0 +1,340 @@
+import os
+import time
+import asyncio
+import secrets
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from dotenv import load_dotenv
+from . import batch
+from . import telemetry
+from .browser_pool import DriverPool
+from .fetcher import JobFetcher
+from .cache import JobDescriptionCache
+from .llm_cache import CompletionCache
+from .llm_client import AsyncCoverLetterClient
+from .utils import load_latex_template, render_pdf_from_latex
+from .render import render_latex
+from .jobstore import JobStore
+from .jobqueue import JobQueue, QueueFull, QUEUE_PATH
+from .pipeline import BuildManifest, stage_key, file_digest
+
+OUTPUT_DIR = batch.OUTPUT_DIR
+HOST = "127.0.0.1"
+PORT = 8750
+# Clients may only name templates in here; anything else would be read and sent to OpenAI with the prompt
+TEMPLATES_DIR = "templates"
+MAX_LIST_LIMIT = 500
+
+class CoverLetterServer:
+    """
+    Long-running cover letter service. The driver pool, HTTP session, OpenAI client, caches, job store and
+    loaded templates are set up once and shared by every job, so a letter costs only its own scrape,
+    completion and render. Jobs come from a JobQueue on disk and run through the batch stages
+    (scrape, generator.build_prompt and the completion, utils.render_pdf_from_latex) on `workers` workers;
+    scrapes and renders are further limited by `concurrency`.
+    """
+
+    def __init__(self, api_key: str, queue: JobQueue, workers: int = 4, concurrency: dict = None, debug: bool = False, use_cache: bool = True,
+                 rate_limits: dict = None, skip_duplicates: bool = True):
+        self.api_key = api_key
+        self.queue = queue
+        self.workers = workers
+        self.concurrency = {**batch.CONCURRENCY, **(concurrency or {})}
+        self.debug = debug
+        self.use_cache = use_cache
+        self.rate_limits = rate_limits or {}
+        self.skip_duplicates = skip_duplicates
+        self.templates = {}
+        self._template_mtimes = {}
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._durations = []
+        self.started_at = time.time()
+
+    async def start(self):
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency['scrape'] + self.concurrency['render'] + 4))
+        self.pool = DriverPool(size=self.concurrency['scrape'])
+        self.fetcher = JobFetcher(pool=self.pool, cache=JobDescriptionCache() if self.use_cache else None, connections=self.concurrency['scrape'])
+        # Debug jobs never call the API, so the server runs without a client (or an API key)
+        self.client = None if self.debug else AsyncCoverLetterClient(self.api_key, max_concurrency=self.concurrency['generate'], cache=CompletionCache(), **self.rate_limits)
+        self.store = JobStore()
+        self.manifest = BuildManifest() if not self.debug else None
+        self._scrapes = asyncio.Semaphore(self.concurrency['scrape'])
+        self._renders = asyncio.Semaphore(self.concurrency['render'])
+        resumed = self.queue.requeue_running()
+        if resumed:
+            print(f"Resuming {resumed} job(s) interrupted by the last shutdown.")
+        self._tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.fetcher.close()
+        await asyncio.to_thread(self.pool.close)
+        if self.client is not None:
+            await self.client.close()
+            self.client.cache.close()
+        self.store.close()
+
+    def load_templates(self, job: dict) -> dict:
+        """
+        Returns the loaded CV and cover letter templates, reading a file again only when it changed on disk.
+        """
+        for key in ('cv_template', 'cover_letter_template'):
+            path = job[key]
+            if not path:
+                continue
+            mtime = os.path.getmtime(path)
+            if self._template_mtimes.get(path) != mtime:
+                self.templates[path] = load_latex_template(path)
+                self._template_mtimes[path] = mtime
+        return self.templates
+
+    def submit(self, options: dict) -> dict:
+        """
+        Validates the job options and queues the job. Raises ValueError for bad options and QueueFull
+        when the queue has no room.
+        """
+        output_latex = options.get('output_latex')
+        # The name ends up in paths under output/, so it must not point anywhere else
+        if output_latex is not None and (not isinstance(output_latex, str) or os.path.basename(output_latex) != output_latex
+                                         or "\\" in output_latex or output_latex.strip(".") == ""):
+            raise ValueError("output_latex must be a file name without a directory.")
+        job = batch.job_options(options)
+        if 'output_latex' not in options:
+            job['output_latex'] = f"letter_{secrets.token_hex(4)}"
+        templates_dir = os.path.realpath(TEMPLATES_DIR)
+        for key in ('cv_template', 'cover_letter_template'):
+            if job[key] and os.path.commonpath([os.path.realpath(job[key]), templates_dir]) != templates_dir:
+                raise ValueError(f"{key} must be a file in {TEMPLATES_DIR}/.")
+            if job[key] and not os.path.exists(job[key]):
+                raise ValueError(f"{key} {job[key]} does not exist.")
+        queued = self.queue.submit(job)
+        self._wakeup.set()
+        return queued
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a queue slot is likely to free up, from the average duration of recent jobs.
+        """
+        recent = self._durations[-20:]
+        average = sum(recent) / len(recent) if recent else 30
+        return max(1, round(average / self.workers))
+
+    async def render_file(self, tex_path: str, out_dir: str) -> dict:
+        async with self._renders:
+            return await asyncio.to_thread(render_latex, tex_path, out_dir)
+
+    async def render(self, job: dict, record: dict, generated=None) -> str:
+        if isinstance(generated, dict):
+            return await batch.render_variants(job, record, generated, self.render_file)
+        tex_path = os.path.join(OUTPUT_DIR, f"{job['output_latex']}.tex")
+        pdf_path = os.path.join(OUTPUT_DIR, f"{job['output_latex']}.pdf")
+        key = stage_key(file_digest(tex_path))
+        if self.manifest is not None and self.manifest.fresh(job['output_latex'], 'render', key):
+            record['render'] = {'status': 'up to date'}
+            return pdf_path
+        async with self._renders:
+            result = await asyncio.to_thread(render_pdf_from_latex, job['output_latex'], OUTPUT_DIR)
+        record['render'] = {key: result[key] for key in ('status', 'returncode', 'pages', 'errors', 'seconds')}
+        if result['status'] != 'ok':
+            raise RuntimeError(f"pdflatex {result['status']}: " + "; ".join(error['message'] for error in result['errors'][:3]))
+        if self.manifest is not None:
+            self.manifest.record(job['output_latex'], 'render', key, [result['pdf_path']])
+        return result['pdf_path']
+
+    async def run_job(self, job_id: str, job: dict):
+        record = {
+            'job_url': job['job_url'],
+            'output_latex': os.path.join(OUTPUT_DIR, f"{job['output_latex']}.tex"),
+            'timings': {},
+            'scrape_steps': {},
+            'trace_id': secrets.token_hex(16),
+        }
+        started = time.perf_counter()
+        stage = None
+        try:
+            stage = 'scrape'
+            self.queue.set_stage(job_id, stage)
+            with telemetry.span("stage.scrape", trace_id=record['trace_id'], job=job['output_latex']):
+                async with self._scrapes:
+                    job_description = await batch.scrape_stage(job, record, self.fetcher, self.store, self.skip_duplicates)
+            record['timings'][stage] = round(time.perf_counter() - started, 3)
+
+            stage = 'generate'
+            self.queue.set_stage(job_id, stage)
+            stage_started = time.perf_counter()
+            with telemetry.span("stage.generate", trace_id=record['trace_id'], job=job['output_latex']):
+                generated = await batch.generate_stage(job, record, job_description, self.client, self.load_templates(job), self.debug, manifest=self.manifest)
+            record['timings'][stage] = round(time.perf_counter() - stage_started, 3)
+
+            stage = 'render'
+            self.queue.set_stage(job_id, stage)
+            stage_started = time.perf_counter()
+            with telemetry.span("stage.render", trace_id=record['trace_id'], job=job['output_latex']):
+                record['output_pdf'] = await self.render(job, record, generated)
+            record['timings'][stage] = round(time.perf_counter() - stage_started, 3)
+            status, error = 'ok', None
+        except batch.SkipJob as e:
+            status, error = 'skipped', str(e)
+        except Exception as e:
+            status, error = 'failed', f"{stage}: {e}"
+        record['total_seconds'] = round(time.perf_counter() - started, 3)
+        self._durations.append(record['total_seconds'])
+        self.queue.finish(job_id, status, record, error)
+        print(f"Job {job_id} {status} after {record['total_seconds']}s" + (f" ({error})" if error else ""))
+
+    async def worker(self):
+        while True:
+            claimed = self.queue.claim()
+            if claimed is None:
+                # Woken by the next submission; the timeout also picks up jobs queued by another process
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run_job(claimed['id'], claimed['options'])
+
+    def summary(self) -> dict:
+        return {
+            'uptime': round(time.time() - self.started_at, 1),
+            'queue': self.queue.counts(),
+            'max_pending': self.queue.max_pending,
+            'workers': self.workers,
+            'scrape_tiers': self.fetcher.stats,
+            'completion_cache': self.client.cache.stats if self.client is not None else None,
+            'openai': self.client.summary() if self.client is not None else None,
+        }
+
+def job_view(job: dict, queue: JobQueue) -> dict:
+    view = {key: job[key] for key in ('id', 'status', 'stage', 'attempts', 'error', 'created_at', 'started_at', 'finished_at')}
+    view['options'] = job['options']
+    if job['status'] == 'queued':
+        view['position'] = queue.position(job['id'])
+    if job['result'] is not None:
+        view['result'] = job['result']
+    if job['status'] == 'ok':
+        view['pdf'] = f"/jobs/{job['id']}/pdf"
+    return view
+
+def create_app(server: CoverLetterServer) -> web.Application:
+    """
+    HTTP API:
+        POST /jobs            {"job_url": ..., "tone": ..., "focus": ..., "limit": ..., ...} -> 202 with the job,
+                              429 with Retry-After when the queue is full
+        GET  /jobs            recent jobs (?status=queued|running|ok|failed|skipped)
+        GET  /jobs/{id}       status, current stage, queue position and result record
+        GET  /jobs/{id}/pdf   the rendered letter
+        GET  /health          queue counts, cache and client statistics
+    """
+    routes = web.RouteTableDef()
+
+    @routes.post("/jobs")
+    async def submit(request):
+        try:
+            options = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Expected a JSON object.")
+        if not isinstance(options, dict):
+            raise web.HTTPBadRequest(text="Expected a JSON object.")
+        try:
+            job = server.submit(options)
+        except QueueFull as e:
+            return web.json_response({'error': str(e)}, status=429, headers={'Retry-After': str(server.retry_after())})
+        except (ValueError, TypeError) as e:
+            return web.json_response({'error': str(e)}, status=400)
+        return web.json_response(job_view(job, server.queue), status=202, headers={'Location': f"/jobs/{job['id']}"})
+
+    @routes.get("/jobs")
+    async def list_jobs(request):
+        try:
+            limit = int(request.query.get('limit', 50))
+        except ValueError:
+            return web.json_response({'error': 'limit must be an integer.'}, status=400)
+        if limit < 1:
+            return web.json_response({'error': 'limit must be at least 1.'}, status=400)
+        limit = min(limit, MAX_LIST_LIMIT)
+        return web.json_response([job_view(job, server.queue) for job in server.queue.jobs(request.query.get('status'), limit)])
+
+    @routes.get("/jobs/{job_id}")
+    async def status(request):
+        job = server.queue.get(request.match_info['job_id'])
+        if job is None:
+            return web.json_response({'error': 'No such job.'}, status=404)
+        return web.json_response(job_view(job, server.queue))
+
+    @routes.get("/jobs/{job_id}/pdf")
+    async def pdf(request):
+        job = server.queue.get(request.match_info['job_id'])
+        if job is None:
+            return web.json_response({'error': 'No such job.'}, status=404)
+        if job['status'] != 'ok':
+            return web.json_response({'error': f"Job is {job['status']}.", 'status': job['status']}, status=409)
+        path = job['result']['output_pdf']
+        if not os.path.exists(path):
+            return web.json_response({'error': f"{path} no longer exists."}, status=410)
+        return web.FileResponse(path, headers={'Content-Type': 'application/pdf'})
+
+    @routes.get("/health")
+    async def health(request):
+        return web.json_response(server.summary())
+
+    app = web.Application()
+    app.add_routes(routes)
+    return app
+
+async def serve(server: CoverLetterServer, host: str = HOST, port: int = PORT):
+    await server.start()
+    runner = web.AppRunner(create_app(server))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Cover Letter Bot server listening on http://{host}:{port} ({server.workers} workers, queue limit {server.queue.max_pending})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Cover Letter Bot server: a local HTTP API in front of a persistent job queue")
+    parser.add_argument("--host", default=HOST, help="Address to listen on")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to listen on")
+    parser.add_argument("--queue", default=QUEUE_PATH, help="SQLite file holding the job queue")
+    parser.add_argument("--max-queue", type=int, default=100, help="Jobs that may be queued or running before submissions get 429")
+    parser.add_argument("--workers", type=int, default=4, help="Jobs processed at once")
+    parser.add_argument("--scrape-concurrency", type=int, default=batch.CONCURRENCY['scrape'], help="Number of job pages scraped at once")
+    parser.add_argument("--generate-concurrency", type=int, default=batch.CONCURRENCY['generate'], help="Number of concurrent OpenAI requests")
+    parser.add_argument("--render-concurrency", type=int, default=batch.CONCURRENCY['render'], help="Number of concurrent pdflatex runs")
+    parser.add_argument("--requests-per-minute", type=float, default=500, help="OpenAI request budget")
+    parser.add_argument("--tokens-per-minute", type=float, default=200000, help="OpenAI token budget (estimated prompt tokens plus max_tokens)")
+    parser.add_argument("--keep-duplicates", action="store_true", help="Generate letters for reposts of listings already in the job store")
+    parser.add_argument("--no-cache", action="store_true", help="Scrape every listing even if it is in the job description cache")
+    parser.add_argument("--trace", default='', help="Append timing spans as JSON lines to this file")
+    parser.add_argument("--debug", action="store_true", help="Run in debug mode (no API call, dummy output)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.trace:
+        telemetry.configure(args.trace)
+    queue = JobQueue(args.queue, max_pending=args.max_queue)
+    server = CoverLetterServer(
+        os.getenv("OPENAI_API_KEY"), queue, workers=args.workers,
+        concurrency={'scrape': args.scrape_concurrency, 'generate': args.generate_concurrency, 'render': args.render_concurrency},
+        debug=args.debug, use_cache=not args.no_cache, skip_duplicates=not args.keep_duplicates,
+        rate_limits={'requests_per_minute': args.requests_per_minute, 'tokens_per_minute': args.tokens_per_minute},
+    )
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        print("Shutting down; unfinished jobs resume on the next start.")
+    finally:
+        queue.close()
+        telemetry.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import secrets
+import inspect
+import functools
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+
+TRACE_PATH = "output/trace.jsonl"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_tracer = None
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+class Span:
+    """
+    A timed operation. Attributes set while it is open (`span.set(pages=2)`) are written with it.
+    """
+
+    def __init__(self, name: str, attributes: dict, parent=None, trace_id: str = None):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else (trace_id or secrets.token_hex(16))
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+class NullSpan:
+    def set(self, **attributes):
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Tracer:
+    """
+    Writes every finished span as one JSON line to `path`: name, trace/span/parent IDs, start time,
+    duration in seconds, status and attributes. All spans of one Tracer share a `run_id`, so a report
+    can pick out a single batch. With `otel`, spans are also passed to the OpenTelemetry API
+    (requires the opentelemetry-api package and a configured SDK to export them).
+    """
+
+    def __init__(self, path: str = TRACE_PATH, otel: bool = False):
+        self.path = path
+        self.run_id = time.strftime("%Y%m%dT%H%M%S") + "-" + secrets.token_hex(3)
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._otel = None
+        if otel:
+            try:
+                from opentelemetry import trace
+                self._otel = trace.get_tracer("cover_letter_bot")
+            except ImportError:
+                print("opentelemetry-api is not installed, writing JSON lines only.")
+
+    @contextmanager
+    def span(self, name: str, trace_id: str = None, **attributes):
+        span = Span(name, attributes, _current_span.get(), trace_id)
+        token = _current_span.set(span)
+        started, wall_started = time.perf_counter(), time.time()
+        status, error = "ok", None
+        otel_span = self._otel.start_as_current_span(name) if self._otel is not None else None
+        otel = otel_span.__enter__() if otel_span is not None else None
+        try:
+            yield span
+        except BaseException as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            duration = time.perf_counter() - started
+            if otel is not None:
+                for key, value in span.attributes.items():
+                    if isinstance(value, (str, bool, int, float)):
+                        otel.set_attribute(key, value)
+                otel_span.__exit__(None, None, None)
+            self.write({
+                'run_id': self.run_id,
+                'trace_id': span.trace_id,
+                'span_id': span.span_id,
+                'parent_id': span.parent_id,
+                'name': name,
+                'start': round(wall_started, 6),
+                'duration': round(duration, 6),
+                'status': status,
+                'error': error,
+                'attributes': span.attributes,
+            })
+
+    def write(self, record: dict):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def configure(path: str = TRACE_PATH, otel: bool = False) -> Tracer:
+    """
+    Starts recording spans for this process. Until this is called, `span` costs next to nothing.
+    """
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(path, otel)
+    return _tracer
+
+def shutdown():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+@contextmanager
+def span(name: str, trace_id: str = None, **attributes):
+    """
+    Records the enclosed block as a span if tracing is configured. Nested spans (also across
+    asyncio tasks and `asyncio.to_thread`) are linked to their parent; a span without a parent starts
+    a new trace unless `trace_id` ties it to others, e.g. all stages of one batch job.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield NULL_SPAN
+        return
+    with tracer.span(name, trace_id, **attributes) as current:
+        yield current
+
+def current_span():
+    """
+    The innermost open span, for setting attributes on it; a no-op span if there is none or tracing is off.
+    """
+    current = _current_span.get() if _tracer is not None else None
+    return current if current is not None else NULL_SPAN
+
+def traced(name: str):
+    """
+    Decorator recording every call of a function (or coroutine function) as a span named `name`.
+    """
+    def decorate(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def load_spans(path: str = TRACE_PATH, run_id: str = None) -> list:
+    """
+    Reads the spans of one run from a trace file: `run_id`, or the latest run if None, or all runs if 'all'.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    if run_id == 'all' or not spans:
+        return spans
+    run_id = run_id or spans[-1]['run_id']
+    return [record for record in spans if record['run_id'] == run_id]
+
+def report(spans: list) -> dict:
+    """
+    Aggregates spans by name into count, errors, total seconds and p50/p95/p99 durations, plus the
+    sums of their token attributes.
+    """
+    by_name = {}
+    for record in spans:
+        by_name.setdefault(record['name'], []).append(record)
+    summary = {}
+    for name, records in sorted(by_name.items()):
+        durations = [record['duration'] for record in records]
+        stats = {
+            'count': len(records),
+            'errors': sum(1 for record in records if record['status'] != 'ok'),
+            'total': round(sum(durations), 3),
+            'p50': round(percentile(durations, 50), 3),
+            'p95': round(percentile(durations, 95), 3),
+            'p99': round(percentile(durations, 99), 3),
+        }
+        for key in ('prompt_tokens', 'completion_tokens'):
+            values = [record['attributes'][key] for record in records if isinstance(record['attributes'].get(key), int)]
+            if values:
+                stats[key] = sum(values)
+        summary[name] = stats
+    return summary
+
+def print_report(summary: dict):
+    print(f"{'span':28} {'count':>6} {'errors':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'total s':>9}  tokens in/out")
+    for name, stats in summary.items():
+        tokens = f"{stats.get('prompt_tokens', '')}/{stats.get('completion_tokens', '')}" if 'prompt_tokens' in stats else ""
+        print(f"{name:28} {stats['count']:>6} {stats['errors']:>6} {stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['p99']:>8.3f} {stats['total']:>9.3f}  {tokens}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cover Letter Bot trace tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    report_parser = subcommands.add_parser("report", help="Latency percentiles per span name over a run")
+    report_parser.add_argument("trace", nargs="?", default=TRACE_PATH, help="Trace file written by a run with tracing enabled")
+    report_parser.add_argument("--run", default=None, help="Run ID to report on, or 'all' (default: the latest run)")
+    report_parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    spans = load_spans(args.trace, args.run)
+    if not spans:
+        print(f"No spans in {args.trace}")
+        return
+    summary = report(spans)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    runs = sorted({record['run_id'] for record in spans})
+    print(f"{len(spans)} spans from run {runs[0] if len(runs) == 1 else f'{len(runs)} runs'}")
+    print_report(summary)
+
+if __name__ == "__main__":
+    main()
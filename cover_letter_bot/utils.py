@@ -1,6 +1,7 @@
 import os
-import subprocess
 import glob
+from .render import render_latex
+from .telemetry import span
 
 def load_latex_template(path: str) -> str:
     """
@@ -9,72 +10,57 @@ def load_latex_template(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
     
+def estimate_tokens(text) -> int:
+    """
+    Rough token count (about 4 characters per token) for a prompt string or a list of chat messages.
+    """
+    if isinstance(text, list):
+        text = "".join(message.get("content") or "" for message in text)
+    return max(1, len(text) // 4)
+
 def clear_aux_files():
     """
     Removes all auxiliary LaTeX files from output/ and templates/ directories.
-    Keeps .log files for debugging purposes.
+    Keeps .log files for debugging purposes. Renders no longer leave aux files behind, so this is
+    only needed to tidy up after manual pdflatex runs; don't call it while renders are in progress.
     """
     aux_extensions = [".aux", ".out", ".toc", ".synctex.gz", ".nav", ".snm", ".fls", ".fdb_latexmk", ".bbl", ".blg", ".idx", ".ind", ".ilg", ".glo", ".gls", ".glg", ".acn", ".acr", ".alg", ".ist", ".lot", ".lof", ".bcf", ".run.xml"]
     
     directories = ["output", "templates"]
     
-    for directory in directories:
-        if os.path.exists(directory):
-            for ext in aux_extensions:
-                pattern = os.path.join(directory, f"*{ext}")
-                for aux_file in glob.glob(pattern):
-                    try:
-                        os.remove(aux_file)
-                        print(f"Removed auxiliary file: {aux_file}")
-                    except Exception as e:
-                        print(f"Could not remove {aux_file}: {e}")
+    with span("aux.cleanup") as current:
+        removed = 0
+        for directory in directories:
+            if os.path.exists(directory):
+                for ext in aux_extensions:
+                    pattern = os.path.join(directory, f"*{ext}")
+                    for aux_file in glob.glob(pattern):
+                        try:
+                            os.remove(aux_file)
+                            removed += 1
+                            print(f"Removed auxiliary file: {aux_file}")
+                        except Exception as e:
+                            print(f"Could not remove {aux_file}: {e}")
+        current.set(removed=removed)
 
-def render_pdf_from_latex(latex_path: str, out_dir="output"):
+def render_pdf_from_latex(latex_path: str, out_dir="output") -> dict:
     """
-    Renders a PDF from a LaTeX file using pdflatex.
+    Renders a PDF from a LaTeX file in `out_dir` using pdflatex.
+    The compile runs in a temporary directory, so no auxiliary files are left behind.
+    Returns the structured result of render.render_latex.
     """
 
-    print("LATEX PATH: ", latex_path)
-
     if not latex_path.endswith(".tex"):
-        print("changing latex path")
         latex_path = latex_path + ".tex"
 
     print(f"Rendering PDF from {latex_path} to {out_dir}")
-    try: 
-        os.makedirs(out_dir, exist_ok=True)
-    except Exception as e:
-        print(f"Error creating output directory {out_dir}: {e}")
-    
-    try:
-        result = subprocess.run(
-            [
-                "pdflatex",
-                "-interaction=nonstopmode",  # Don't stop for errors
-                "-output-directory", out_dir,
-                os.path.join(out_dir, latex_path)
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace"
-        )
-        print(result.stdout)
-        
-    except subprocess.CalledProcessError as e:
-        print("PDFLaTeX failed with the following output:")
-        print(e.stdout)
-        print(e.stderr)
-        print(f"Check the log file in {out_dir} for more details.")
-
-    # Clean up auxiliary files except .log
-    aux_extensions = [".aux", ".out", ".toc", ".synctex.gz", ".nav", ".snm", ".fls", ".fdb_latexmk"]
-    base_name = os.path.splitext(os.path.basename(latex_path))[0]
-    for ext in aux_extensions:
-        aux_file = os.path.join(out_dir, base_name + ext)
-        if os.path.exists(aux_file):
-            try:
-                subprocess.run(["rm", aux_file], check=True)
-            except Exception as cleanup_e:
-                print(f"Could not remove {aux_file}: {cleanup_e}")
\ No newline at end of file
+    result = render_latex(os.path.join(out_dir, latex_path), out_dir=out_dir)
+    if result['status'] == 'ok':
+        print(f"PDF written to {result['pdf_path']} ({result['pages']} page{'s' if result['pages'] != 1 else ''})")
+    else:
+        print(f"PDFLaTeX {result['status']} with the following errors:")
+        for error in result['errors']:
+            print(f"  line {error['line']}: {error['message']}" if error['line'] else f"  {error['message']}")
+        if result['log_path']:
+            print(f"Check {result['log_path']} for more details.")
+    return result
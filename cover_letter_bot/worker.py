@@ -0,0 +1,303 @@
+import os
+import sys
+import glob
+import time
+import shutil
+import socket
+import asyncio
+import secrets
+import argparse
+import threading
+from dotenv import load_dotenv
+from . import batch
+from . import telemetry
+from .jobqueue import JobQueue, QUEUE_PATH
+from .fetcher import JobFetcher
+from .cache import JobDescriptionCache
+from .llm_cache import CompletionCache
+from .generator import generate_cover_letter
+from .utils import load_latex_template, render_pdf_from_latex
+
+OUTPUT_DIR = "output"
+STAGING_DIR = "output/.staging"
+
+LEASE = 60
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 1.0
+
+def write_atomic(path: str, text: str):
+    """
+    Writes `text` to `path` through a temporary file in the same directory, so readers (and other
+    workers) only ever see the old or the complete new file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+class LeaseLost(Exception):
+    """
+    Raised when a worker's lease on its job expired and another worker may have claimed it.
+    """
+
+class Heartbeat:
+    """
+    Renews a job's lease every `lease / 3` seconds in a background thread while the job runs.
+    `lost` is set once a renewal fails because the job is no longer held by this worker.
+    """
+
+    def __init__(self, queue: JobQueue, job_id: str, worker: str, lease: float):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self.lease = lease
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease / 3):
+            if not self.queue.heartbeat(self.job_id, self.worker, self.lease):
+                self.lost.set()
+                return
+
+    def check(self):
+        """
+        Renews the lease right away; raises LeaseLost if the job is no longer ours.
+        """
+        if self.lost.is_set() or not self.queue.heartbeat(self.job_id, self.worker, self.lease):
+            self.lost.set()
+            raise LeaseLost(f"lease on job {self.job_id} expired")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+class CompletionClient:
+    """
+    The worker's synchronous completions behind the `generate` coroutine batch.lint_letter uses for its
+    targeted regeneration.
+    """
+
+    def __init__(self, api_key: str, cache: CompletionCache):
+        self.api_key = api_key
+        self.cache = cache
+
+    async def generate(self, prompt, **kwargs) -> str:
+        return generate_cover_letter(prompt, self.api_key, cache=self.cache, **kwargs)
+
+class Worker:
+    """
+    One worker process of a shared job queue. It claims a job with a lease, runs it through the
+    stages (scrape, `build_prompt`, `generate_cover_letter`, lint, `render_pdf_from_latex`) while a
+    heartbeat keeps the lease alive, and publishes the letter into `output/` with atomic renames
+    before marking the job done. Several workers, on one machine or several sharing the project
+    directory, can run against the same queue; a job whose worker dies is claimed again once its
+    lease expires, up to `max_attempts` times in all, and only the worker holding the lease can
+    publish it and record its result.
+    """
+
+    def __init__(self, api_key: str, queue: JobQueue, worker_id: str = None, lease: float = LEASE, use_cache: bool = True,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.api_key = api_key
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(2)}"
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.cache = JobDescriptionCache() if use_cache else None
+        self.completions = CompletionCache()
+        self.client = CompletionClient(api_key, self.completions)
+        self.templates = {}
+        self.stats = {'ok': 0, 'failed': 0, 'lost': 0}
+        self._loop = asyncio.new_event_loop()
+        self._fetcher = None
+
+    def load_template(self, path: str) -> str:
+        if not path:
+            return ""
+        if path not in self.templates:
+            self.templates[path] = load_latex_template(path)
+        return self.templates[path]
+
+    def scrape(self, url: str, record: dict) -> str:
+        # The fetcher's HTTP session and browser pool live on the worker's own event loop, across jobs
+        if self._fetcher is None:
+            from .browser_pool import DriverPool
+            self._fetcher = JobFetcher(pool=DriverPool(size=1), cache=self.cache, connections=4)
+        job_description, record['scrape_tier'] = self._loop.run_until_complete(self._fetcher.fetch(url, timings=record['scrape_steps']))
+        return job_description
+
+    def run_job(self, job_id: str, job: dict, heartbeat: Heartbeat) -> dict:
+        """
+        Runs one job through scrape, `generator.build_prompt` (via batch.build_job_prompt), the completion
+        and `render_pdf_from_latex`, staging its files under output/.staging/ and moving them into output/
+        only while the lease is still held. Returns the result record; raises on failure.
+        """
+        record = {
+            'job_url': job['job_url'],
+            'worker': self.worker_id,
+            'output_latex': os.path.join(OUTPUT_DIR, f"{job['output_latex']}.tex"),
+            'timings': {},
+            'scrape_steps': {},
+        }
+        # Files a crashed earlier attempt left behind are never published, so they can go
+        for leftover in glob.glob(os.path.join(STAGING_DIR, f"{job_id}-*")):
+            shutil.rmtree(leftover, ignore_errors=True)
+        staging = os.path.join(STAGING_DIR, f"{job_id}-{self.worker_id}")
+        os.makedirs(staging, exist_ok=True)
+        try:
+            stage_started = time.perf_counter()
+            self.queue.set_stage(job_id, 'scrape')
+            job_description = self.scrape(job['job_url'], record)
+            record['timings']['scrape'] = round(time.perf_counter() - stage_started, 3)
+
+            stage_started = time.perf_counter()
+            self.queue.set_stage(job_id, 'generate')
+            template = self.load_template(job['cover_letter_template'])
+            self.load_template(job['cv_template'])
+            prompt = batch.build_job_prompt(job, record, job_description, self.templates, template)
+            letter = generate_cover_letter(prompt, self.api_key, cache=self.completions)
+            # Same lint as batch mode: repaired, regenerated once if needed, or failed before it reaches pdflatex
+            letter = self._loop.run_until_complete(batch.lint_letter(letter, template, prompt, self.client, record))
+            write_atomic(os.path.join(staging, f"{job['output_latex']}.tex"), letter)
+            record['timings']['generate'] = round(time.perf_counter() - stage_started, 3)
+
+            stage_started = time.perf_counter()
+            self.queue.set_stage(job_id, 'render')
+            heartbeat.check()
+            rendered = render_pdf_from_latex(f"{job['output_latex']}.tex", staging)
+            record['timings']['render'] = round(time.perf_counter() - stage_started, 3)
+            record['render'] = {key: rendered[key] for key in ('status', 'pages', 'errors', 'format', 'seconds')}
+            if rendered['status'] != 'ok':
+                raise RuntimeError(f"render {rendered['status']}: " + "; ".join(error['message'] for error in rendered['errors'][:3]))
+
+            # Publish only while the job is still ours; a worker that lost its lease leaves output/ alone
+            heartbeat.check()
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+            write_atomic(os.path.join(OUTPUT_DIR, f"{job['output_latex']}_job_description.txt"), job_description)
+            for extension in (".tex", ".log", ".pdf"):
+                staged = os.path.join(staging, f"{job['output_latex']}{extension}")
+                if os.path.exists(staged):
+                    os.replace(staged, os.path.join(OUTPUT_DIR, f"{job['output_latex']}{extension}"))
+            record['output_pdf'] = os.path.join(OUTPUT_DIR, f"{job['output_latex']}.pdf")
+            return record
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def process(self, claimed: dict):
+        job_id, job = claimed['id'], claimed['options']
+        started = time.perf_counter()
+        print(f"[{self.worker_id}] job {job_id} ({job['job_url']}), attempt {claimed['attempts']}")
+        with Heartbeat(self.queue, job_id, self.worker_id, self.lease) as heartbeat:
+            try:
+                with telemetry.span("worker.job", job=job['output_latex'], worker=self.worker_id, attempt=claimed['attempts']):
+                    record = self.run_job(job_id, job, heartbeat)
+                status, error = 'ok', None
+            except LeaseLost as e:
+                self.stats['lost'] += 1
+                print(f"[{self.worker_id}] {e}; another worker has it now")
+                return
+            except Exception as e:
+                record = {'job_url': job['job_url'], 'worker': self.worker_id}
+                status, error = 'failed', f"{self.queue.get(job_id)['stage']}: {e}"
+            record['total_seconds'] = round(time.perf_counter() - started, 3)
+            if not self.queue.finish(job_id, status, record, error, worker=self.worker_id):
+                self.stats['lost'] += 1
+                print(f"[{self.worker_id}] lease on job {job_id} expired before it finished; result discarded")
+                return
+        self.stats[status] += 1
+        print(f"[{self.worker_id}] job {job_id} {status} after {record['total_seconds']}s" + (f" ({error})" if error else ""))
+
+    def run(self, max_jobs: int = None, exit_when_empty: bool = False, poll_interval: float = POLL_INTERVAL):
+        """
+        Claims and processes jobs until `max_jobs` were processed or, with `exit_when_empty`, no job is
+        queued or running any more. Otherwise polls the queue every `poll_interval` seconds.
+        """
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            claimed = self.queue.claim(self.worker_id, self.lease, self.max_attempts)
+            if claimed is None:
+                counts = self.queue.counts()
+                if exit_when_empty and not counts.get('queued') and not counts.get('running'):
+                    break
+                time.sleep(poll_interval)
+                continue
+            try:
+                self.process(claimed)
+            except KeyboardInterrupt:
+                self.queue.release(claimed['id'], self.worker_id)
+                raise
+            processed += 1
+        return self.stats
+
+    def close(self):
+        if self._fetcher is not None:
+            self._loop.run_until_complete(self._fetcher.close())
+            self._fetcher.pool.close()
+        self._loop.close()
+        self.completions.close()
+
+def enqueue(manifest: str, queue: JobQueue) -> list:
+    """
+    Adds every job of a batch manifest to the queue. Returns the job IDs.
+    """
+    jobs = batch.load_manifest(manifest)
+    for index, job in enumerate(jobs):
+        if job['variants'] > 1:
+            raise ValueError(f"Manifest row {index + 1}: worker mode generates one letter per job, use batch mode for variants.")
+    return queue.submit_many(jobs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cover Letter Bot workers: processes sharing a SQLite job queue with leases")
+    parser.add_argument("--queue", default=QUEUE_PATH, help="SQLite file holding the job queue (on the shared directory)")
+    parser.add_argument("--journal-mode", default="WAL", help="SQLite journal mode; use DELETE when workers on several machines share the queue over a network filesystem")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Add the jobs of a batch manifest to the queue")
+    enqueue_parser.add_argument("manifest", help="CSV or JSONL file with one job_url (plus optional overrides) per row")
+
+    run_parser = commands.add_parser("run", help="Process jobs from the queue")
+    run_parser.add_argument("--lease", type=float, default=LEASE, help="Seconds a claimed job stays with this worker without a heartbeat")
+    run_parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="Mark a job failed once its lease has expired this many times instead of claiming it again")
+    run_parser.add_argument("--max-jobs", type=int, default=None, help="Exit after this many jobs")
+    run_parser.add_argument("--exit-when-empty", action="store_true", help="Exit once no job is queued or running instead of waiting for more")
+    run_parser.add_argument("--worker-id", default=None, help="Name of this worker in the queue (default: host, PID and a random suffix)")
+    run_parser.add_argument("--no-cache", action="store_true", help="Scrape every listing even if it is in the job description cache")
+    run_parser.add_argument("--trace", default='', help="Append timing spans as JSON lines to this file")
+
+    commands.add_parser("status", help="Print the number of jobs per status")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue, max_pending=None, journal_mode=args.journal_mode)
+    try:
+        if args.command == "enqueue":
+            try:
+                job_ids = enqueue(args.manifest, queue)
+            except ValueError as e:
+                print(e)
+                sys.exit(1)
+            print(f"{len(job_ids)} jobs queued in {args.queue}")
+        elif args.command == "status":
+            print(queue.counts())
+        else:
+            load_dotenv()
+            if args.trace:
+                telemetry.configure(args.trace)
+            worker = Worker(os.getenv("OPENAI_API_KEY"), queue, args.worker_id, args.lease, use_cache=not args.no_cache, max_attempts=args.max_attempts)
+            try:
+                stats = worker.run(args.max_jobs, args.exit_when_empty)
+                print(f"[{worker.worker_id}] done: {stats}")
+            except KeyboardInterrupt:
+                print(f"[{worker.worker_id}] interrupted; its job is back in the queue")
+            finally:
+                worker.close()
+                telemetry.shutdown()
+    finally:
+        queue.close()
+
+if __name__ == "__main__":
+    main()